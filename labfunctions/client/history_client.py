@@ -5,7 +5,13 @@ from pathlib import Path
 from typing import Any, Dict, Generator, List, Optional, Union
 
 from labfunctions import defaults, errors, secrets, types
-from labfunctions.utils import parse_var_line
+from labfunctions.types.docker import DockerStatsSummary
+from labfunctions.utils import (
+    binary_file_reader,
+    gunzip_stream,
+    gzip_file_reader,
+    parse_var_line,
+)
 
 from .base import BaseClient
 from .utils import get_private_key, store_credentials_disk, store_private_key
@@ -47,35 +53,126 @@ class HistoryClient(BaseClient):
             return types.HistoryResult(**rsp.json())
         return None
 
-    def history_get_output(self, uri) -> Generator[bytes, None, None]:
+    def history_set_resources(
+        self, projectid: str, execid: str, resources: DockerStatsSummary
+    ) -> bool:
+        """Add the resources used by the container to a registered execution"""
+        rsp = self._http.post(
+            f"/history/{projectid}/detail/{execid}/_resources", json=resources.dict()
+        )
+        return rsp.status_code == 204
+
+    def history_sweep(self, parentid: str, last=100) -> Union[types.SweepHistory, None]:
+        """Aggregated status and executions of a parameter sweep"""
+        query = f"/history/{self.projectid}/sweep/{parentid}?lt={last}"
+        rsp = self._http.get(query)
+        if rsp.status_code == 200:
+            return types.SweepHistory(**rsp.json())
+        return None
+
+    def history_put_params(
+        self, projectid: str, execid: str, params: Dict[str, Any]
+    ) -> Union[str, None]:
+        """Store the params of an execution in the kv store of the project
+        :return: the key of the params, if ok.
+        """
+        rsp = self._http.post(f"/history/{projectid}/_params/{execid}", json=params)
+        if rsp.status_code == 201:
+            return rsp.json()["key"]
+        return None
+
+    def history_get_params(
+        self, projectid: str, key: str
+    ) -> Union[Dict[str, Any], None]:
+        rsp = self._http.get(f"/history/{projectid}/_params", params=dict(key=key))
+        if rsp.status_code == 200:
+            return rsp.json()
+        return None
+
+    def history_put_checkpoint(self, projectid: str, execid: str, fp: str) -> bool:
+        """Upload the checkpoint of an execution, it replaces the last one"""
+        rsp = self._http.post(
+            f"/history/{projectid}/_checkpoint/{execid}",
+            content=binary_file_reader(fp, defaults.NB_OUTPUT_CHUNK_SIZE),
+        )
+        return rsp.status_code == 201
+
+    def history_get_checkpoint(self, projectid: str, execid: str, fp: str) -> bool:
+        """
+        Download the last checkpoint of an execution to `fp`
+        :return: False if the execution doesn't have checkpoints.
+        """
+        url = f"/history/{projectid}/_checkpoint/{execid}"
+        with self._http.stream("GET", url) as r:
+            if r.status_code != 200:
+                return False
+            with open(fp, "wb") as f:
+                for chunk in r.iter_bytes():
+                    f.write(chunk)
+        return True
+
+    def history_put_output_object(
+        self, projectid: str, execid: str, name: str, data: bytes
+    ) -> Union[str, None]:
+        """
+        Store an output externalized from the notebook of an execution,
+        see :class:`labfunctions.types.OutputPolicyData`.
+
+        :return: the uri of the object, to be used with `history_get_output`.
+        """
+        rsp = self._http.post(
+            f"/history/{projectid}/_output_object/{execid}",
+            params=dict(name=name),
+            content=data,
+        )
+        if rsp.status_code == 201:
+            return rsp.json()["uri"]
+        return None
+
+    def history_get_output(
+        self, uri, encoding: Optional[str] = None
+    ) -> Generator[bytes, None, None]:
         """uri if ok:
         uri = f"{row.result.output_dir}/{row.result.output_name}"
         else:
         uri = f"{row.result.error_dir}/{row.result.output_name}"
+
+        :param encoding: `output_encoding` of the result, the notebook
+        is decompressed while it's downloaded.
         """
+        if encoding:
+            uri = f"{uri}{defaults.NB_OUTPUT_ENCODINGS[encoding]}"
         url = f"/history/{self.projectid}/_get_output?file={uri}"
         with self._http.stream("GET", url) as r:
-            for data in r.iter_bytes():
-                yield data
+            if encoding:
+                yield from gunzip_stream(r.iter_bytes())
+            else:
+                yield from r.iter_bytes()
 
     def history_nb_output(self, exec_result: types.ExecutionResult) -> bool:
-        """Upload the notebook from the execution result
-        TODO: zip or compress notebook before upload.
+        """Upload the notebook from the execution result.
+        The file is streamed, compressed if `exec_result.output_encoding`
+        is set.
+
         :return: True if ok, False if something fails.
         """
-        form_data = dict(output_name=exec_result.output_name)
-
         file_dir = f"{exec_result.output_dir}/{exec_result.output_name}"
-        _addr = f"/history/{exec_result.projectid}/_output_ok"
         if exec_result.error:
-            _addr = f"/history/{exec_result.projectid}/_output_fail"
             file_dir = f"{exec_result.error_dir}/{exec_result.output_name}"
 
-        files = {"file": open(file_dir)}
+        params = dict(
+            output_name=exec_result.output_name,
+            error="true" if exec_result.error else "false",
+        )
+        content = binary_file_reader(file_dir, defaults.NB_OUTPUT_CHUNK_SIZE)
+        if exec_result.output_encoding:
+            params["encoding"] = exec_result.output_encoding
+            content = gzip_file_reader(file_dir)
+
         rsp = self._http.post(
-            _addr,
-            files=files,
-            data=form_data,
+            f"/history/{exec_result.projectid}/_output",
+            params=params,
+            content=content,
         )
         if rsp.status_code == 201:
             return True
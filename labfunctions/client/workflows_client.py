@@ -16,12 +16,18 @@ from labfunctions.types import (
     NBTask,
     ProjectData,
     ProjectReq,
+    ResultsCacheStats,
     ScheduleData,
     WorkflowData,
     WorkflowDataWeb,
     WorkflowsList,
 )
-from labfunctions.types.workflows import WFCreateRsp, WFPushRsp
+from labfunctions.types.workflows import (
+    WFCreateRsp,
+    WFPushRsp,
+    WFQueueManyReq,
+    WFQueueReq,
+)
 from labfunctions.utils import parse_var_line
 
 from .base import BaseClient
@@ -130,6 +136,29 @@ class WorkflowsClient(BaseClient):
         if r.status_code == 202:
             return r.json()["execid"]
 
+    def workflows_enqueue_many(
+        self, wfids: List[str], params: Optional[Dict[str, Dict[str, Any]]] = None
+    ) -> List[str]:
+        """
+        Enqueue many workflows in one request.
+
+        :param params: optional params overrides by wfid.
+        :return: the list of execids in the same order than wfids.
+        """
+        params = params or {}
+        req = WFQueueManyReq(
+            workflows=[WFQueueReq(wfid=wfid, params=params.get(wfid)) for wfid in wfids]
+        )
+        r = self._http.post(f"/workflows/{self.projectid}/queue", json=req.dict())
+        if r.status_code == 202:
+            return r.json()["execids"]
+        self.logger.error(f"Enqueue failed with {r.status_code}: {r.text}")
+        return []
+
+    def workflows_cache_stats(self, wfid) -> ResultsCacheStats:
+        r = self._http.get(f"/workflows/{self.projectid}/_cache/{wfid}")
+        return ResultsCacheStats(**r.json())
+
     def notebook_run(
         self,
         nb_name: str,
@@ -47,7 +47,31 @@ def agentcli():
     help="Agent Name",
 )
 @click.option("--machine-id", "-m", default=f"localhost/ba/{hostname}")
-def runcli(redis, workers, qnames, cluster, ip_address, agent_name, machine_id):
+@click.option(
+    "--in-process",
+    "-P",
+    default=False,
+    is_flag=True,
+    help="Run jobs inside the worker process instead of forking",
+)
+@click.option(
+    "--warm-pool",
+    "-W",
+    default=False,
+    is_flag=True,
+    help="Run notebooks in a pool of warm containers, it implies --in-process",
+)
+def runcli(
+    redis,
+    workers,
+    qnames,
+    cluster,
+    ip_address,
+    agent_name,
+    machine_id,
+    in_process,
+    warm_pool,
+):
     """Run the agent"""
     # pylint: disable=import-outside-toplevel
     from labfunctions.control_plane import agent
@@ -69,6 +93,8 @@ def runcli(redis, workers, qnames, cluster, ip_address, agent_name, machine_id):
         heartbeat_check_every=settings.AGENT_HEARTBEAT_CHECK,
         agent_name=agent_name,
         workers_n=workers,
+        in_process=in_process or warm_pool,
+        warm_pool=warm_pool,
     )
 
     agent.run(conf)
@@ -11,7 +11,12 @@ from labfunctions.conf import load_client
 from labfunctions.context import create_dummy_ctx
 from labfunctions.executors import jupyter_exec
 from labfunctions.executors.docker_exec import docker_exec
-from labfunctions.executors.local_exec import local_exec_env
+from labfunctions.executors.local_exec import (
+    ctx_files,
+    has_ctx_env,
+    local_exec_batch,
+    local_exec_env,
+)
 from labfunctions.hashes import generate_random
 from labfunctions.types import NBTask
 
@@ -56,13 +61,18 @@ def local(from_file, url_service, local, wfid):
     """Used by the agent to run workloads or for development purposes"""
     rsp = None
 
-    if os.environ.get(defaults.EXECUTIONTASK_VAR):
+    if has_ctx_env():
 
         nbclient = client.from_env()
         console.print(f"=> Starting work inside container")
         console.print(f"=> Current dir: {os.getcwd()}")
         console.print(f"=> Base PATH: {nbclient.base_path}")
         console.print(f"=> Service url: {nbclient._addr}")
+        if len(ctx_files()) > 1:
+            results = local_exec_batch()
+            failed = [r for r in results if r is None or r.error]
+            console.print(f"=> Batch of {len(results)}, {len(failed)} failed")
+            sys.exit(-1 if failed else 0)
         rsp = local_exec_env()
 
     elif wfid:
@@ -86,6 +96,15 @@ def local(from_file, url_service, local, wfid):
         console.print(f"=>[bold green] WFID: {rsp.wfid} locally executed[/]")
 
 
+@executorscli.command()
+def serve():
+    """Used by the warm containers of the agent, it reads tasks from stdin"""
+    # pylint: disable=import-outside-toplevel
+    from labfunctions.executors.warm_exec import serve as _serve
+
+    _serve()
+
+
 @executorscli.command()
 @click.option(
     "--from-file",
@@ -182,7 +201,13 @@ def docker(from_file, url_service, notebook, wfid, action):
     default=False,
     help="Get events & logs from the executions",
 )
-@click.argument("notebook")
+@click.option(
+    "--reset",
+    default=defaults.KERNEL_POOL_RESET,
+    type=click.Choice(["namespace", "restart"]),
+    help="How kernels are reset between notebooks executed locally",
+)
+@click.argument("notebooks", nargs=-1, required=True)
 def notebook(
     url_service,
     from_file,
@@ -192,35 +217,56 @@ def notebook(
     machine,
     version,
     local,
-    notebook,
     watch,
+    reset,
+    notebooks,
 ):
-    """On demand execution of a notebook file, with custom parameters"""
+    """
+    On demand execution of notebook files, with custom parameters.
+
+    Many notebooks executed locally share a pool of kernels.
+    """
     # from labfunctions.executors.development import local_nb_dev_exec
 
     c = client.from_file(from_file, url_service=url_service)
     params_dict = _parse_params_args(param)
 
     if not local:
-        rsp = c.notebook_run(
-            notebook,
-            params_dict,
-            cluster=cluster,
-            machine=machine,
-            runtime=runtime,
-            version=version,
-        )
-        # print_json(rsp.json())
-        if watch:
-            watcher(c, rsp.execid, stats=False)
-        print_json(data=rsp.dict())
-    else:
-        ctx = create_dummy_ctx(c.projectid, notebook, params_dict)
-        os.environ[defaults.EXECUTIONTASK_VAR] = ctx.json()
-        os.environ["LF_LOCAL"] = "yes"
-        result = local_exec_env()
-        # rsp = local_nb_dev_exec(task)
-        print_json(data=result.dict())
+        for notebook in notebooks:
+            rsp = c.notebook_run(
+                notebook,
+                params_dict,
+                cluster=cluster,
+                machine=machine,
+                runtime=runtime,
+                version=version,
+            )
+            # print_json(rsp.json())
+            if watch:
+                watcher(c, rsp.execid, stats=False)
+            print_json(data=rsp.dict())
+        return
+
+    # pylint: disable=import-outside-toplevel
+    from labfunctions.executors.kernels import close_kernel_pool, init_kernel_pool
+
+    os.environ["LF_LOCAL"] = "yes"
+    pool = init_kernel_pool(reset=reset) if len(notebooks) > 1 else None
+    try:
+        for notebook in notebooks:
+            ctx = create_dummy_ctx(c.projectid, notebook, params_dict)
+            os.environ[defaults.EXECUTIONTASK_VAR] = ctx.json()
+            result = local_exec_env()
+            # rsp = local_nb_dev_exec(task)
+            print_json(data=result.dict())
+    finally:
+        if pool is not None:
+            stats = pool.get_stats()
+            console.print(
+                f"=> Kernels: {stats['hits']} hits, {stats['misses']} misses, "
+                f"{stats['recycled']} recycled, hit rate {stats['hit_rate']:.0%}"
+            )
+            close_kernel_pool()
 
 
 @executorscli.command()
@@ -13,7 +13,8 @@ from rich.table import Table
 from labfunctions import client, defaults
 from labfunctions.client import init_script
 from labfunctions.conf import load_client
-from labfunctions.utils import format_seconds, mkdir_p
+from labfunctions.executors.profiling import slowest_cells
+from labfunctions.utils import format_bytes, format_seconds, mkdir_p
 
 from .utils import ConfigCli, console
 
@@ -37,7 +38,10 @@ def get_notebook(nbclient, row):
     if not Path(uri).exists() and output_result:
         try:
             with open(uri, "wb") as f:
-                for chunk in nbclient.history_get_output(uri):
+                chunks = nbclient.history_get_output(
+                    uri, encoding=row.result.output_encoding
+                )
+                for chunk in chunks:
                     f.write(chunk)
         except Exception as e:
             console.print(f"[bold red]Error getting result from {uri}[/]")
@@ -79,6 +83,7 @@ def listcli(from_file, url_service, last, wfid):
     table.add_column("status", style="cyan", justify="center")
     table.add_column("dir_output", style="cyan", justify="center")
     table.add_column("runned", style="cyan", justify="center")
+    table.add_column("output size", style="cyan", justify="right")
 
     # print("wfid | execid | status")
     for r in rsp:
@@ -93,8 +98,59 @@ def listcli(from_file, url_service, last, wfid):
         if not out:
             uri = "[red bold]Output not generated[/]"
 
+        size = "-"
+        if r.result.output_size is not None:
+            stored = format_bytes(r.result.output_stored_size)
+            size = f"{stored} of {format_bytes(r.result.output_size)}"
+
         # print(f"{r.wfid} | {r.execid} | {status} | {uri}")
-        table.add_row(r.wfid, r.execid, status, uri, run)
+        table.add_row(r.wfid, r.execid, status, uri, run, size)
+
+    console.print(table)
+
+
+@logcli.command(name="cells")
+@click.option(
+    "--from-file",
+    "-f",
+    default=WF,
+    help="yaml file with the configuration",
+)
+@click.option(
+    "--url-service",
+    "-u",
+    default=URL,
+    help="URL of the Lab Function service",
+)
+@click.option("--last", "-l", default=10, help="The last executions to analyze")
+@click.option("--top", "-t", default=10, help="How many cells to show")
+@click.argument("wfid")
+def cellscli(from_file, url_service, last, top, wfid):
+    """Slowest cells in the last executions of a workflow"""
+    c = client.from_file(from_file, url_service=url_service)
+    rsp = c.history_get_last(wfid, last)
+    stats = slowest_cells([r.result for r in rsp], top=top)
+    if not stats:
+        console.print(f"[yellow]No cells profile found for {wfid}[/]")
+        sys.exit(0)
+
+    table = Table(title=f"Slowest cells of {wfid} in {len(rsp)} executions")
+    table.add_column("cell", style="cyan", justify="center")
+    table.add_column("runs", style="cyan", justify="center")
+    table.add_column("mean secs", style="cyan", justify="right")
+    table.add_column("max secs", style="cyan", justify="right")
+    table.add_column("max mem delta", style="cyan", justify="right")
+    table.add_column("max output", style="cyan", justify="right")
+    for s in stats:
+        mem = "-" if s.max_mem_kb is None else format_bytes(s.max_mem_kb * 1024)
+        table.add_row(
+            str(s.cell),
+            str(s.runs),
+            f"{s.mean_secs:.2f}",
+            f"{s.max_secs:.2f}",
+            mem,
+            format_bytes(s.max_output_bytes),
+        )
 
     console.print(table)
 
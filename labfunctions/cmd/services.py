@@ -4,7 +4,7 @@ import sys
 import click
 
 from labfunctions.conf.server_settings import settings
-from labfunctions.control_plane import rqscheduler
+from labfunctions.control_plane import rqscheduler, timers
 from labfunctions.types.agent import AgentConfig
 from labfunctions.utils import get_external_ip, get_hostname
 
@@ -57,3 +57,15 @@ def schedulercli(redis, interval, log_level):
     """Run RQ scheduler"""
     # pylint: disable=import-outside-toplevel
     rqscheduler.run(redis, interval, log_level)
+
+
+@click.command(name="timers")
+@click.option("--redis", "-r", default=settings.RQ_REDIS, help="Redis full dsn")
+@click.option("--sql", "-s", default=settings.ASQL, help="Async SQL dsn")
+@click.option(
+    "--reload", "-R", default=60, help="How often workflows are reloaded in secs"
+)
+def timerscli(redis, sql, reload):
+    """Run the built-in scheduler, it replaces the RQ scheduler.
+    Don't run both at the same time, workflows would be fired twice."""
+    timers.run(sql, redis, settings.CONTROL_QUEUE, reload_secs=reload)
@@ -1,22 +1,29 @@
+import codecs
+import io
 import json
 import logging
 import os
 import shlex
 import subprocess
 import sys
+import tarfile
+import threading
+import time
+from collections import deque
 from datetime import datetime
-from typing import Any, Dict, List, Optional, Union
+from typing import Any, Callable, Deque, Dict, List, Optional, Union
 
 from pydantic import BaseModel
 
 import docker
-from labfunctions import log
+from labfunctions import defaults, log
 from labfunctions.types.docker import (
     DockerBuildLog,
     DockerBuildLowLog,
     DockerPushLog,
     DockerResources,
     DockerRunResult,
+    DockerStatsSummary,
     DockerVolume,
 )
 from labfunctions.utils import mkdir_p
@@ -106,6 +113,234 @@ def docker_low_build(path, dockerfile, tag, rm=False) -> DockerBuildLowLog:
     return DockerBuildLowLog(error=error, logs=log_messages)
 
 
+class LogsStream:
+    """
+    It follows the logs of a container while it runs. Lines are grouped in
+    batches of `batch_lines` or every `batch_secs`, and each batch is given to
+    `publish`. Only the last `tail` lines are kept in memory.
+
+    :param publish: callable which receives a list of lines
+    :param batch_lines: max lines to accumulate before publishing them
+    :param batch_secs: max seconds to wait before publishing the lines,
+    while following a container a timer publishes them even if the
+    container doesn't write anything else
+    :param tail: lines to keep, used as the result of the execution
+    """
+
+    def __init__(
+        self,
+        publish: Callable[[List[str]], None],
+        batch_lines=defaults.DOCKER_LOGS_BATCH_LINES,
+        batch_secs=defaults.DOCKER_LOGS_BATCH_SECS,
+        tail=defaults.DOCKER_LOGS_TAIL,
+    ):
+        self.publish = publish
+        self.batch_lines = batch_lines
+        self.batch_secs = batch_secs
+        self.tail: Deque[str] = deque(maxlen=tail)
+        self._batch: List[str] = []
+        self._buffer = ""
+        self._decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        self._last_flush = time.monotonic()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+
+    @property
+    def text(self) -> str:
+        return "\n".join(self.tail)
+
+    def feed(self, chunk: bytes):
+        with self._lock:
+            self._buffer += self._decoder.decode(chunk)
+            *lines, self._buffer = self._buffer.split("\n")
+            self.tail.extend(lines)
+            self._batch.extend(lines)
+            elapsed = time.monotonic() - self._last_flush
+            if len(self._batch) >= self.batch_lines or elapsed >= self.batch_secs:
+                self._flush()
+
+    def _flush(self):
+        if self._batch:
+            try:
+                self.publish(self._batch)
+            except Exception as e:  # pylint: disable=broad-except
+                log.error_logger.warning("Error publishing logs: %s", e)
+            self._batch = []
+        self._last_flush = time.monotonic()
+
+    def flush(self):
+        with self._lock:
+            self._flush()
+
+    def close(self):
+        with self._lock:
+            self._buffer += self._decoder.decode(b"", final=True)
+            if self._buffer:
+                self.tail.append(self._buffer)
+                self._batch.append(self._buffer)
+                self._buffer = ""
+            self._flush()
+
+    def _timer(self):
+        """It publishes the pending lines every `batch_secs`"""
+        wait = self.batch_secs
+        while not self._stop.wait(wait):
+            with self._lock:
+                wait = self.batch_secs - (time.monotonic() - self._last_flush)
+                if wait <= 0:
+                    self._flush()
+                    wait = self.batch_secs
+
+    def follow(self, container: docker.models.containers.Container):
+        """It blocks until the container stops"""
+        self._stop.clear()
+        timer = threading.Thread(target=self._timer, daemon=True)
+        timer.start()
+        try:
+            for chunk in container.logs(stream=True, follow=True):
+                self.feed(chunk)
+        except docker.errors.APIError as e:
+            log.error_logger.error(str(e))
+        finally:
+            self._stop.set()
+            timer.join()
+        self.close()
+
+
+def parse_stats(data: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    It takes a raw sample of the docker stats api, and returns
+    the cpu percent, the memory used without the page cache,
+    and the network and block I/O counters of the container.
+    """
+    cpu = data.get("cpu_stats") or {}
+    precpu = data.get("precpu_stats") or {}
+    cpu_usage = cpu.get("cpu_usage") or {}
+    precpu_usage = precpu.get("cpu_usage") or {}
+    cpu_delta = cpu_usage.get("total_usage", 0) - precpu_usage.get("total_usage", 0)
+    system_delta = cpu.get("system_cpu_usage", 0) - precpu.get("system_cpu_usage", 0)
+    ncpus = cpu.get("online_cpus") or len(cpu_usage.get("percpu_usage") or [1])
+    cpu_percent = 0.0
+    if system_delta > 0 and cpu_delta > 0:
+        cpu_percent = cpu_delta / system_delta * ncpus * 100
+
+    mem = data.get("memory_stats") or {}
+    mem_stats = mem.get("stats") or {}
+    # inactive_file for cgroups v2, cache for v1
+    cache = mem_stats.get("inactive_file", mem_stats.get("cache", 0))
+    networks = (data.get("networks") or {}).values()
+    blkio = (data.get("blkio_stats") or {}).get("io_service_bytes_recursive") or []
+
+    return dict(
+        cpu=dict(percent=round(cpu_percent, 2)),
+        mem=dict(mem_usage=max(mem.get("usage", 0) - cache, 0), limit=mem.get("limit")),
+        net=dict(
+            rx_bytes=sum(n.get("rx_bytes", 0) for n in networks),
+            tx_bytes=sum(n.get("tx_bytes", 0) for n in networks),
+        ),
+        blk=dict(
+            read_bytes=sum(b["value"] for b in blkio if b["op"].lower() == "read"),
+            write_bytes=sum(b["value"] for b in blkio if b["op"].lower() == "write"),
+        ),
+    )
+
+
+class StatsSampler:
+    """
+    It samples the docker stats api of a container while it runs, each
+    `interval` seconds. Only the aggregates are kept in memory, see
+    :class:`labfunctions.types.docker.DockerStatsSummary`.
+
+    :param interval: seconds between samples
+    :param publish: optional callable which receives each sample,
+    as returned by :func:`parse_stats`
+    """
+
+    def __init__(
+        self,
+        interval=defaults.DOCKER_STATS_INTERVAL,
+        publish: Optional[Callable[[Dict[str, Any]], None]] = None,
+    ):
+        self.interval = interval
+        self.publish = publish
+        self._summary = DockerStatsSummary()
+        self._cpu_total = 0.0
+        self._mem_total = 0
+        self._last: Optional[float] = None
+        self._stop = threading.Event()
+
+    def add(self, data: Dict[str, Any]):
+        sample = parse_stats(data)
+        s = self._summary
+        s.samples += 1
+        self._cpu_total += sample["cpu"]["percent"]
+        self._mem_total += sample["mem"]["mem_usage"]
+        s.cpu_peak = max(s.cpu_peak, sample["cpu"]["percent"])
+        s.cpu_mean = round(self._cpu_total / s.samples, 2)
+        s.mem_peak = max(s.mem_peak, sample["mem"]["mem_usage"])
+        s.mem_mean = self._mem_total // s.samples
+        # network and block I/O are counters since the container started
+        s.net_rx = max(s.net_rx, sample["net"]["rx_bytes"])
+        s.net_tx = max(s.net_tx, sample["net"]["tx_bytes"])
+        s.blk_read = max(s.blk_read, sample["blk"]["read_bytes"])
+        s.blk_write = max(s.blk_write, sample["blk"]["write_bytes"])
+        if self.publish:
+            try:
+                self.publish(sample)
+            except Exception as e:  # pylint: disable=broad-except
+                log.error_logger.warning("Error publishing stats: %s", e)
+
+    def follow(self, container: docker.models.containers.Container):
+        """It blocks until the container stops or :meth:`stop` is called"""
+        try:
+            for data in container.stats(stream=True, decode=True):
+                if self._stop.is_set():
+                    break
+                # samples of a stopped container are empty
+                if not data.get("memory_stats"):
+                    continue
+                now = time.monotonic()
+                if self._last is None or now - self._last >= self.interval:
+                    self._last = now
+                    self.add(data)
+        except docker.errors.APIError as e:
+            log.error_logger.error(str(e))
+
+    def stop(self):
+        self._stop.set()
+
+    def summary(self) -> Optional[DockerStatsSummary]:
+        if not self._summary.samples:
+            return None
+        return self._summary.copy()
+
+
+def tar_files(files: Dict[str, bytes]) -> bytes:
+    """
+    It builds a tar archive to be extracted in the root of a container.
+    :param files: absolute path in the container and its content.
+    """
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode="w") as tar:
+        dirs = set()
+        for path, content in files.items():
+            name = path.lstrip("/")
+            parent = os.path.dirname(name)
+            if parent and parent not in dirs:
+                info = tarfile.TarInfo(parent)
+                info.type = tarfile.DIRTYPE
+                info.mode = 0o755
+                info.mtime = int(time.time())
+                tar.addfile(info)
+                dirs.add(parent)
+            info = tarfile.TarInfo(name)
+            info.size = len(content)
+            info.mode = 0o644
+            info.mtime = int(time.time())
+            tar.addfile(info, io.BytesIO(content))
+    return buffer.getvalue()
+
+
 class DockerCommand:
     __slots__ = "docker"
 
@@ -122,6 +357,16 @@ class DockerCommand:
             pass
         return result
 
+    def _create(
+        self, image: str, cmd: str, opts: Dict[str, Any]
+    ) -> docker.models.containers.Container:
+        """Like `containers.run`, it pulls the image if it doesn't exist"""
+        try:
+            return self.docker.containers.create(image, cmd, **opts)
+        except docker.errors.ImageNotFound:
+            self.docker.images.pull(image)
+            return self.docker.containers.create(image, cmd, **opts)
+
     def run(
         self,
         cmd: str,
@@ -135,7 +380,23 @@ class DockerCommand:
         ports=None,
         resources=DockerResources(),
         volumes: List[DockerVolume] = [],
+        logs_stream: Optional[LogsStream] = None,
+        files: Optional[Dict[str, bytes]] = None,
+        stats_sampler: Optional[StatsSampler] = None,
     ) -> DockerRunResult:
+        """
+        It runs `cmd` in a new container and waits for it.
+
+        By default, logs are read when the container stops. If `logs_stream`
+        is given, logs are followed while the container runs and only
+        the tail kept by `logs_stream` is returned in the result.
+
+        `files` are copied into the container before it starts, by path.
+        It's used to pass data that doesn't fit in environment variables.
+
+        If `stats_sampler` is given, the resources used by the container
+        are sampled while it runs, and its summary is added to the result.
+        """
 
         runtime = None
         if require_gpu:
@@ -143,23 +404,47 @@ class DockerCommand:
 
         logs = ""
         status_code = -1
+        stats = None
         try:
-            container = self.docker.containers.run(
-                image,
-                cmd,
+            opts = dict(
                 runtime=runtime,
-                detach=True,
                 environment=env_data,
                 network_mode=network_mode,
                 ports=ports,
                 **resources.dict(),
             )
+            if files:
+                container = self._create(image, cmd, opts)
+                container.put_archive("/", tar_files(files))
+                container.start()
+            else:
+                container = self.docker.containers.run(image, cmd, detach=True, **opts)
+            follower = None
+            if logs_stream:
+                follower = threading.Thread(
+                    target=logs_stream.follow, args=(container,), daemon=True
+                )
+                follower.start()
+            sampler = None
+            if stats_sampler:
+                sampler = threading.Thread(
+                    target=stats_sampler.follow, args=(container,), daemon=True
+                )
+                sampler.start()
             result = self._wait_result(container, timeout)
             if not result:
                 container.kill()
             else:
                 status_code = result["StatusCode"]
-            logs = container.logs().decode("utf-8")
+            if sampler:
+                stats_sampler.stop()
+                sampler.join(timeout=5)
+                stats = stats_sampler.summary()
+            if follower:
+                follower.join(timeout=10)
+                logs = logs_stream.text
+            else:
+                logs = container.logs().decode("utf-8")
             if remove:
                 container.remove()
         except docker.errors.ContainerError as e:
@@ -170,7 +455,7 @@ class DockerCommand:
             logs = str(e)
             log.error_logger.error(str(e))
             status_code = -3
-        return DockerRunResult(msg=logs, status=status_code)
+        return DockerRunResult(msg=logs, status=status_code, stats=stats)
 
     def build(
         self, path: str, dockerfile: str, tag: str, version: str, rm=False, push=False
@@ -187,10 +472,12 @@ class DockerCommand:
         error_build = False
         error_push = False
 
+        digest = None
         build_log = docker_low_build(path, dockerfile, tag, rm)
         if not build_log.error:
             img = self.docker.images.get(tag)
             img.tag(tag, tag=version)
+            digest = img.id
 
         error_build = build_log.error
 
@@ -203,7 +490,13 @@ class DockerCommand:
         if error_build or error_push:
             error = True
 
-        return DockerBuildLog(build_log=build_log, push_log=push_log, error=error)
+        return DockerBuildLog(
+            build_log=build_log,
+            push_log=push_log,
+            error=error,
+            image=f"{tag}:{version}",
+            digest=digest,
+        )
 
     def push_image(self, tag) -> DockerPushLog:
         """
@@ -66,7 +66,8 @@ def create_notebook_ctx(
     output_dir = f"{defaults.NB_OUTPUTS}/ok/{today}"
     error_dir = f"{defaults.NB_OUTPUTS}/errors/{today}"
 
-    output_name = f"{wfid}.{task.nb_name}.{execid}.ipynb"
+    ext = defaults.NB_OUTPUT_EXTS[task.mode]
+    output_name = f"{wfid}.{task.nb_name}.{execid}.{ext}"
     _runtime = prepare_runtime(runtime)
     machine = task.machine or defaults.MACHINE_TYPE
 
@@ -88,4 +89,8 @@ def create_notebook_ctx(
         created_at=_now,
         notifications_ok=task.notifications_ok,
         notifications_fail=task.notifications_fail,
+        mode=task.mode,
+        checkpoint=task.checkpoint,
+        retry=task.retry,
+        output_policy=task.output_policy,
     )
@@ -27,6 +27,10 @@ def run(conf: AgentConfig):
     :param name: a custom name for this worker
     :param ip_address: the ip as worker that will advertise to Redis.
     :param workers_n: how many worker to run
+    :param in_process: jobs are executed in the worker process without forking,
+    it allows to reuse connections between jobs of the control plane.
+    :param warm_pool: notebooks are executed in a pool of warm containers,
+    it needs `in_process`.
     """
 
     name = conf.agent_name or conf.machine_id.rsplit("/", maxsplit=1)[1]
@@ -63,7 +67,13 @@ def run(conf: AgentConfig):
         _executor = get_reusable_executor(max_workers=conf.workers_n, kill_workers=True)
         _results = [
             _executor.submit(
-                start_worker, conf.redis_dsn, cluster_queues, conf.ip_address, name_i
+                start_worker,
+                conf.redis_dsn,
+                cluster_queues,
+                conf.ip_address,
+                name_i,
+                conf.in_process,
+                conf.warm_pool,
             )
             for name_i in workers_names
         ]
@@ -73,6 +83,8 @@ def run(conf: AgentConfig):
             cluster_queues,
             name=workers_names[0],
             ip_address=conf.ip_address,
+            in_process=conf.in_process,
+            warm_pool=conf.warm_pool,
         )
     ag.unregister(node)
     heart.unregister()
@@ -0,0 +1,213 @@
+import asyncio
+import heapq
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from croniter import croniter
+
+from labfunctions.types import ScheduleData, WorkflowData
+from labfunctions.utils import run_async
+
+logger = logging.getLogger(__name__)
+
+Loader = Callable[[], Awaitable[List[Tuple[str, WorkflowData]]]]
+
+
+@dataclass(order=True)
+class TimerEntry:
+    """A workflow waiting in the heap for its next fire time.
+    Only `fire_at` is used to order the heap."""
+
+    fire_at: float
+    projectid: str = field(compare=False)
+    wfid: str = field(compare=False)
+    schedule: ScheduleData = field(compare=False)
+    fired: int = field(default=0, compare=False)
+    cancelled: bool = field(default=False, compare=False)
+
+
+def next_fire(schedule: ScheduleData, after: float, first=False) -> Optional[float]:
+    """
+    Calculates the next fire time, as a timestamp in UTC, of a schedule.
+
+    :param after: timestamp from which the next fire is calculated.
+    :param first: if it is the first time, then `start_in_min` is taken
+    into account.
+    """
+    if first and schedule.start_in_min:
+        after = after + schedule.start_in_min * 60
+    if schedule.cron:
+        # croniter works in UTC when a timestamp is given
+        return croniter(schedule.cron, after).get_next(float)
+    if schedule.interval:
+        if first:
+            return after
+        return after + float(schedule.interval)
+    return None
+
+
+class TimerScheduler:
+    """
+    A scheduler for workflows that keeps the next fire time of each
+    workflow in a heap. Instead of polling Redis every x seconds like
+    rq-scheduler does, it sleeps until the next fire time, so each
+    fire costs O(log n) and it has sub-second precision.
+
+    Workflows are loaded from the database every `reload_secs`, changes in
+    their schedule replace the old entry which is lazily discarded when
+    it reaches the top of the heap.
+
+    The `repeat` count of each schedule is kept in memory, so it starts
+    again if the service is restarted. Workflows which ran all their
+    repeats are not scheduled again by the reloads until their schedule
+    changes.
+
+    :param dispatcher: a sync function with the signature (projectid, wfid),
+    usually :meth:`labfunctions.scheduler.SchedulerExecutor.dispatcher`.
+    :param reload_secs: how often workflows are reloaded from the database.
+    """
+
+    def __init__(self, dispatcher: Callable[[str, str], None], reload_secs=60):
+        self.dispatcher = dispatcher
+        self.reload_secs = reload_secs
+        self._heap: List[TimerEntry] = []
+        self._entries: Dict[str, TimerEntry] = {}
+        # schedules of the workflows without more fires
+        self._finished: Dict[str, ScheduleData] = {}
+
+    def __len__(self):
+        return len(self._entries)
+
+    def add(
+        self, projectid: str, wfid: str, schedule: ScheduleData, now=None
+    ) -> Optional[TimerEntry]:
+        """Adds or replaces the schedule of a workflow"""
+        now = time.time() if now is None else now
+        self.remove(wfid)
+        self._finished.pop(wfid, None)
+        fire_at = next_fire(schedule, now, first=True)
+        if fire_at is None:
+            return None
+        entry = TimerEntry(
+            fire_at=fire_at, projectid=projectid, wfid=wfid, schedule=schedule
+        )
+        self._entries[wfid] = entry
+        heapq.heappush(self._heap, entry)
+        return entry
+
+    def remove(self, wfid: str):
+        entry = self._entries.pop(wfid, None)
+        if entry:
+            entry.cancelled = True
+
+    def next_fire_at(self) -> Optional[float]:
+        while self._heap and self._heap[0].cancelled:
+            heapq.heappop(self._heap)
+        if self._heap:
+            return self._heap[0].fire_at
+        return None
+
+    def pop_due(self, now=None) -> List[TimerEntry]:
+        """It returns the entries to fire and schedules their next fire"""
+        now = time.time() if now is None else now
+        due = []
+        while self._heap and self._heap[0].fire_at <= now:
+            entry = heapq.heappop(self._heap)
+            if entry.cancelled:
+                continue
+            due.append(entry)
+            entry.fired += 1
+            repeat = entry.schedule.repeat
+            # anchored to the previous fire to avoid drifting, if it
+            # was missed then starts again from now
+            fire_at = next_fire(entry.schedule, entry.fire_at)
+            if fire_at is not None and fire_at <= now:
+                fire_at = next_fire(entry.schedule, now)
+            if fire_at is None or (repeat is not None and entry.fired >= repeat):
+                del self._entries[entry.wfid]
+                self._finished[entry.wfid] = entry.schedule
+                continue
+            entry.fire_at = fire_at
+            heapq.heappush(self._heap, entry)
+        return due
+
+    def sync_workflows(self, workflows: List[Tuple[str, WorkflowData]], now=None):
+        """
+        It updates the heap from a full list of workflows:
+        new or changed schedules are added and missing ones removed.
+        Finished schedules are only added again if they changed.
+        """
+        now = time.time() if now is None else now
+        current = set()
+        for projectid, wd in workflows:
+            if not wd.enabled or not wd.schedule:
+                continue
+            current.add(wd.wfid)
+            if self._finished.get(wd.wfid) == wd.schedule:
+                continue
+            entry = self._entries.get(wd.wfid)
+            if not entry or entry.schedule != wd.schedule:
+                self.add(projectid, wd.wfid, wd.schedule, now=now)
+        for wfid in set(self._entries.keys()) - current:
+            self.remove(wfid)
+
+    async def fire(self, entry: TimerEntry):
+        try:
+            await run_async(self.dispatcher, entry.projectid, entry.wfid)
+            logger.info("TIMERS: fired %s", entry.wfid)
+        except Exception as e:  # pylint: disable=broad-except
+            logger.error("TIMERS: error firing %s: %s", entry.wfid, e)
+
+    async def run(self, loader: Loader, max_sleep=5.0):
+        """
+        Main loop.
+        :param loader: an async function which returns all the scheduled
+        workflows, see :func:`labfunctions.managers.workflows_mg.get_scheduled`
+        :param max_sleep: max time in seconds to sleep between checks.
+        """
+        next_reload = 0.0
+        while True:
+            now = time.time()
+            if now >= next_reload:
+                self.sync_workflows(await loader(), now=now)
+                next_reload = now + self.reload_secs
+                logger.info("TIMERS: %s workflows scheduled", len(self))
+
+            due = self.pop_due(now)
+            if due:
+                await asyncio.gather(*[self.fire(e) for e in due])
+
+            wake = min(next_reload, now + max_sleep)
+            fire_at = self.next_fire_at()
+            if fire_at is not None:
+                wake = min(wake, fire_at)
+            await asyncio.sleep(max(wake - time.time(), 0))
+
+
+def run(sql_dsn: str, redis_dsn: str, qname: str, reload_secs=60):
+    """Entrypoint used by the cli"""
+    # pylint: disable=import-outside-toplevel
+    import redis
+
+    from labfunctions.db.nosync import AsyncSQL
+    from labfunctions.managers import workflows_mg
+    from labfunctions.scheduler import SchedulerExecutor
+
+    db = AsyncSQL(sql_dsn)
+    sche = SchedulerExecutor(redis.from_url(redis_dsn), qname=qname)
+    timers = TimerScheduler(sche.dispatcher, reload_secs=reload_secs)
+
+    async def loader():
+        session = db.sessionmaker()
+        async with session.begin():
+            rows = await workflows_mg.get_scheduled(session)
+        await session.close()
+        return rows
+
+    async def main():
+        await db.init()
+        await timers.run(loader)
+
+    asyncio.run(main())
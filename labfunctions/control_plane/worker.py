@@ -1,9 +1,11 @@
 import os
 from datetime import datetime
-from typing import List
+from typing import List, Optional
 
 import redis
-from rq import Connection, Worker
+from rq import Connection, SimpleWorker, Worker
+
+from labfunctions.executors.pool import close_pool, init_pool
 
 
 class NBWorker(Worker):
@@ -20,14 +22,60 @@ class NBWorker(Worker):
         return birth_elapsed - working
 
 
-def start_worker(redis_dsn, queues: List[str], ip_address: str, name: str):
+class NBSimpleWorker(SimpleWorker, NBWorker):
+    """
+    It runs jobs in the same process of the worker instead of forking
+    a work horse for each job. Used by the control plane, it allows
+    the dispatchers to reuse the db and redis connections between jobs.
+    """
+
+    pass
+
+
+def init_control_resources(queues: List[str], control_queue: Optional[str] = None):
+    """
+    If the worker listens to the control queue, then the resources used by
+    :func:`labfunctions.scheduler.scheduler_dispatcher` are created once here
+    instead of once by dispatch.
+    """
+    # pylint: disable=import-outside-toplevel
+    from labfunctions.conf.server_settings import settings
+
+    control_queue = control_queue or settings.CONTROL_QUEUE
+    if control_queue in queues:
+        from labfunctions.scheduler import init_dispatcher_resources
+
+        init_dispatcher_resources()
+
+
+def start_worker(
+    redis_dsn,
+    queues: List[str],
+    ip_address: str,
+    name: str,
+    in_process=False,
+    warm_pool=False,
+):
 
     rdb = redis.from_url(redis_dsn)
     pid = os.getpid()
+    init_control_resources(queues)
+    if warm_pool and in_process:
+        init_pool()
+    elif warm_pool:
+        # the pool would be lost with each work horse
+        print("Warm pool ignored, it needs in process workers")
 
     with Connection(connection=rdb):
         print(f"Running in {pid} with ip {ip_address}", pid)
         # qs = sys.argv[1:] or ['default']
-        w = NBWorker(queues, name=name)
+        if in_process:
+            w = NBSimpleWorker(queues, name=name)
+        else:
+            w = NBWorker(queues, name=name)
         w.set_ip_address(ip_address)
-        w.work()
+        try:
+            # the scheduler moves the retries to the queues when it's time
+            w.work(with_scheduler=True)
+        finally:
+            close_pool()
@@ -0,0 +1,29 @@
+"""history parent_id
+
+Revision ID: 0001
+Revises: 0000
+Create Date: 2022-06-20 11:12:40.418253
+
+"""
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "0001"
+down_revision = "0000"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column(
+        "nb_history", sa.Column("parent_id", sa.String(length=24), nullable=True)
+    )
+    op.create_index(
+        op.f("ix_nb_history_parent_id"), "nb_history", ["parent_id"], unique=False
+    )
+
+
+def downgrade():
+    op.drop_index(op.f("ix_nb_history_parent_id"), table_name="nb_history")
+    op.drop_column("nb_history", "parent_id")
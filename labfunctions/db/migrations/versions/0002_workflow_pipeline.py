@@ -0,0 +1,23 @@
+"""workflow pipeline
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2022-06-27 16:40:03.218820
+
+"""
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column("nb_workflow", sa.Column("pipeline", sa.JSON(), nullable=True))
+
+
+def downgrade():
+    op.drop_column("nb_workflow", "pipeline")
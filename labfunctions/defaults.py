@@ -47,8 +47,76 @@ DOCKER_APP_GID = 1090
 SANIC_APP_NAME = "labfunctions"
 
 NB_OUTPUTS = "outputs"
+# encoding used to upload and store the notebooks executed
+NB_OUTPUT_ENCODING = "gzip"
+# the encoding of an output is marked in its key with an extension
+NB_OUTPUT_ENCODINGS = {"gzip": ".gz"}
+NB_OUTPUT_CHUNK_SIZE = 64 * 1024
+OUTPUT_MAX_CELL_BYTES = 1024 * 1024
+# outputs externalized by an OutputPolicyData, inside of NB_OUTPUTS
+OUTPUT_OBJECTS_DIR = "objects"
+
+# parallel transfers of the kv stores, see GenericKVSpec.put_parallel
+KV_PART_SIZE = 8 * 1024 * 1024
+KV_CONCURRENCY = 4
+# chunks of the streams of the kv stores, and chunks read ahead by async stores
+KV_CHUNK_SIZE = 256 * 1024
+KV_READ_AHEAD = 4
+# keys of each page of GenericKVSpec.list
+KV_LIST_LIMIT = 1000
+# local cache of labfunctions.io.kv_cached.CachedKV
+KV_CACHE_DIR = f"{CLIENT_TMP_FOLDER}/kv_cache"
+KV_CACHE_MAX_BYTES = 2 * 1024**3
+
+# http clients of labfunctions.io.kv_files, see KVFiles
+KV_FILES_TIMEOUT = 60
+KV_FILES_MAX_CONNECTIONS = 20
+KV_FILES_MAX_KEEPALIVE = 10
+KV_FILES_KEEPALIVE_EXPIRY = 30.0
+KV_FILES_RETRIES = 3
+KV_FILES_BACKOFF = 0.5
 
 EXECUTIONTASK_VAR = "LF_EXECUTION_TASK"
+# the execution ctx is written to a file inside the container
+EXECUTIONTASK_FILE_VAR = "LF_EXECUTION_TASK_FILE"
+EXECUTIONTASK_DIR = "/tmp/lf"
+# params bigger than this (in bytes) are stored in the kv store
+EXECUTIONTASK_PARAMS_MAX = 32 * 1024
+EXECUTIONTASK_PARAMS_DIR = "params"
+# bump it if ExecutionTemplate changes in a non compatible way
+EXECUTION_TEMPLATE_VERSION = 2
+EXECUTION_TEMPLATE_PREFIX = "lf.tpl"
+EXECUTION_TEMPLATE_TTL = 60 * 60 * 24
+# max workflows to enqueue in one request
+QUEUE_MANY_MAX = 1000
+SWEEP_PREFIX = "lf.sweep"
+SWEEP_MAX_CONCURRENCY = 10
+SWEEP_TTL = 60 * 60 * 24 * 7
+PIPELINE_PREFIX = "lf.pipe"
+PIPELINE_TTL = 60 * 60 * 24 * 7
+PIPELINE_NAME = "pipeline"
+RESULTS_CACHE_PREFIX = "lf.rcache"
+RESULTS_CACHE_TTL = 60 * 60 * 24
+# params which change in each execution
+RESULTS_CACHE_IGNORE = ("EXECID", "NOW")
+# batches of short executions which share a container
+BATCH_PREFIX = "lf.batch"
+BATCH_WINDOW_SECS = 5
+BATCH_MAX_SIZE = 20
+BATCH_TTL = 60 * 60 * 24
+# warm containers pool of the agent
+WARM_POOL_CMD = "lab exec serve"
+WARM_POOL_MARKER = "__LF_RESULT__"
+WARM_POOL_MAX_RUNS = 50
+WARM_POOL_MAX_MEM_MB = 1024
+WARM_POOL_MAX_IDLE = 2
+WARM_POOL_IDLE_SECS = 60 * 5
+# logs of the containers published as events
+DOCKER_LOGS_BATCH_LINES = 50
+DOCKER_LOGS_BATCH_SECS = 1
+DOCKER_LOGS_TAIL = 200
+# seconds between samples of the docker stats api
+DOCKER_STATS_INTERVAL = 5
 JUPYTERCTX_VAR = "LF_JUPYTER_CTX"
 
 BASE_PATH_ENV = "LF_BASE_PATH"
@@ -81,3 +149,28 @@ DOCKER_CUDA_VER = "11.6"
 SERVER_LOG = "lab.server"
 ERROR_LOG = "lab.error"
 CLIENT_LOG = "lab.client"
+
+# extension of the output of each mode of execution, see NBTask.mode
+NB_OUTPUT_EXTS = {"notebook": "ipynb", "script": "log"}
+SCRIPTS_CACHE_DIR = f"{CLIENT_TMP_FOLDER}/scripts"
+SCRIPTS_LOG_TAIL = 4096  # bytes of the log used as error msg
+
+RETRY_MAX_ATTEMPTS = 3
+RETRY_BACKOFF_SECS = 10
+RETRY_MAX_BACKOFF_SECS = 60 * 10
+
+CHECKPOINT_ENGINE = "lf_checkpoints"
+CHECKPOINT_TAG = "checkpoint"
+CHECKPOINTS_DIR = "checkpoints"
+
+KERNEL_POOL_ENGINE = "lf_kernels"
+KERNEL_POOL_NAME = "python3"
+KERNEL_POOL_SIZE = 1
+KERNEL_POOL_MAX_RUNS = 20
+KERNEL_POOL_RESET = "namespace"
+
+# private keys and agent tokens cached by the agent, relative to the home
+AGENT_CREDS_DIR = f"{CLIENT_HOME_DIR}agent_creds"
+AGENT_CREDS_TTL = 60 * 10
+AGENT_CREDS_REFRESH = 0.8  # ratio of the ttl after which they are refreshed
+AGENT_CREDS_MARGIN = 60 * 60  # secs a token should be valid after its use
@@ -0,0 +1,171 @@
+import logging
+import os
+import pickle
+import tempfile
+import time
+from typing import Callable, Optional
+
+from nbclient.exceptions import CellExecutionError
+from papermill.clientwrap import PapermillNotebookClient
+from papermill.engines import NBClientEngine, papermill_engines
+
+from labfunctions import defaults
+from labfunctions.types import CheckpointData
+
+from .kernels import client_kwargs
+
+logger = logging.getLogger(__name__)
+
+# code run inside the kernel. Each variable is pickled alone, so variables
+# which can't be pickled (connections, generators) are skipped. Names of
+# IPython and names starting with "_" are not stored.
+_SAVE_CODE = """
+def _lf_save(path, cell):
+    import pickle
+    import cloudpickle
+    ns = {{}}
+    skipped = []
+    for name, value in list(get_ipython().user_ns.items()):
+        if name.startswith("_") or name in ("In", "Out", "exit", "quit"):
+            continue
+        try:
+            ns[name] = cloudpickle.dumps(value)
+        except Exception:
+            skipped.append(name)
+    with open(path, "wb") as f:
+        pickle.dump(dict(cell=cell, ns=ns, skipped=skipped), f)
+_lf_save({path!r}, {cell})
+del _lf_save
+"""
+
+_LOAD_CODE = """
+def _lf_load(path):
+    import pickle
+    import cloudpickle
+    with open(path, "rb") as f:
+        data = pickle.load(f)
+    for name, value in data["ns"].items():
+        try:
+            get_ipython().user_ns[name] = cloudpickle.loads(value)
+        except Exception as e:
+            print(f"Checkpoint: {{name}} not restored: {{e}}")
+_lf_load({path!r})
+del _lf_load
+"""
+
+
+def checkpoint_cell(path: str) -> Optional[int]:
+    """
+    Index of the cell of a checkpoint file. Only the outer pickle is loaded,
+    variables are pickled bytes, so the code of the notebook isn't needed.
+    """
+    try:
+        with open(path, "rb") as f:
+            return pickle.load(f)["cell"]
+    except (OSError, EOFError, pickle.UnpicklingError, KeyError):
+        return None
+
+
+class Checkpointer:
+    """
+    It decides when a checkpoint is stored, and moves checkpoints between
+    the kernel and the kv store of the project.
+
+    :param load: it downloads the last checkpoint of the execution to the
+    path given, returns False if there isn't one.
+    :param store: it uploads the checkpoint in the path given.
+    """
+
+    def __init__(
+        self,
+        conf: CheckpointData,
+        load: Callable[[str], bool],
+        store: Callable[[str], bool],
+    ):
+        self.conf = conf
+        self._load = load
+        self._store = store
+        self._last = time.monotonic()
+        self.resumed_from: Optional[int] = None
+        self.saved = 0
+
+    def should_save(self, cell) -> bool:
+        tags = cell.get("metadata", {}).get("tags", [])
+        if self.conf.tag in tags:
+            return True
+        every = self.conf.every_secs
+        return bool(every) and time.monotonic() - self._last >= every
+
+    def save(self, client: "CheckpointNotebookClient", index: int):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "checkpoint.pickle")
+            ok = client.run_code(_SAVE_CODE.format(path=path, cell=index))
+            if ok and self._store(path):
+                self.saved += 1
+            else:
+                logger.warning("CHECKPOINT: cell %s not stored", index)
+        self._last = time.monotonic()
+
+    def restore(self, client: "CheckpointNotebookClient") -> Optional[int]:
+        """:return: the index of the cell restored, if any"""
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "checkpoint.pickle")
+            if not self._load(path):
+                return None
+            cell = checkpoint_cell(path)
+            if cell is None or not client.run_code(_LOAD_CODE.format(path=path)):
+                logger.warning("CHECKPOINT: invalid checkpoint, starting again")
+                return None
+        self.resumed_from = cell
+        return cell
+
+
+class CheckpointNotebookClient(PapermillNotebookClient):
+    """
+    The client of papermill, but it skips the cells of the checkpoint
+    restored and stores checkpoints while it runs.
+    """
+
+    def __init__(self, nb_man, checkpointer: Checkpointer, **kw):
+        super().__init__(nb_man, **kw)
+        self.checkpointer = checkpointer
+
+    def run_code(self, code: str) -> bool:
+        """It runs code in the kernel, without outputs or history"""
+        msg_id = self.kc.execute(code, silent=True, store_history=False)
+        reply = self.wait_for_reply(msg_id)
+        return bool(reply) and reply["content"]["status"] == "ok"
+
+    def papermill_execute_cells(self):
+        restored = self.checkpointer.restore(self)
+        for index, cell in enumerate(self.nb.cells):
+            if restored is not None and index <= restored:
+                continue
+            try:
+                self.nb_man.cell_start(cell, index)
+                self.execute_cell(cell, index)
+            except CellExecutionError as ex:
+                self.nb_man.cell_exception(
+                    self.nb.cells[index], cell_index=index, exception=ex
+                )
+                break
+            finally:
+                self.nb_man.cell_complete(self.nb.cells[index], cell_index=index)
+            if cell.cell_type == "code" and self.checkpointer.should_save(cell):
+                self.checkpointer.save(self, index)
+
+
+class CheckpointEngine(NBClientEngine):
+    """
+    Papermill engine registered as `defaults.CHECKPOINT_ENGINE`, it needs
+    a :class:`Checkpointer` as the `checkpointer` kwarg.
+    """
+
+    @classmethod
+    def execute_managed_notebook(cls, nb_man, kernel_name, **kwargs):
+        checkpointer = kwargs.pop("checkpointer")
+        final_kwargs = client_kwargs(kernel_name, **kwargs)
+        return CheckpointNotebookClient(nb_man, checkpointer, **final_kwargs).execute()
+
+
+papermill_engines.register(defaults.CHECKPOINT_ENGINE, CheckpointEngine)
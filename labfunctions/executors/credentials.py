@@ -0,0 +1,151 @@
+import fcntl
+import json
+import logging
+import os
+import tempfile
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Optional, Union
+
+import jwt
+
+from labfunctions import defaults
+from labfunctions.client.nbclient import NBClient
+from labfunctions.types.user import AgentCredentials, AgentJWTResponse
+from labfunctions.utils import secure_filename
+
+logger = logging.getLogger(__name__)
+
+
+def token_exp(token: str) -> Optional[float]:
+    """Expiration of a jwt, without verifying its signature"""
+    try:
+        claims = jwt.decode(token, options={"verify_signature": False})
+    except jwt.PyJWTError:
+        return None
+    return claims.get("exp")
+
+
+class CredentialsCache:
+    """
+    The private key and the agent token of each project, cached on disk
+    to be shared by every worker of the machine, so the web server is called
+    once per project every `ttl_secs`, instead of twice per task.
+
+    After `refresh_ratio` of the ttl, the first worker which takes the lock of
+    the project fetches new credentials while the others keep using
+    the cached ones. When the credentials expire, the workers wait for the lock
+    and only the first one fetches them again.
+
+    An entry expires at least `margin_secs` before its token, so the token
+    is still valid while the task runs.
+
+    :param client: the client of the agent.
+    :param cache_dir: by default `defaults.AGENT_CREDS_DIR` in the home of the user.
+    """
+
+    def __init__(
+        self,
+        client: NBClient,
+        cache_dir: Union[str, Path, None] = None,
+        ttl_secs: int = defaults.AGENT_CREDS_TTL,
+        refresh_ratio: float = defaults.AGENT_CREDS_REFRESH,
+        margin_secs: int = defaults.AGENT_CREDS_MARGIN,
+        now: Callable[[], float] = time.time,
+    ):
+        self.client = client
+        self.dir = Path(cache_dir or Path.home() / defaults.AGENT_CREDS_DIR)
+        self.ttl = ttl_secs
+        self.refresh_ratio = refresh_ratio
+        self.margin = margin_secs
+        self._now = now
+        self.fetched = 0
+
+    def _path(self, projectid: str, ext="json") -> Path:
+        return self.dir / f"{secure_filename(projectid)}.{ext}"
+
+    def _read(self, projectid: str) -> Optional[AgentCredentials]:
+        try:
+            with open(self._path(projectid), "r", encoding="utf-8") as f:
+                return AgentCredentials(**json.loads(f.read()))
+        except (OSError, ValueError):
+            return None
+
+    def _write(self, creds: AgentCredentials):
+        # mkstemp creates the file with 0600, replace is atomic
+        fd, tmp = tempfile.mkstemp(dir=self.dir, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(creds.json())
+        os.replace(tmp, self._path(creds.projectid))
+
+    @contextmanager
+    def _lock(self, projectid: str, blocking=True):
+        self.dir.mkdir(mode=0o700, parents=True, exist_ok=True)
+        with open(self._path(projectid, ext="lock"), "w") as f:
+            flags = fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB
+            try:
+                fcntl.flock(f, flags)
+            except BlockingIOError:
+                yield False
+                return
+            try:
+                yield True
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def fetch(self, projectid: str) -> AgentCredentials:
+        """It gets the credentials from the web server and caches them"""
+        key = self.client.projects_private_key(projectid)
+        if not key:
+            raise IndexError(f"No priv key found for {projectid}")
+        token = self.client.projects_agent_token(projectid=projectid)
+        if not token:
+            raise IndexError(f"No agent token found for {projectid}")
+        now = self._now()
+        expires = now + self.ttl
+        exp = token_exp(token.creds.access_token)
+        if exp:
+            expires = min(expires, exp - self.margin)
+        creds = AgentCredentials(
+            projectid=projectid,
+            private_key=key,
+            agent_token=token,
+            fetched_at=now,
+            expires_at=expires,
+        )
+        self.fetched += 1
+        self._write(creds)
+        return creds
+
+    def get(self, projectid: str) -> AgentCredentials:
+        creds = self._read(projectid)
+        now = self._now()
+        if creds and now < creds.expires_at:
+            lifetime = creds.expires_at - creds.fetched_at
+            if now < creds.fetched_at + lifetime * self.refresh_ratio:
+                return creds
+            with self._lock(projectid, blocking=False) as locked:
+                if not locked:
+                    return creds
+                try:
+                    return self.fetch(projectid)
+                except Exception as e:  # pylint: disable=broad-except
+                    logger.warning("CREDENTIALS: %s not refreshed: %s", projectid, e)
+                    return creds
+
+        with self._lock(projectid):
+            # another worker could have fetched them while waiting
+            creds = self._read(projectid)
+            if creds and self._now() < creds.expires_at:
+                return creds
+            return self.fetch(projectid)
+
+    def private_key(self, projectid: str) -> str:
+        return self.get(projectid).private_key
+
+    def agent_token(self, projectid: str) -> AgentJWTResponse:
+        return self.get(projectid).agent_token
+
+    def invalidate(self, projectid: str):
+        self._path(projectid).unlink(missing_ok=True)
@@ -2,11 +2,16 @@ import json
 import logging
 import os
 from datetime import datetime, timedelta
+from typing import List
+
+from rq import get_current_job
 
 from labfunctions import client, defaults, secrets
 
 # from labfunctions.executors import context
 # from labfunctions.conf.server_settings import settings
+from labfunctions.notebooks import retries
+from labfunctions.notebooks.batches import Batches
 from labfunctions.types import ExecutionNBTask, ExecutionResult
 
 from .nbtask_base import NBTaskDocker
@@ -17,17 +22,54 @@ def docker_exec(ctx: ExecutionNBTask) -> ExecutionResult:
     It will get a wfid from the control plane.
     This function runs in RQ Worker from a data plane machine.
 
-    Passing task exec information though serialized as an environment
-    variable could be a questionable design decision, checks:
+    The task exec information is written to a file inside the container
+    instead of an environment variable, because of its size limits, checks:
         - https://www.in-ulm.de/~mascheck/various/argmax/
         - and https://stackoverflow.com/questions/1078031/what-is-the-maximum-size-of-a-linux-environment-variable-value
         - and getconf -a | grep ARG_MAX # (value in kib)
+
+    If the execution fails and the task has a retry policy, the next
+    attempt is scheduled, see :func:`labfunctions.notebooks.retries.enqueue_retry`.
     """
 
     nbclient = client.from_env()
     print("NB Addr: ", nbclient._addr)
     runner = NBTaskDocker(nbclient)
     result = runner.run(ctx)
+    job = get_current_job()
+    if result.error and job:
+        retries.enqueue_retry(job, ctx, result)
     if result.error and not os.getenv("DEBUG"):
         runner.register(result)
+    elif result.resources:
+        # the result was registered from the container
+        nbclient.history_set_resources(
+            result.projectid, result.execid, result.resources
+        )
     return result
+
+
+def docker_exec_batch(open_key: str, batchid: str) -> List[ExecutionResult]:
+    """
+    It runs a batch of executions in one container, see
+    :meth:`labfunctions.scheduler.SchedulerExecutor.enqueue_batched`.
+
+    Each execution registers its own result from the container, only the
+    executions without result, because the container failed, are registered
+    here as errors.
+    """
+    batches = Batches(get_current_job().connection)
+    batches.wait(open_key, batchid)
+    ctxs = batches.close(open_key, batchid)
+    if not ctxs:
+        return []
+
+    nbclient = client.from_env()
+    runner = NBTaskDocker(nbclient)
+    results = runner.run_batch(ctxs)
+    for result in results:
+        if not result.error or os.getenv("DEBUG"):
+            continue
+        if not nbclient.history_detail(result.execid):
+            runner.register(result)
+    return results
@@ -0,0 +1,365 @@
+import hashlib
+import logging
+import os
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+from jupyter_client import AsyncKernelManager
+from nbclient.util import ensure_async, run_sync
+from papermill.clientwrap import PapermillNotebookClient
+from papermill.engines import NBClientEngine, papermill_engines
+from papermill.utils import merge_kwargs, remove_args
+
+from labfunctions import defaults
+
+logger = logging.getLogger(__name__)
+
+# it clears the namespace of the user, modules already imported are kept
+_RESET_CODE = (
+    "get_ipython().reset(new_session=True, aggressive=False)\n"
+    "__import__('os').chdir({cwd!r})"
+)
+# the environ of the kernel is the one of the task, not the one of its start
+_ENV_CODE = "__import__('os').environ.clear()\n__import__('os').environ.update({env!r})"
+
+
+def kernel_scope(projectid: str = "") -> str:
+    """
+    Kernels used by a notebook are only reused by notebooks of the same
+    scope: the project and its private key. Modules imported are kept
+    between runs, like the secrets decrypted by `labfunctions.shortcuts`.
+    """
+    priv_key = os.getenv(defaults.PRIVKEY_VAR_NAME, "")
+    digest = hashlib.sha256(priv_key.encode("utf-8")).hexdigest()[:16]
+    return f"{projectid}:{digest}"
+
+
+class PooledKernel:
+    """
+    A kernel started by :class:`KernelPool` and the cwd of its start.
+    `scope` is the one of the notebooks which used it, None if it's new.
+    """
+
+    def __init__(self, kernel_name: str, cwd: str, env: Optional[Dict] = None):
+        self.kernel_name = kernel_name
+        self.cwd = cwd
+        self.runs = 0
+        self.scope: Optional[str] = None
+        self.km = AsyncKernelManager(kernel_name=kernel_name)
+        self.km.client_class = "jupyter_client.asynchronous.AsyncKernelClient"
+        kwargs = dict(cwd=cwd) if env is None else dict(cwd=cwd, env=env)
+        run_sync(self.km.start_kernel)(**kwargs)
+
+    @property
+    def pid(self) -> Optional[int]:
+        return getattr(self.km.provisioner, "pid", None)
+
+    def is_alive(self) -> bool:
+        return run_sync(self.km.is_alive)()
+
+    def restart(self):
+        run_sync(self.km.restart_kernel)(now=True)
+
+    def close(self):
+        try:
+            run_sync(self.km.shutdown_kernel)(now=True)
+        except RuntimeError as e:
+            logger.warning("KERNELS: error shutting down kernel: %s", e)
+
+
+@dataclass
+class KernelPoolStats:
+    """
+    :param hits: notebooks executed in a kernel already started
+    :param misses: notebooks which needed a new kernel
+    :param recycled: kernels shut down after max runs or errors
+    """
+
+    hits: int = 0
+    misses: int = 0
+    recycled: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+
+class KernelPool:
+    """
+    Pool of Jupyter kernels used by the papermill engine
+    `defaults.KERNEL_POOL_ENGINE`, so many notebooks can run one after
+    another without waiting for a kernel to start each time.
+
+    `size` kernels by kernel name are started in advance with :meth:`warm`
+    or after the first notebook. Between runs, the state of the kernel is
+    reset by `reset`:
+
+    - "namespace": the variables of the user are removed, modules already
+      imported are kept, so it's the fastest.
+    - "restart": the kernel is restarted, the state is the same as a new
+      kernel.
+
+    Kernels are recycled after `max_runs` notebooks or if the
+    execution fails outside of the notebook (kernel died, timeouts).
+
+    A kernel is only reused by notebooks of the scope of its first
+    notebook (see :func:`kernel_scope`), until it's restarted. New kernels
+    are started with the environ of the notebook which needs them.
+
+    Kernels are started in the thread which uses the pool,
+    like the kernels started by papermill.
+    """
+
+    def __init__(
+        self,
+        size=defaults.KERNEL_POOL_SIZE,
+        max_runs=defaults.KERNEL_POOL_MAX_RUNS,
+        reset=defaults.KERNEL_POOL_RESET,
+        cwd: Optional[str] = None,
+        kernel_cls=PooledKernel,
+    ):
+        if reset not in ("namespace", "restart"):
+            raise ValueError(f"Invalid reset mode: {reset}")
+        self.size = size
+        self.max_runs = max_runs
+        self.reset = reset
+        self.cwd = cwd
+        self.stats = KernelPoolStats()
+        self._kernel_cls = kernel_cls
+        # by kernel name and scope, new kernels don't have scope
+        self._idle: Dict[Tuple[str, Optional[str]], List[PooledKernel]]
+        self._idle = defaultdict(list)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return sum(len(v) for v in self._idle.values())
+
+    def _start(self, kernel_name: str, env: Optional[Dict] = None) -> PooledKernel:
+        return self._kernel_cls(kernel_name, self.cwd or os.getcwd(), env=env)
+
+    def warm(self, kernel_name=defaults.KERNEL_POOL_NAME):
+        """It starts kernels until there are `size` new kernels of this name"""
+        while len(self._idle[(kernel_name, None)]) < self.size:
+            pk = self._start(kernel_name)
+            with self._lock:
+                self._idle[(kernel_name, None)].append(pk)
+
+    def acquire(
+        self, kernel_name: str, scope: str = "", env: Optional[Dict] = None
+    ) -> PooledKernel:
+        """
+        A kernel already used by `scope`, or a new one.
+        :param env: environ of the kernel if a new one is started.
+        """
+        with self._lock:
+            for key in ((kernel_name, scope), (kernel_name, None)):
+                idle = self._idle[key]
+                while idle:
+                    pk = idle.pop(0)
+                    if pk.is_alive():
+                        self.stats.hits += 1
+                        pk.scope = scope
+                        return pk
+                    pk.close()
+            self.stats.misses += 1
+        pk = self._start(kernel_name, env=env)
+        pk.scope = scope
+        return pk
+
+    def release(self, pk: PooledKernel, ok=True):
+        pk.runs += 1
+        recycle = not ok or pk.runs >= self.max_runs
+        if not recycle and self.reset == "restart":
+            pk.restart()
+            pk.scope = None
+        with self._lock:
+            idle = self._idle[(pk.kernel_name, pk.scope)]
+            if not recycle and len(idle) < self.size:
+                idle.append(pk)
+                return
+            if recycle:
+                self.stats.recycled += 1
+        pk.close()
+
+    def get_stats(self) -> Dict[str, Any]:
+        stats = asdict(self.stats)
+        stats["hit_rate"] = round(self.stats.hit_rate, 3)
+        return stats
+
+    def close(self):
+        with self._lock:
+            kernels = [pk for idle in self._idle.values() for pk in idle]
+            self._idle.clear()
+        for pk in kernels:
+            pk.close()
+
+
+def client_kwargs(
+    kernel_name,
+    log_output=False,
+    stdout_file=None,
+    stderr_file=None,
+    start_timeout=60,
+    execution_timeout=None,
+    **kwargs,
+) -> Dict[str, Any]:
+    """Kwargs of the papermill client, as built by the nbclient engine"""
+    safe_kwargs = remove_args(["timeout", "startup_timeout"], **kwargs)
+    return merge_kwargs(
+        safe_kwargs,
+        timeout=execution_timeout if execution_timeout else kwargs.get("timeout"),
+        startup_timeout=start_timeout,
+        kernel_name=kernel_name,
+        log=logger,
+        log_output=log_output,
+        stdout_file=stdout_file,
+        stderr_file=stderr_file,
+    )
+
+
+class PooledNotebookClient(PapermillNotebookClient):
+    """
+    The client of papermill, but the kernel is taken from the pool
+    and it isn't shut down at the end.
+    """
+
+    def __init__(
+        self, nb_man, pooled: PooledKernel, reset_code=None, setup_code=None, **kw
+    ):
+        super().__init__(nb_man, km=pooled.km, **kw)
+        self.pooled = pooled
+        self.reset_code = reset_code
+        self.setup_code = setup_code
+
+    @contextmanager
+    def setup_kernel(self, **kwargs):
+        self.start_new_kernel_client()
+        try:
+            if self.setup_code:
+                self._execute_silent(self.setup_code)
+            yield
+        finally:
+            if self.reset_code and self.kc is not None:
+                self._execute_silent(self.reset_code)
+            run_sync(self._stop_client)()
+
+    def _execute_silent(self, code: str):
+        msg_id = self.kc.execute(code, silent=True, store_history=False)
+        self.wait_for_reply(msg_id)
+
+    async def _stop_client(self):
+        if self.kc is not None:
+            await ensure_async(self.kc.stop_channels())
+            self.kc = None
+
+
+class PooledEngine(NBClientEngine):
+    """
+    Papermill engine which runs the notebooks in the kernels of the pool
+    initialized with :func:`init_kernel_pool`, registered as
+    `defaults.KERNEL_POOL_ENGINE`. Without a pool, it runs as the default
+    engine.
+
+    Besides the kwargs of the nbclient engine, it accepts `on_kernel`,
+    a function called with the pid of the kernel before the execution,
+    and `kernel_scope`, by default :func:`kernel_scope` without project.
+    """
+
+    @classmethod
+    def execute_managed_notebook(
+        cls,
+        nb_man,
+        kernel_name,
+        log_output=False,
+        stdout_file=None,
+        stderr_file=None,
+        start_timeout=60,
+        execution_timeout=None,
+        **kwargs,
+    ):
+        on_kernel = kwargs.pop("on_kernel", None)
+        scope = kwargs.pop("kernel_scope", None) or kernel_scope()
+        pool = get_kernel_pool()
+        if pool is None:
+            return super().execute_managed_notebook(
+                nb_man,
+                kernel_name,
+                log_output=log_output,
+                stdout_file=stdout_file,
+                stderr_file=stderr_file,
+                start_timeout=start_timeout,
+                execution_timeout=execution_timeout,
+                **kwargs,
+            )
+
+        kernel_name = (
+            kernel_name
+            or nb_man.nb.metadata.get("kernelspec", {}).get("name")
+            or defaults.KERNEL_POOL_NAME
+        )
+        final_kwargs = client_kwargs(
+            kernel_name,
+            log_output=log_output,
+            stdout_file=stdout_file,
+            stderr_file=stderr_file,
+            start_timeout=start_timeout,
+            execution_timeout=execution_timeout,
+            **kwargs,
+        )
+        env = dict(os.environ)
+        pk = pool.acquire(kernel_name, scope=scope, env=env)
+        if on_kernel:
+            on_kernel(pk.pid)
+        reset_code = None
+        if pool.reset == "namespace":
+            reset_code = _RESET_CODE.format(cwd=pk.cwd)
+        # errors of cells are kept in the notebook, anything raised here
+        # means that the kernel is in an unknown state
+        ok = False
+        try:
+            client = PooledNotebookClient(
+                nb_man,
+                pk,
+                reset_code=reset_code,
+                setup_code=_ENV_CODE.format(env=env),
+                **final_kwargs,
+            )
+            nb = client.execute()
+            ok = True
+        finally:
+            pool.release(pk, ok=ok and pk.is_alive())
+        return nb
+
+
+papermill_engines.register(defaults.KERNEL_POOL_ENGINE, PooledEngine)
+
+_pool: Optional[KernelPool] = None
+
+
+def init_kernel_pool(warm=True, **kwargs) -> KernelPool:
+    """It creates the pool of kernels of this process, see :class:`KernelPool`"""
+    global _pool  # pylint: disable=global-statement
+
+    if _pool is not None:
+        _pool.close()
+    _pool = KernelPool(**kwargs)
+    if warm:
+        _pool.warm()
+    return _pool
+
+
+def get_kernel_pool() -> Optional[KernelPool]:
+    """It returns the pool if it was initialized with :func:`init_kernel_pool`"""
+    return _pool
+
+
+def close_kernel_pool():
+    global _pool  # pylint: disable=global-statement
+
+    if _pool is not None:
+        _pool.close()
+    _pool = None
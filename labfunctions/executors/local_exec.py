@@ -4,7 +4,7 @@ import os
 import shutil
 import time
 from pathlib import Path
-from typing import Union
+from typing import List, Optional, Union
 
 from labfunctions import client, defaults
 from labfunctions.conf import load_client
@@ -15,7 +15,43 @@ from .nbtask_base import NBTaskLocal
 # from labfunctions.notebooks import nb_job_executor
 
 
-def local_exec_env() -> ExecutionResult:
+def has_ctx_env() -> bool:
+    return bool(
+        os.getenv(defaults.EXECUTIONTASK_FILE_VAR)
+        or os.getenv(defaults.EXECUTIONTASK_VAR)
+    )
+
+
+def ctx_files() -> List[str]:
+    """Files given by `defaults.EXECUTIONTASK_FILE_VAR`, one for each task"""
+    files = os.getenv(defaults.EXECUTIONTASK_FILE_VAR, "")
+    return [f for f in files.split(os.pathsep) if f]
+
+
+def ctx_from_env(nbclient, ctx_file: Optional[str] = None) -> ExecutionNBTask:
+    """
+    The execution context is read from `ctx_file`, from the file given by
+    `defaults.EXECUTIONTASK_FILE_VAR` or, if not, from
+    `defaults.EXECUTIONTASK_VAR`. Params stored in the kv store
+    are fetched from the server.
+    """
+    ctx_file = ctx_file or os.getenv(defaults.EXECUTIONTASK_FILE_VAR)
+    if ctx_file:
+        with open(ctx_file, "r") as f:
+            ctx_str = f.read()
+    else:
+        ctx_str = os.getenv(defaults.EXECUTIONTASK_VAR)
+
+    etask = ExecutionNBTask(**json.loads(ctx_str))
+    if etask.params_key:
+        params = nbclient.history_get_params(etask.projectid, etask.params_key)
+        if params is None:
+            raise KeyError(f"Params not found for {etask.execid}")
+        etask.params = params
+    return etask
+
+
+def local_exec_env(ctx_file: Optional[str] = None) -> ExecutionResult:
     """
     Control the notebook execution.
     TODO: implement notifications
@@ -24,12 +60,37 @@ def local_exec_env() -> ExecutionResult:
     # Init
     nbclient = client.from_env()
     runner = NBTaskLocal(nbclient)
-    ctx_str = os.getenv(defaults.EXECUTIONTASK_VAR)
 
-    etask = ExecutionNBTask(**json.loads(ctx_str))
+    etask = ctx_from_env(nbclient, ctx_file)
     result = runner.run(etask)
 
     if not os.getenv("LF_LOCAL"):
         runner.register(result)
 
     return result
+
+
+def local_exec_batch() -> List[Optional[ExecutionResult]]:
+    """
+    It runs a batch of tasks one after another (see
+    :meth:`labfunctions.executors.nbtask_base.NBTaskDocker.run_batch`).
+    A task which fails doesn't stop the batch, its result is None and
+    the agent registers it. The notebooks share a pool of kernels.
+    """
+    # pylint: disable=import-outside-toplevel
+    from .kernels import close_kernel_pool, init_kernel_pool
+
+    logger = logging.getLogger(__name__)
+    pool = init_kernel_pool()
+    results = []
+    try:
+        for ctx_file in ctx_files():
+            try:
+                results.append(local_exec_env(ctx_file))
+            except Exception as e:  # pylint: disable=broad-except
+                logger.error("Task %s failed: %s", ctx_file, e)
+                results.append(None)
+    finally:
+        logger.info("Kernels: %s", pool.get_stats())
+        close_kernel_pool()
+    return results
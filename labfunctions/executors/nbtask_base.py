@@ -12,12 +12,21 @@ from typing import Any, Dict, List, Optional, Union
 from labfunctions import defaults
 from labfunctions.client.diskclient import DiskClient
 from labfunctions.client.nbclient import NBClient
-from labfunctions.commands import DockerCommand, DockerRunResult
+from labfunctions.commands import (
+    DockerCommand,
+    DockerRunResult,
+    LogsStream,
+    StatsSampler,
+)
 from labfunctions.types import ExecutionNBTask, ExecutionResult, NBTask
 from labfunctions.types.runtimes import RuntimeData
 from labfunctions.utils import get_version, today_string
 
+from .credentials import CredentialsCache
 from .execid import ExecID
+from .pool import get_pool
+from .profiling import CellsProfiler
+from .scripts import ScriptConversionError, run_script
 
 warnings.filterwarnings("ignore", category=DeprecationWarning)
 
@@ -63,6 +72,8 @@ class NBTaskExecBase:
         raise NotImplementedError()
 
     def register(self, result: ExecutionResult):
+        if result.output_name:
+            result.output_encoding = defaults.NB_OUTPUT_ENCODING
         self.client.history_register(result)
         if result.output_name:
             try:
@@ -75,13 +86,41 @@ class NBTaskExecBase:
 
 
 class NBTaskDocker(NBTaskExecBase):
+    """
+    It runs the task in a new container, or, if the pool was initialized
+    by the worker (see :func:`labfunctions.executors.pool.init_pool`),
+    in a warm container of the pool.
+
+    When `stream_logs` is true, the logs of the container are published
+    as "log" events of the execution while it runs. When `sample_stats` is
+    true, the resources used by the container are added to the result, and
+    if `publish_stats` is true, each sample is published as a "stats" event.
+
+    The execution context is written to a file inside of the container
+    instead of an environment variable (see ARG_MAX limits), and params
+    bigger than `defaults.EXECUTIONTASK_PARAMS_MAX` are stored in the kv
+    store of the project.
+
+    The private key and the agent token of the project are taken from
+    a :class:`labfunctions.executors.credentials.CredentialsCache` shared by
+    the workers of the machine.
+    """
+
     cmd = "lab exec local"
+    stream_logs = True
+    sample_stats = True
+    publish_stats = True
 
-    def build_env(self, data: Dict[str, Any]) -> Dict[str, Any]:
-        priv_key = self.client.projects_private_key(data["projectid"])
-        if not priv_key:
-            raise IndexError(f"No priv key found for {data['projectid']}")
+    def __init__(
+        self,
+        client: Union[NBClient, DiskClient],
+        creds: Optional[CredentialsCache] = None,
+    ):
+        super().__init__(client)
+        self.creds = creds or CredentialsCache(client)
 
+    def build_env(self, data: Dict[str, Any]) -> Dict[str, Any]:
+        priv_key = self.creds.private_key(data["projectid"])
         env = {
             defaults.PRIVKEY_VAR_NAME: priv_key,
             defaults.EXECUTIONTASK_VAR: json.dumps(data),
@@ -90,25 +129,36 @@ class NBTaskDocker(NBTaskExecBase):
         }
         return env
 
-    def run(self, ctx: ExecutionNBTask) -> ExecutionResult:
-        _started = time.time()
-        env = self.build_env(ctx.dict())
-        agent_token = self.client.projects_agent_token(projectid=ctx.projectid)
-        env.update(
-            {
-                "LF_AGENT_TOKEN": agent_token.creds.access_token,
-                "LF_AGENT_REFRESH_TOKEN": agent_token.creds.refresh_token,
-            }
-        )
-        cmd = DockerCommand()
-        result = cmd.run(
-            self.cmd, ctx.runtime, timeout=ctx.timeout, env_data=env, require_gpu=ctx
-        )
-        error = False
-        if result.status != 0:
-            error = True
+    def offload_params(self, ctx: ExecutionNBTask) -> ExecutionNBTask:
+        if len(json.dumps(ctx.params)) <= defaults.EXECUTIONTASK_PARAMS_MAX:
+            return ctx
+        key = self.client.history_put_params(ctx.projectid, ctx.execid, ctx.params)
+        if not key:
+            raise KeyError(f"Params of {ctx.execid} couldn't be stored")
+        return ctx.copy(update=dict(params={}, params_key=key))
 
-        elapsed = round(time.time() - _started)
+    def build_logs_stream(self, ctx: ExecutionNBTask) -> LogsStream:
+        def publish(lines: List[str]):
+            self.client.events_publish(ctx.execid, "\n".join(lines), event="log")
+
+        return LogsStream(publish)
+
+    def build_stats_sampler(self, ctx: ExecutionNBTask) -> StatsSampler:
+        def publish(sample: Dict[str, Any]):
+            self.client.events_publish(ctx.execid, sample, event="stats")
+
+        return StatsSampler(publish=publish if self.publish_stats else None)
+
+    def agent_env(self, projectid: str) -> Dict[str, Any]:
+        agent_token = self.creds.agent_token(projectid)
+        return {
+            "LF_AGENT_TOKEN": agent_token.creds.access_token,
+            "LF_AGENT_REFRESH_TOKEN": agent_token.creds.refresh_token,
+        }
+
+    def make_result(
+        self, ctx: ExecutionNBTask, result: DockerRunResult, elapsed: float
+    ) -> ExecutionResult:
         return ExecutionResult(
             projectid=ctx.projectid,
             name=ctx.nb_name,
@@ -123,33 +173,190 @@ class NBTaskDocker(NBTaskExecBase):
             output_dir=ctx.output_dir,
             output_name=ctx.output_name,
             error_dir=ctx.error_dir,
-            error=error,
+            error=result.status != 0,
             error_msg=result.msg,
             created_at=ctx.created_at,
+            parentid=ctx.parentid,
+            node=ctx.node,
+            resources=result.stats,
+            attempt=ctx.attempt,
+            exit_code=result.status,
         )
 
+    def run(self, ctx: ExecutionNBTask) -> ExecutionResult:
+        _started = time.time()
+        env = self.build_env(self.offload_params(ctx).dict())
+        env.update(self.agent_env(ctx.projectid))
+        pool = get_pool()
+        if pool is not None:
+            result = pool.run(
+                ctx.runtime,
+                ctx.projectid,
+                env,
+                timeout=ctx.timeout,
+                require_gpu=ctx.gpu_support,
+            )
+        else:
+            ctx_file = f"{defaults.EXECUTIONTASK_DIR}/{ctx.execid}.json"
+            files = {ctx_file: env.pop(defaults.EXECUTIONTASK_VAR).encode("utf-8")}
+            env[defaults.EXECUTIONTASK_FILE_VAR] = ctx_file
+            logs_stream = self.build_logs_stream(ctx) if self.stream_logs else None
+            sampler = self.build_stats_sampler(ctx) if self.sample_stats else None
+            cmd = DockerCommand()
+            result = cmd.run(
+                self.cmd,
+                ctx.runtime,
+                timeout=ctx.timeout,
+                env_data=env,
+                require_gpu=ctx,
+                logs_stream=logs_stream,
+                files=files,
+                stats_sampler=sampler,
+            )
+
+        elapsed = round(time.time() - _started)
+        return self.make_result(ctx, result, elapsed)
+
+    def run_batch(self, ctxs: List[ExecutionNBTask]) -> List[ExecutionResult]:
+        """
+        It runs executions of the same project and runtime in sequence,
+        in one container. The files of all the contexts are given to
+        `lab exec local`, separated by `os.pathsep`.
+
+        The elapsed time and the logs of each result are the ones of the
+        whole batch.
+        """
+        _started = time.time()
+        first = ctxs[0]
+        env = self.build_env(self.offload_params(first).dict())
+        env.pop(defaults.EXECUTIONTASK_VAR)
+        env.update(self.agent_env(first.projectid))
+        files = {}
+        for ctx in ctxs:
+            data = json.dumps(self.offload_params(ctx).dict())
+            files[f"{defaults.EXECUTIONTASK_DIR}/{ctx.execid}.json"] = data.encode(
+                "utf-8"
+            )
+        env[defaults.EXECUTIONTASK_FILE_VAR] = os.pathsep.join(files.keys())
+
+        cmd = DockerCommand()
+        result = cmd.run(
+            self.cmd,
+            first.runtime,
+            timeout=sum(ctx.timeout for ctx in ctxs),
+            env_data=env,
+            require_gpu=first.gpu_support,
+            files=files,
+        )
+        elapsed = round(time.time() - _started)
+        return [self.make_result(ctx, result, elapsed) for ctx in ctxs]
+
     def notificate(self, ctx: ExecutionNBTask, result: ExecutionResult):
         pass
 
 
 class NBTaskLocal(NBTaskExecBase):
     def run(self, ctx: ExecutionNBTask) -> ExecutionResult:
+        if ctx.mode == "script":
+            try:
+                return self.run_script(ctx)
+            except ScriptConversionError as e:
+                self.logger.warning(f"execid:{ctx.execid} run as notebook: {e}")
+                ext = defaults.NB_OUTPUT_EXTS["notebook"]
+                name = f"{ctx.output_name.rsplit('.', 1)[0]}.{ext}"
+                ctx = ctx.copy(
+                    update=dict(
+                        mode="notebook",
+                        output_name=name,
+                        pm_output=f"{ctx.output_dir}/{name}",
+                    )
+                )
+        return self.run_notebook(ctx)
+
+    def run_script(self, ctx: ExecutionNBTask) -> ExecutionResult:
+        """
+        It runs the notebook as a script (see
+        :mod:`labfunctions.executors.scripts`), the output is the log of
+        the script.
+        """
+        _started = time.time()
+        print(f"Input: {ctx.pm_input}")
+        status, tail = run_script(ctx.pm_input, ctx.params, ctx.pm_output, ctx.timeout)
+        _error = status != 0
+        _error_msg = None
+        if _error:
+            self.logger.error(f"jobdid:{ctx.wfid} execid:{ctx.execid} failed {status}")
+            _error_msg = f"Exit code {status}\n{tail}"
+            self._error_handler(ctx)
+
+        elapsed = time.time() - _started
+        return ExecutionResult(
+            projectid=ctx.projectid,
+            name=ctx.nb_name,
+            wfid=ctx.wfid,
+            execid=ctx.execid,
+            cluster=ctx.cluster,
+            machine=ctx.machine,
+            runtime=ctx.runtime,
+            params=ctx.params,
+            input_=ctx.pm_input,
+            output_dir=ctx.output_dir,
+            output_name=ctx.output_name,
+            error_dir=ctx.error_dir,
+            error=_error,
+            error_msg=_error_msg,
+            elapsed_secs=round(elapsed, 2),
+            created_at=ctx.created_at,
+            parentid=ctx.parentid,
+            node=ctx.node,
+            attempt=ctx.attempt,
+        )
+
+    def run_notebook(self, ctx: ExecutionNBTask) -> ExecutionResult:
         import papermill as pm
 
+        from .kernels import get_kernel_pool, kernel_scope
+
         _started = time.time()
         _error = False
         _error_msg = None
         Path(ctx.output_dir).mkdir(parents=True, exist_ok=True)
         print(f"Current dir: {Path.cwd()}")
         print(f"Input: {ctx.pm_input}")
+        profiler = CellsProfiler()
+        engine_kwargs = profiler.hooks()
+        checkpointer = None
+        if ctx.checkpoint:
+            checkpointer = self.build_checkpointer(ctx)
+            engine_kwargs.update(
+                engine_name=defaults.CHECKPOINT_ENGINE, checkpointer=checkpointer
+            )
+        elif get_kernel_pool() is not None:
+            engine_kwargs.update(
+                engine_name=defaults.KERNEL_POOL_ENGINE,
+                on_kernel=profiler.set_pid,
+                kernel_scope=kernel_scope(ctx.projectid),
+            )
         try:
-            pm.execute_notebook(ctx.pm_input, ctx.pm_output, parameters=ctx.params)
+            pm.execute_notebook(
+                ctx.pm_input,
+                ctx.pm_output,
+                parameters=ctx.params,
+                **engine_kwargs,
+            )
         except pm.exceptions.PapermillExecutionError as e:
             self.logger.error(f"jobdid:{ctx.wfid} execid:{ctx.execid} failed {e}")
             _error = True
             _error_msg = str(e)
             self._error_handler(ctx)
 
+        sizes = (None, None)
+        if ctx.output_policy:
+            output = ctx.pm_output
+            if _error:
+                output = f"{ctx.error_dir}/{ctx.output_name}"
+            sizes = self.apply_output_policy(ctx, output)
+
         elapsed = time.time() - _started
         return ExecutionResult(
             projectid=ctx.projectid,
@@ -168,8 +375,46 @@ class NBTaskLocal(NBTaskExecBase):
             error_msg=_error_msg,
             elapsed_secs=round(elapsed, 2),
             created_at=ctx.created_at,
+            parentid=ctx.parentid,
+            node=ctx.node,
+            cells=profiler.rows,
+            resumed_from=checkpointer.resumed_from if checkpointer else None,
+            attempt=ctx.attempt,
+            output_size=sizes[0],
+            output_stored_size=sizes[1],
         )
 
+    def apply_output_policy(self, ctx: ExecutionNBTask, path: str):
+        """
+        :return: size of the notebook before and after the policy, if it
+        fails the notebook is kept as it is.
+        """
+        # pylint: disable=import-outside-toplevel
+        from .outputs import apply_output_policy
+
+        def store(name: str, data: bytes) -> Optional[str]:
+            return self.client.history_put_output_object(
+                ctx.projectid, ctx.execid, name, data
+            )
+
+        try:
+            return apply_output_policy(path, ctx.output_policy, store)
+        except Exception as e:  # pylint: disable=broad-except
+            self.logger.error(f"execid:{ctx.execid} output policy failed: {e}")
+            return None, None
+
+    def build_checkpointer(self, ctx: ExecutionNBTask):
+        # pylint: disable=import-outside-toplevel
+        from .checkpoints import Checkpointer
+
+        def load(fp: str) -> bool:
+            return self.client.history_get_checkpoint(ctx.projectid, ctx.execid, fp)
+
+        def store(fp: str) -> bool:
+            return self.client.history_put_checkpoint(ctx.projectid, ctx.execid, fp)
+
+        return Checkpointer(ctx.checkpoint, load=load, store=store)
+
     def notificate(self, ctx: ExecutionNBTask, result: ExecutionResult):
         pass
 
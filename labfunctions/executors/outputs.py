@@ -0,0 +1,157 @@
+import base64
+import json
+import mimetypes
+import os
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import nbformat
+from nbformat.v4 import new_output
+
+from labfunctions.types import OutputPolicyData
+
+ACTIONS = ("truncate", "drop", "externalize")
+
+# it gets the name and the content of an output, and returns its key
+StoreFunc = Callable[[str, bytes], Optional[str]]
+
+
+def output_size(output: Dict[str, Any]) -> int:
+    return len(json.dumps(output))
+
+
+def _note(text: str) -> Dict[str, Any]:
+    return new_output("stream", name="stderr", text=f"[labfunctions] {text}\n")
+
+
+def _extension(mime: str) -> str:
+    ext = mimetypes.guess_extension(mime.split(";")[0])
+    if ext:
+        return ext
+    return ".json" if mime.endswith("json") else ".txt"
+
+
+def _encode(mime: str, value: Any) -> bytes:
+    if mime.startswith("image/") and mime != "image/svg+xml":
+        return base64.b64decode(value)
+    if isinstance(value, (dict, list)):
+        return json.dumps(value).encode("utf-8")
+    return value.encode("utf-8")
+
+
+def _externalize(
+    output: Dict[str, Any], name: str, store: StoreFunc, only_images=False
+) -> Dict[str, Any]:
+    """
+    It stores the data of `output` with `store`, and replaces it by
+    its key. Outputs that couldn't be stored are returned as they are.
+    """
+    if output.get("output_type") == "stream" and not only_images:
+        key = store(f"{name}.txt", output["text"].encode("utf-8"))
+        if not key:
+            return output
+        return new_output("stream", name=output["name"], text=f"[stored in {key}]\n")
+
+    if output.get("output_type") not in ("display_data", "execute_result"):
+        return output
+    data = dict(output["data"])
+    keys = {}
+    for mime, value in output["data"].items():
+        if only_images and not mime.startswith("image/"):
+            continue
+        key = store(f"{name}{_extension(mime)}", _encode(mime, value))
+        if key:
+            keys[mime] = key
+            del data[mime]
+    if not keys:
+        return output
+    stored = ", ".join(keys.values())
+    data["text/plain"] = f"[stored in {stored}]"
+    output = output.copy()
+    output["data"] = data
+    output["metadata"] = {**output.get("metadata", {}), "labfunctions": keys}
+    return output
+
+
+def _truncate(outputs: List[Dict[str, Any]], max_bytes: int) -> List[Dict[str, Any]]:
+    """
+    It keeps the text of the outputs until `max_bytes`, rich outputs are
+    dropped and errors are kept as they are.
+    """
+    kept = []
+    budget = max_bytes
+    removed = 0
+    for output in outputs:
+        size = output_size(output)
+        kind = output.get("output_type")
+        if kind == "error":
+            kept.append(output)
+            continue
+        if kind == "stream":
+            text = output["text"]
+        else:
+            text = output.get("data", {}).get("text/plain", "")
+        if budget <= 0 or not text:
+            removed += size
+            continue
+        if kind == "stream":
+            trimmed = new_output("stream", name=output["name"], text=text[:budget])
+        else:
+            trimmed = output.copy()
+            trimmed["data"] = {"text/plain": text[:budget]}
+            trimmed["metadata"] = {}
+        budget -= len(text[:budget])
+        removed += max(size - output_size(trimmed), 0)
+        kept.append(trimmed)
+    kept.append(_note(f"{removed} bytes of outputs removed"))
+    return kept
+
+
+def apply_to_cell(
+    outputs: List[Dict[str, Any]],
+    policy: OutputPolicyData,
+    name: str,
+    store: Optional[StoreFunc] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Outputs of a cell after `policy`. If an output can't be externalized,
+    it is truncated.
+
+    :param name: prefix of the names of the outputs externalized.
+    """
+    if store and policy.externalize_images:
+        outputs = [
+            _externalize(o, f"{name}.{i}", store, only_images=True)
+            for i, o in enumerate(outputs)
+        ]
+    size = sum(output_size(o) for o in outputs)
+    if size <= policy.max_cell_bytes:
+        return outputs
+    if policy.action == "drop":
+        return [_note(f"{size} bytes of outputs dropped")]
+    if policy.action == "externalize" and store:
+        outputs = [_externalize(o, f"{name}.{i}", store) for i, o in enumerate(outputs)]
+        if sum(output_size(o) for o in outputs) <= policy.max_cell_bytes:
+            return outputs
+    return _truncate(outputs, policy.max_cell_bytes)
+
+
+def apply_output_policy(
+    path: str, policy: OutputPolicyData, store: Optional[StoreFunc] = None
+) -> Tuple[int, int]:
+    """
+    It applies `policy` to the outputs of each code cell of the notebook
+    in `path`, which is rewritten.
+
+    :param store: used to externalize outputs, it gets a name like
+    "cell3.0.png" and the content, and returns the key of the object.
+    :return: the size of the notebook before and after.
+    """
+    if policy.action not in ACTIONS:
+        raise ValueError(f"output policy action should be one of {ACTIONS}")
+    original = os.path.getsize(path)
+    nb = nbformat.read(path, as_version=4)
+    for index, cell in enumerate(nb.cells):
+        if cell.cell_type == "code" and cell.get("outputs"):
+            cell.outputs = apply_to_cell(cell.outputs, policy, f"cell{index}", store)
+    nbformat.write(nb, path)
+    return original, os.path.getsize(path)
@@ -0,0 +1,256 @@
+import json
+import logging
+import select
+import threading
+import time
+from collections import defaultdict
+from dataclasses import asdict, dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+import docker
+from labfunctions import defaults
+from labfunctions.types.docker import DockerRunResult
+
+logger = logging.getLogger(__name__)
+
+_STREAM_HEADER = 8
+
+
+class WarmContainer:
+    """
+    A container started with `lab exec serve`, which waits for tasks
+    in its stdin. The python interpreter, labfunctions and papermill are
+    loaded once, when the container starts.
+
+    Stdin and stdout are attached through the docker api, so it works
+    even if the agent itself runs inside a container.
+
+    A container only runs tasks of the project which started it.
+    """
+
+    def __init__(self, docker_client, image: str, projectid: str, require_gpu=False):
+        runtime = None
+        if require_gpu:
+            runtime = "nvidia"
+        self.image = image
+        self.projectid = projectid
+        self.require_gpu = require_gpu
+        self.runs = 0
+        self.mem_kb = 0
+        self.last_used = time.time()
+        self.container = docker_client.containers.run(
+            image,
+            defaults.WARM_POOL_CMD,
+            runtime=runtime,
+            detach=True,
+            stdin_open=True,
+            network_mode="bridge",
+        )
+        self._sock = self.container.attach_socket(
+            params=dict(stdin=1, stdout=1, stderr=1, stream=1)
+        )
+        self._raw = getattr(self._sock, "_sock", self._sock)
+        self._buffers: Dict[int, bytes] = defaultdict(bytes)
+
+    def _recv(self, n: int, deadline: float) -> bytes:
+        data = b""
+        while len(data) < n:
+            remaining = deadline - time.monotonic()
+            ready, _, _ = select.select([self._raw], [], [], max(remaining, 0))
+            if not ready:
+                raise TimeoutError()
+            chunk = self._raw.recv(n - len(data))
+            if not chunk:
+                raise EOFError()
+            data += chunk
+        return data
+
+    def _lines(self, deadline: float):
+        """Lines of stdout and stderr, as sent by the docker attach protocol"""
+        while True:
+            header = self._recv(_STREAM_HEADER, deadline)
+            stream = header[0]
+            size = int.from_bytes(header[4:], "big")
+            self._buffers[stream] += self._recv(size, deadline)
+            while b"\n" in self._buffers[stream]:
+                line, self._buffers[stream] = self._buffers[stream].split(b"\n", 1)
+                yield line.decode("utf-8", errors="replace")
+
+    def run(self, env: Dict[str, Any], timeout: int) -> DockerRunResult:
+        """It sends a task to the container and waits for its result"""
+        self.runs += 1
+        req = json.dumps(dict(env=env)) + "\n"
+        self._raw.sendall(req.encode("utf-8"))
+
+        deadline = time.monotonic() + timeout
+        logs = []
+        for line in self._lines(deadline):
+            if line.startswith(defaults.WARM_POOL_MARKER):
+                rsp = json.loads(line[len(defaults.WARM_POOL_MARKER) :])
+                self.mem_kb = rsp["mem_kb"]
+                logs.append(rsp["msg"])
+                return DockerRunResult(msg="\n".join(logs), status=rsp["status"])
+            logs.append(line)
+        raise EOFError()
+
+    def is_alive(self) -> bool:
+        try:
+            self.container.reload()
+        except docker.errors.NotFound:
+            return False
+        return self.container.status == "running"
+
+    def close(self):
+        try:
+            self._sock.close()
+            self.container.remove(force=True)
+        except docker.errors.APIError as e:
+            logger.warning("POOL: error removing container: %s", e)
+
+
+@dataclass
+class PoolStats:
+    """
+    :param hits: tasks executed in an idle container
+    :param misses: tasks which needed a new container
+    :param recycled: containers removed after max runs, memory or errors
+    """
+
+    hits: int = 0
+    misses: int = 0
+    recycled: int = 0
+
+
+class ContainerPool:
+    """
+    Pool of warm containers by runtime image and project, used by
+    :class:`labfunctions.executors.nbtask_base.NBTaskDocker`. Containers
+    are never shared between projects, the files and the kernels of a task
+    could be seen by the next one.
+
+    It grows with the demand: each task takes an idle container of its image
+    or starts a new one, so there are as many containers as tasks running.
+    When a task ends, the container goes back to the pool, up to `max_idle`
+    by image and project, and idle containers are removed after `idle_secs`.
+
+    Containers are recycled after `max_runs` tasks, if the memory of the
+    container is greater than `max_mem_mb` or if a task fails
+    in an unexpected way (timeout, container died).
+
+    The pool lives in the memory of the worker, so the worker should run
+    the jobs in its own process (see `lab agent run --in-process`).
+    """
+
+    def __init__(
+        self,
+        docker_client=None,
+        max_runs=defaults.WARM_POOL_MAX_RUNS,
+        max_mem_mb=defaults.WARM_POOL_MAX_MEM_MB,
+        max_idle=defaults.WARM_POOL_MAX_IDLE,
+        idle_secs=defaults.WARM_POOL_IDLE_SECS,
+        container_cls=WarmContainer,
+    ):
+        self.docker = docker_client or docker.from_env()
+        self.max_runs = max_runs
+        self.max_mem_kb = max_mem_mb * 1024
+        self.max_idle = max_idle
+        self.idle_secs = idle_secs
+        self.stats = PoolStats()
+        self._container_cls = container_cls
+        self._idle: Dict[Tuple[str, str, bool], List[WarmContainer]] = defaultdict(list)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return sum(len(v) for v in self._idle.values())
+
+    def acquire(self, image: str, projectid: str, require_gpu=False) -> WarmContainer:
+        self.reap()
+        with self._lock:
+            idle = self._idle[(image, projectid, require_gpu)]
+            while idle:
+                wc = idle.pop()
+                if wc.is_alive():
+                    self.stats.hits += 1
+                    return wc
+                wc.close()
+            self.stats.misses += 1
+        return self._container_cls(self.docker, image, projectid, require_gpu)
+
+    def release(self, wc: WarmContainer, ok=True):
+        recycle = not ok or wc.runs >= self.max_runs or wc.mem_kb >= self.max_mem_kb
+        wc.last_used = time.time()
+        with self._lock:
+            idle = self._idle[(wc.image, wc.projectid, wc.require_gpu)]
+            if not recycle and len(idle) < self.max_idle:
+                idle.append(wc)
+                return
+            if recycle:
+                self.stats.recycled += 1
+        wc.close()
+
+    def reap(self, now=None):
+        """It removes the containers idle for more than `idle_secs`"""
+        now = time.time() if now is None else now
+        expired = []
+        with self._lock:
+            for key, idle in self._idle.items():
+                alive = [wc for wc in idle if now - wc.last_used < self.idle_secs]
+                expired.extend(wc for wc in idle if wc not in alive)
+                self._idle[key] = alive
+        for wc in expired:
+            wc.close()
+
+    def run(
+        self,
+        image: str,
+        projectid: str,
+        env: Dict[str, Any],
+        timeout: int,
+        require_gpu=False,
+    ) -> DockerRunResult:
+        """Same result than :meth:`labfunctions.commands.DockerCommand.run`"""
+        wc = self.acquire(image, projectid, require_gpu)
+        try:
+            result = wc.run(env, timeout)
+        except (TimeoutError, EOFError, OSError) as e:
+            logger.error("POOL: task failed in %s: %s", image, e)
+            self.release(wc, ok=False)
+            return DockerRunResult(msg=str(e), status=-1)
+        self.release(wc)
+        return result
+
+    def get_stats(self) -> Dict[str, Any]:
+        return asdict(self.stats)
+
+    def close(self):
+        with self._lock:
+            containers = [wc for idle in self._idle.values() for wc in idle]
+            self._idle.clear()
+        for wc in containers:
+            wc.close()
+
+
+_pool: Optional[ContainerPool] = None
+
+
+def init_pool(**kwargs) -> ContainerPool:
+    """It creates the pool of this worker process, see :class:`ContainerPool`"""
+    global _pool  # pylint: disable=global-statement
+
+    if _pool is not None:
+        _pool.close()
+    _pool = ContainerPool(**kwargs)
+    return _pool
+
+
+def get_pool() -> Optional[ContainerPool]:
+    """It returns the pool if it was initialized with :func:`init_pool`"""
+    return _pool
+
+
+def close_pool():
+    global _pool  # pylint: disable=global-statement
+
+    if _pool is not None:
+        _pool.close()
+    _pool = None
@@ -0,0 +1,137 @@
+import json
+import os
+import time
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Tuple
+
+from labfunctions.types import CellStats, ExecutionResult
+
+CellRow = Tuple[int, float, Optional[int], int]
+
+
+def _ppid(pid: str) -> Optional[int]:
+    try:
+        with open(f"/proc/{pid}/stat", "r") as f:
+            stat = f.read()
+    except OSError:
+        return None
+    # the name of the process, between parentheses, could have spaces
+    return int(stat.rsplit(")", 1)[1].split()[1])
+
+
+def kernel_pid() -> Optional[int]:
+    """
+    The kernel is started by papermill as a child of this process,
+    if there are many children, the newest is taken. Only for Linux.
+    """
+    if not os.path.isdir("/proc"):
+        return None
+    me = os.getpid()
+    children = [int(p) for p in os.listdir("/proc") if p.isdigit() and _ppid(p) == me]
+    if not children:
+        return None
+    return max(children)
+
+
+def peak_rss_kb(pid: Optional[int]) -> Optional[int]:
+    """Peak resident memory (VmHWM) of a process"""
+    if not pid:
+        return None
+    try:
+        with open(f"/proc/{pid}/status", "r") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+def tree_rss_kb(pid: int) -> Optional[int]:
+    """Resident memory (VmRSS) of a process and all its descendants"""
+    if not os.path.isdir("/proc"):
+        return None
+    parents: Dict[int, List[int]] = defaultdict(list)
+    for p in os.listdir("/proc"):
+        if p.isdigit():
+            ppid = _ppid(p)
+            if ppid is not None:
+                parents[ppid].append(int(p))
+    total = 0
+    pending = [pid]
+    while pending:
+        current = pending.pop()
+        pending.extend(parents.get(current, []))
+        try:
+            with open(f"/proc/{current}/status", "r") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        total += int(line.split()[1])
+        except OSError:
+            pass
+    return total
+
+
+class CellsProfiler:
+    """
+    It uses the hooks of nbclient, passed through papermill as engine kwargs,
+    to measure each code cell: wall time, how much the peak memory
+    of the kernel grows and the size of its outputs.
+
+    >>> profiler = CellsProfiler()
+    >>> pm.execute_notebook(input_, output, **profiler.hooks())
+    >>> profiler.rows
+    """
+
+    def __init__(self):
+        self.rows: List[CellRow] = []
+        self._pid: Optional[int] = None
+        self._started: Dict[int, Tuple[float, Optional[int]]] = {}
+
+    def hooks(self) -> Dict[str, Any]:
+        return dict(on_cell_execute=self.cell_start, on_cell_executed=self.cell_end)
+
+    def set_pid(self, pid: Optional[int]):
+        """The pid of the kernel, when it isn't started by papermill"""
+        self._pid = pid
+
+    def cell_start(self, cell, cell_index: int, **kwargs):
+        if self._pid is None:
+            self._pid = kernel_pid()
+        self._started[cell_index] = (time.monotonic(), peak_rss_kb(self._pid))
+
+    def cell_end(self, cell, cell_index: int, **kwargs):
+        if cell_index not in self._started:
+            return
+        started, mem_start = self._started.pop(cell_index)
+        secs = round(time.monotonic() - started, 3)
+        mem_end = peak_rss_kb(self._pid)
+        mem = None
+        if mem_start is not None and mem_end is not None:
+            mem = mem_end - mem_start
+        output_bytes = len(json.dumps(cell.get("outputs", [])))
+        self.rows.append((cell_index, secs, mem, output_bytes))
+
+
+def slowest_cells(results: List[ExecutionResult], top=10) -> List[CellStats]:
+    """Aggregates the profile of the cells, sorted by mean wall time"""
+    by_cell: Dict[int, List[CellRow]] = defaultdict(list)
+    for result in results:
+        for row in result.cells or []:
+            by_cell[row[0]].append(row)
+
+    stats = []
+    for cell, rows in by_cell.items():
+        mems = [r[2] for r in rows if r[2] is not None]
+        stats.append(
+            CellStats(
+                cell=cell,
+                runs=len(rows),
+                mean_secs=round(sum(r[1] for r in rows) / len(rows), 3),
+                max_secs=max(r[1] for r in rows),
+                max_mem_kb=max(mems) if mems else None,
+                max_output_bytes=max(r[3] for r in rows),
+            )
+        )
+    stats.sort(key=lambda s: s.mean_secs, reverse=True)
+    return stats[:top]
@@ -0,0 +1,112 @@
+import hashlib
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+from typing import Tuple
+
+import nbformat
+
+from labfunctions import defaults
+
+# increase it when the generated code changes, to invalidate cached scripts
+_VERSION = "1"
+
+# it replaces the params of the notebook, as the cell injected by papermill
+_INJECT = (
+    "# Parameters\n"
+    "globals().update(__import__('json').load(open(__import__('sys').argv[1])))"
+)
+
+
+class ScriptConversionError(Exception):
+    """The notebook uses features which only work inside a kernel"""
+
+
+def _has_magics(source: str) -> bool:
+    for line in source.splitlines():
+        line = line.lstrip()
+        if line.startswith(("%", "!")):
+            return True
+    return False
+
+
+def notebook_to_script(nb: nbformat.NotebookNode) -> str:
+    """
+    It joins the code cells of a notebook in a python module. The params
+    are loaded from a json file, given as the first argument of the script,
+    after the cell tagged "parameters" or, if there isn't one, at the top.
+
+    Cells with magics or shell commands raise :class:`ScriptConversionError`.
+    """
+    blocks = []
+    injected = False
+    for ix, cell in enumerate(nb.cells):
+        if cell.cell_type != "code":
+            continue
+        if _has_magics(cell.source):
+            raise ScriptConversionError(f"Cell {ix} uses magics or shell commands")
+        blocks.append(f"# Cell {ix}\n{cell.source}")
+        if "parameters" in cell.get("metadata", {}).get("tags", []):
+            blocks.append(_INJECT)
+            injected = True
+    if not injected:
+        blocks.insert(0, _INJECT)
+    return "\n\n".join(blocks) + "\n"
+
+
+def script_path(nb_path: str, cache_dir=defaults.SCRIPTS_CACHE_DIR) -> str:
+    """
+    It converts the notebook to a script, only if it wasn't converted before.
+    Scripts are cached by the hash of the notebook file.
+    """
+    with open(nb_path, "rb") as f:
+        data = f.read()
+    digest = hashlib.sha256(data + _VERSION.encode("utf-8")).hexdigest()
+    fp = Path(cache_dir) / f"{digest}.py"
+    if not fp.exists():
+        nb = nbformat.reads(data.decode("utf-8"), as_version=4)
+        code = notebook_to_script(nb)
+        fp.parent.mkdir(parents=True, exist_ok=True)
+        tmp = fp.with_suffix(f".{os.getpid()}.tmp")
+        tmp.write_text(code)
+        tmp.rename(fp)
+    return str(fp)
+
+
+def run_script(
+    nb_path: str, params, log_path: str, timeout: int, cache_dir=None
+) -> Tuple[int, str]:
+    """
+    It runs a notebook as a script, in a new interpreter. Stdout and stderr
+    are written to `log_path`.
+
+    :return: the exit code of the process and the tail of its log.
+    """
+    script = script_path(nb_path, cache_dir or defaults.SCRIPTS_CACHE_DIR)
+    Path(log_path).parent.mkdir(parents=True, exist_ok=True)
+    params_path = f"{log_path}.params.json"
+    with open(params_path, "w") as f:
+        json.dump(params, f)
+    try:
+        with open(log_path, "wb") as log:
+            proc = subprocess.run(
+                [sys.executable, script, params_path],
+                stdout=log,
+                stderr=subprocess.STDOUT,
+                timeout=timeout,
+                check=False,
+            )
+        status = proc.returncode
+    except subprocess.TimeoutExpired:
+        status = -1
+        with open(log_path, "a") as f:
+            f.write(f"\nTimeout after {timeout} secs\n")
+    finally:
+        os.remove(params_path)
+
+    with open(log_path, "rb") as f:
+        f.seek(max(os.path.getsize(log_path) - defaults.SCRIPTS_LOG_TAIL, 0))
+        tail = f.read().decode("utf-8", errors="replace")
+    return status, tail
@@ -0,0 +1,107 @@
+import io
+import json
+import os
+import sys
+from contextlib import redirect_stderr, redirect_stdout
+from typing import Any, Dict, Optional, TextIO, Tuple
+
+from labfunctions import defaults
+
+from .kernels import get_kernel_pool, init_kernel_pool
+from .local_exec import local_exec_env
+from .profiling import tree_rss_kb
+
+# memory usage and stats of the cgroup of the container, v2 and v1
+_CGROUP_MEM = (
+    ("/sys/fs/cgroup/memory.current", "/sys/fs/cgroup/memory.stat", "inactive_file"),
+    (
+        "/sys/fs/cgroup/memory/memory.usage_in_bytes",
+        "/sys/fs/cgroup/memory/memory.stat",
+        "total_inactive_file",
+    ),
+)
+
+
+def memory_kb() -> int:
+    """
+    Memory used by the container, like `docker stats`: the usage of its
+    cgroup without the inactive page cache. The kernels of the pool are
+    children of this process, so, without a cgroup, the resident memory of
+    this process and its descendants is used.
+    """
+    for usage_fp, stat_fp, inactive in _CGROUP_MEM:
+        try:
+            with open(usage_fp, "r") as f:
+                usage = int(f.read().strip())
+            with open(stat_fp, "r") as f:
+                for line in f:
+                    name, value = line.split()
+                    if name == inactive:
+                        usage -= int(value)
+                        break
+        except (OSError, ValueError):
+            continue
+        return max(usage, 0) // 1024
+    return tree_rss_kb(os.getpid()) or 0
+
+
+def _run_one(env: Dict[str, str]) -> Tuple[int, str]:
+    """
+    Same as `lab exec local` but without starting a new interpreter.
+    The environ is restored after the task, containers run tasks of
+    different projects and their keys shouldn't reach the next task.
+    """
+    saved = dict(os.environ)
+    os.environ.update(env)
+    buffer = io.StringIO()
+    status = 0
+    try:
+        with redirect_stdout(buffer), redirect_stderr(buffer):
+            try:
+                result = local_exec_env()
+                if result.error:
+                    status = 1
+            except Exception as e:  # pylint: disable=broad-except
+                print(f"Error executing task: {e}")
+                status = -2
+    finally:
+        os.environ.clear()
+        os.environ.update(saved)
+    return status, buffer.getvalue()
+
+
+def serve(input_: Optional[TextIO] = None, output: Optional[TextIO] = None):
+    """
+    It runs inside the containers of the warm pool of the agent,
+    see :class:`labfunctions.executors.pool.ContainerPool`.
+
+    Each line received by stdin is a json with the env of a task,
+    the same env used by `lab exec local`. After each task, a line
+    starting with `defaults.WARM_POOL_MARKER` followed by a json with the
+    status, the logs and the memory used by the container (see
+    :func:`memory_kb`) is written to stdout.
+
+    Notebooks run in a pool of kernels (see
+    :class:`labfunctions.executors.kernels.KernelPool`) which lives
+    as long as the container.
+    """
+    # pylint: disable=import-outside-toplevel,unused-import
+    import papermill  # noqa: F401 loaded once for every task
+
+    init_kernel_pool(warm=False)
+    input_ = input_ or sys.stdin
+    output = output or sys.stdout
+    for line in input_:
+        line = line.strip()
+        if not line:
+            continue
+        req: Dict[str, Any] = json.loads(line)
+        status, msg = _run_one(req["env"])
+        rsp = dict(
+            status=status,
+            msg=msg,
+            mem_kb=memory_kb(),
+            kernels=get_kernel_pool().get_stats(),
+        )
+        output.write(f"{defaults.WARM_POOL_MARKER}{json.dumps(rsp)}\n")
+        output.flush()
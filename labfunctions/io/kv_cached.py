@@ -0,0 +1,269 @@
+import fcntl
+import hashlib
+import os
+import tempfile
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Any, Dict, Generator, List, Optional, Tuple, Union
+
+from labfunctions import defaults
+
+from .kvspec import GenericKVSpec, KVPage, KVStat
+
+
+@dataclass
+class CacheStats:
+    """
+    :param hits: objects read from the local cache
+    :param misses: objects downloaded from the backend and cached
+    :param evictions: objects removed to keep the cache under its size
+    """
+
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+
+class CachedKV(GenericKVSpec):
+    """
+    Read-through cache on local disk in front of another store, to be used
+    where the same objects are downloaded again and again, like the bundles
+    of the projects in the builders. To enable it, set
+    `PROJECTS_STORE_CLASS_*` to "labfunctions.io.kv_cached.CachedKV" and
+    the store to wrap in `LF_EXT_KV_CACHE_BACKEND`.
+
+    Objects are cached by key and by the etag of the backend (see
+    :meth:`GenericKVSpec.etag`), so a new version of an object is
+    downloaded again; objects without etag are not cached. Files are
+    written atomically, and a lock per object, shared by the processes of
+    the machine, avoids downloading the same object twice. When the cache
+    is bigger than `max_bytes`, the least recently used objects are removed.
+
+    Writes, listings and deletes go to the backend, deleted objects are
+    also removed from the cache.
+
+    `client_opts` are given to the backend, besides `backend`, `cache_dir`
+    and `max_bytes`, which by default are taken from `LF_EXT_KV_CACHE_*`.
+    """
+
+    def __init__(self, bucket: str, client_opts: Dict[str, Any] = {}):
+        self._opts = client_opts
+        self._bucket = bucket
+        backend = client_opts.get("backend", os.getenv("LF_EXT_KV_CACHE_BACKEND"))
+        if not backend:
+            raise ValueError("The store to cache should be set as backend")
+        self.backend = GenericKVSpec.create(backend, bucket, client_opts)
+        cache_dir = client_opts.get(
+            "cache_dir", os.getenv("LF_EXT_KV_CACHE_DIR", defaults.KV_CACHE_DIR)
+        )
+        self.dir = Path(cache_dir) / bucket
+        self.max_bytes = int(
+            client_opts.get(
+                "max_bytes",
+                os.getenv("LF_EXT_KV_CACHE_MAX_BYTES", defaults.KV_CACHE_MAX_BYTES),
+            )
+        )
+        self.dir.mkdir(parents=True, exist_ok=True)
+        self.stats = CacheStats()
+
+    def _name(self, key: str) -> str:
+        return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+    def _path(self, key: str, etag: str) -> Path:
+        version = hashlib.sha256(etag.encode("utf-8")).hexdigest()[:16]
+        return self.dir / f"{self._name(key)}.{version}"
+
+    @contextmanager
+    def _lock(self, path: Path, blocking=True):
+        with open(f"{path}.lock", "w") as f:
+            flags = fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB
+            try:
+                fcntl.flock(f, flags)
+            except BlockingIOError:
+                yield False
+                return
+            try:
+                yield True
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _entries(self) -> List[Tuple[float, int, Path]]:
+        entries = []
+        for path in self.dir.iterdir():
+            if path.suffix in (".lock", ".tmp"):
+                continue
+            try:
+                st = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((st.st_mtime, st.st_size, path))
+        return entries
+
+    def _evict(self):
+        """Only one process evicts at a time, the others skip it"""
+        with self._lock(self.dir / "evict", blocking=False) as locked:
+            if not locked:
+                return
+            entries = sorted(self._entries())
+            total = sum(size for _, size, _ in entries)
+            for _, size, path in entries:
+                if total <= self.max_bytes:
+                    break
+                # a reader which already opened it can still read it
+                path.unlink(missing_ok=True)
+                Path(f"{path}.lock").unlink(missing_ok=True)
+                total -= size
+                self.stats.evictions += 1
+
+    def _open(self, path: Path):
+        """It opens an entry and marks it as recently used"""
+        f = open(path, "rb")
+        os.utime(path)
+        return f
+
+    def _fill(self, key: str, path: Path) -> bool:
+        """
+        It downloads `key` to `path`, objects bigger than the cache
+        are not stored.
+        """
+        fd, tmp = tempfile.mkstemp(dir=self.dir, suffix=".tmp")
+        written = 0
+        try:
+            with os.fdopen(fd, "wb") as f:
+                for chunk in self.backend.get_parallel(key):
+                    written += len(chunk)
+                    if written > self.max_bytes:
+                        return False
+                    f.write(chunk)
+            os.replace(tmp, path)
+        finally:
+            if os.path.exists(tmp):
+                os.unlink(tmp)
+        self.stats.misses += 1
+        self._evict()
+        return True
+
+    def cached_path(self, key: str) -> Union[Path, None]:
+        """
+        Path of the last version of `key` in the cache, it's downloaded
+        if needed. None if the object can't be cached.
+        """
+        etag = self.backend.etag(key)
+        if etag is None:
+            return None
+        path = self._path(key, etag)
+        if path.exists():
+            self.stats.hits += 1
+            return path
+        with self._lock(path):
+            # another process could have downloaded it while waiting
+            if path.exists():
+                self.stats.hits += 1
+                return path
+            if not self._fill(key, path):
+                return None
+        return path
+
+    def get_stats(self) -> Dict[str, Any]:
+        stats = asdict(self.stats)
+        stats["hit_rate"] = round(self.stats.hit_rate, 3)
+        entries = self._entries()
+        stats["entries"] = len(entries)
+        stats["bytes"] = sum(size for _, size, _ in entries)
+        return stats
+
+    def put(self, key: str, bdata: bytes):
+        return self.backend.put(key, bdata)
+
+    def put_stream(self, key: str, generator: Generator[bytes, None, None]) -> bool:
+        return self.backend.put_stream(key, generator)
+
+    def put_parallel(
+        self,
+        key: str,
+        generator: Generator[bytes, None, None],
+        part_size: Optional[int] = None,
+        concurrency: Optional[int] = None,
+    ) -> bool:
+        return self.backend.put_parallel(key, generator, part_size, concurrency)
+
+    def get(self, key: str) -> Union[bytes, None]:
+        path = self.cached_path(key)
+        if path:
+            try:
+                with self._open(path) as f:
+                    return f.read()
+            except FileNotFoundError:
+                # evicted
+                pass
+        return self.backend.get(key)
+
+    def get_stream(self, key: str) -> Generator[bytes, None, None]:
+        path = self.cached_path(key)
+        try:
+            f = self._open(path) if path else None
+        except FileNotFoundError:
+            f = None
+        if not f:
+            yield from self.backend.get_stream(key)
+            return
+        size = self._opts.get("chunk_size", defaults.KV_CHUNK_SIZE)
+        with f:
+            while True:
+                chunk = f.read(size)
+                if not chunk:
+                    break
+                yield chunk
+
+    def get_parallel(
+        self,
+        key: str,
+        part_size: Optional[int] = None,
+        concurrency: Optional[int] = None,
+    ) -> Generator[bytes, None, None]:
+        # objects are downloaded in parallel when they are cached
+        yield from self.get_stream(key)
+
+    def size(self, key: str) -> Union[int, None]:
+        return self.backend.size(key)
+
+    def etag(self, key: str) -> Union[str, None]:
+        return self.backend.etag(key)
+
+    def list(
+        self,
+        prefix: str = "",
+        limit: Optional[int] = None,
+        cursor: Optional[str] = None,
+    ) -> KVPage:
+        return self.backend.list(prefix, limit, cursor)
+
+    def stat(self, key: str) -> Union[KVStat, None]:
+        return self.backend.stat(key)
+
+    def exists(self, key: str) -> bool:
+        return self.backend.exists(key)
+
+    def _discard(self, key: str):
+        for path in self.dir.glob(f"{self._name(key)}.*"):
+            path.unlink(missing_ok=True)
+
+    def delete(self, key: str) -> bool:
+        self._discard(key)
+        return self.backend.delete(key)
+
+    def put_many(
+        self, items: Dict[str, bytes], concurrency: Optional[int] = None
+    ) -> Dict[str, bool]:
+        return self.backend.put_many(items, concurrency)
+
+    def delete_many(self, keys: List[str], concurrency: Optional[int] = None) -> int:
+        for key in keys:
+            self._discard(key)
+        return self.backend.delete_many(keys, concurrency)
@@ -1,86 +1,330 @@
-from typing import Any, AsyncGenerator, Dict, Generator, Union
+import asyncio
+import importlib.util
+import os
+import time
+from email.utils import parsedate_to_datetime
+from typing import Any, AsyncGenerator, Dict, Generator, List, Optional, Tuple, Union
 
 import httpx
 
-from .kvspec import AsyncKVSpec, GenericKVSpec
+from labfunctions import defaults
+
+from .kvspec import (
+    AsyncKVSpec,
+    GenericKVSpec,
+    KeyReadError,
+    KeyWriteError,
+    KVPage,
+    KVStat,
+    async_page_of_walk,
+    page_of,
+    walk_keys,
+)
+
+# responses retried besides connection errors
+RETRY_STATUS = (502, 503, 504)
+
+
+def http2_available() -> bool:
+    return importlib.util.find_spec("h2") is not None
+
+
+def client_kwargs(opts: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Options of the pooled clients from the `client_opts` of a store:
+    `timeout`, `max_connections`, `max_keepalive`, `keepalive_expiry`,
+    `http2` (used only if the h2 package is installed) and `retries` of
+    the connections.
+    """
+    limits = httpx.Limits(
+        max_connections=opts.get("max_connections", defaults.KV_FILES_MAX_CONNECTIONS),
+        max_keepalive_connections=opts.get(
+            "max_keepalive", defaults.KV_FILES_MAX_KEEPALIVE
+        ),
+        keepalive_expiry=opts.get(
+            "keepalive_expiry", defaults.KV_FILES_KEEPALIVE_EXPIRY
+        ),
+    )
+    return dict(
+        timeout=opts.get("timeout", defaults.KV_FILES_TIMEOUT),
+        limits=limits,
+        http2=opts.get("http2", True) and http2_available(),
+        retries=opts.get("retries", defaults.KV_FILES_RETRIES),
+    )
+
+
+def _should_retry(r: Union[httpx.Response, Exception], attempt: int, retries: int):
+    if attempt >= retries:
+        return False
+    if isinstance(r, httpx.TransportError):
+        return True
+    return isinstance(r, httpx.Response) and r.status_code in RETRY_STATUS
+
+
+def _range_header(start: int, end: int) -> Dict[str, str]:
+    # the end of http ranges is included
+    return {"Range": f"bytes={start}-{end - 1}"}
+
+
+def _range_content(r: httpx.Response, key: str, start: int, end: int) -> bytes:
+    if r.status_code == 206:
+        return r.content
+    if r.status_code == 200:
+        # the range was ignored
+        return r.content[start:end]
+    raise KeyReadError(str(r.url), key, f"status {r.status_code}")
+
+
+def _entries(r: httpx.Response) -> List[Tuple[str, bool]]:
+    """Entries of a directory listed by the autoindex of the fileserver"""
+    if r.status_code != 200:
+        return []
+    return [(e["name"], e["type"] == "directory") for e in r.json()]
+
+
+def _stat(r: httpx.Response, key: str) -> Union[KVStat, None]:
+    if r.status_code != 200:
+        return None
+    modified = r.headers.get("last-modified")
+    return KVStat(
+        key=key,
+        size=int(r.headers.get("content-length", 0)),
+        mtime=parsedate_to_datetime(modified).timestamp() if modified else None,
+        etag=r.headers.get("etag"),
+    )
+
+
+def _deleted(r: httpx.Response, key: str) -> bool:
+    if r.status_code in (200, 204):
+        return True
+    if r.status_code == 404:
+        return False
+    raise KeyWriteError(str(r.url), key, f"status {r.status_code}")
 
 
 class KVFiles(GenericKVSpec):
+    """
+    Store backed by a fileserver (see fileserver.conf).
+
+    A pooled client with keep-alive connections is used for all the requests
+    of the instance, it's created again if the process was forked.
+    Connection errors are retried by the transport, and `put` and `get`
+    are also retried with exponential backoff if the fileserver is
+    unavailable, streams are not retried.
+
+    Only parallel downloads are supported, with ranged requests,
+    the fileserver doesn't have a way to compose uploads.
+
+    Keys are listed walking the directories with the json autoindex of
+    the fileserver, one request for each directory.
+    """
+
+    parallel_get = True
+
     def __init__(self, bucket: str, client_opts: Dict[str, Any] = {}):
         self._opts = client_opts
         self._bucket = bucket
+        self._client: Union[httpx.Client, None] = None
+        self._pid = None
+        self._retries = client_opts.get("retries", defaults.KV_FILES_RETRIES)
+        self._backoff = client_opts.get("backoff", defaults.KV_FILES_BACKOFF)
 
     @property
     def url(self):
         return f"{self._opts['url']}/{self._bucket}"
 
+    @property
+    def client(self) -> httpx.Client:
+        if self._client is None or self._pid != os.getpid():
+            kwargs = client_kwargs(self._opts)
+            transport = httpx.HTTPTransport(
+                limits=kwargs["limits"],
+                http2=kwargs["http2"],
+                retries=kwargs["retries"],
+            )
+            self._client = httpx.Client(timeout=kwargs["timeout"], transport=transport)
+            self._pid = os.getpid()
+        return self._client
+
+    def close(self):
+        if self._client is not None and self._pid == os.getpid():
+            self._client.close()
+        self._client = None
+
+    def _request(self, method: str, key: str, **kwargs) -> httpx.Response:
+        attempt = 0
+        while True:
+            try:
+                r = self.client.request(method, f"{self.url}/{key}", **kwargs)
+            except httpx.TransportError as e:
+                r = e
+            if not _should_retry(r, attempt, self._retries):
+                break
+            time.sleep(self._backoff * 2**attempt)
+            attempt += 1
+        if isinstance(r, Exception):
+            raise r
+        return r
+
     def put(self, key: str, bdata: bytes):
-        ts = self._opts.get("timeout", 60)
-        with httpx.Client(timeout=ts) as client:
-            r = client.put(f"{self.url}/{key}", content=bdata)
+        r = self._request("PUT", key, content=bdata)
         if r.status_code == 201:
             return True
         return False
 
     def put_stream(self, key: str, generator: Generator[bytes, None, None]) -> bool:
-        ts = self._opts.get("timeout", 60)
-        with httpx.Client(timeout=ts) as client:
-            r = client.put(f"{self.url}/{key}", content=generator())
+        r = self.client.put(f"{self.url}/{key}", content=generator)
         if r.status_code == 201:
             return True
         return False
 
     def get(self, key: str) -> Union[bytes, None]:
-        with httpx.Client() as client:
-            r = client.get(f"{self.url}/{key}")
+        r = self._request("GET", key)
         if r.status_code == 200:
             return r.content
         return None
 
     def get_stream(self, key: str) -> Generator[bytes, None, None]:
+        with self.client.stream("GET", f"{self.url}/{key}") as r:
+            for raw in r.iter_raw():
+                yield raw
+
+    def size(self, key: str) -> Union[int, None]:
+        r = self._request("HEAD", key)
+        if r.status_code == 200 and "content-length" in r.headers:
+            return int(r.headers["content-length"])
+        return None
+
+    def etag(self, key: str) -> Union[str, None]:
+        r = self._request("HEAD", key)
+        if r.status_code == 200:
+            return r.headers.get("etag")
+        return None
+
+    def get_range(self, key: str, start: int, end: int) -> bytes:
+        r = self._request("GET", key, headers=_range_header(start, end))
+        return _range_content(r, key, start, end)
 
-        with httpx.Client() as client:
-            with client.stream("GET", f"{self.url}/{key}") as r:
-                for raw in r.iter_raw():
-                    yield raw
+    def list(
+        self,
+        prefix: str = "",
+        limit: Optional[int] = None,
+        cursor: Optional[str] = None,
+    ) -> KVPage:
+        keys = walk_keys(lambda d: _entries(self._request("GET", d)), prefix, cursor)
+        return page_of(keys, limit or defaults.KV_LIST_LIMIT)
+
+    def stat(self, key: str) -> Union[KVStat, None]:
+        return _stat(self._request("HEAD", key), key)
+
+    def delete(self, key: str) -> bool:
+        return _deleted(self._request("DELETE", key), key)
 
 
 class AsyncKVFiles(AsyncKVSpec):
+    """
+    Async version of :class:`KVFiles`. The pooled client is created
+    in the first request, it should be used from the same event loop.
+    """
+
+    parallel_get = True
+
     def __init__(self, bucket: str, client_opts: Dict[str, Any] = {}):
         self._opts = client_opts
         self._bucket = bucket
+        self._client: Union[httpx.AsyncClient, None] = None
+        self._retries = client_opts.get("retries", defaults.KV_FILES_RETRIES)
+        self._backoff = client_opts.get("backoff", defaults.KV_FILES_BACKOFF)
 
     @property
     def url(self):
         return f"{self._opts['url']}/{self._bucket}"
 
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            kwargs = client_kwargs(self._opts)
+            transport = httpx.AsyncHTTPTransport(
+                limits=kwargs["limits"],
+                http2=kwargs["http2"],
+                retries=kwargs["retries"],
+            )
+            self._client = httpx.AsyncClient(
+                timeout=kwargs["timeout"], transport=transport
+            )
+        return self._client
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+        self._client = None
+
+    async def _request(self, method: str, key: str, **kwargs) -> httpx.Response:
+        attempt = 0
+        while True:
+            try:
+                r = await self.client.request(method, f"{self.url}/{key}", **kwargs)
+            except httpx.TransportError as e:
+                r = e
+            if not _should_retry(r, attempt, self._retries):
+                break
+            await asyncio.sleep(self._backoff * 2**attempt)
+            attempt += 1
+        if isinstance(r, Exception):
+            raise r
+        return r
+
     async def put(self, key: str, bdata: bytes):
-        async with httpx.AsyncClient() as client:
-            r = await client.put(f"{self.url}/{key}", content=bdata)
-            if r.status_code == 201:
-                return True
+        r = await self._request("PUT", key, content=bdata)
+        if r.status_code == 201:
+            return True
         return False
 
     async def put_stream(
         self, key: str, generator: Generator[bytes, None, None]
     ) -> bool:
-        ts = self._opts.get("timeout", 60)
-        async with httpx.AsyncClient(timeout=ts) as client:
-            r = await client.put(f"{self.url}/{key}", content=generator)
-            if r.status_code == 201:
-                return True
+        r = await self.client.put(f"{self.url}/{key}", content=generator)
+        if r.status_code == 201:
+            return True
         return False
 
     async def get(self, key: str) -> Union[bytes, None]:
-        ts = self._opts.get("timeout", 60)
-        async with httpx.AsyncClient(timeout=ts) as client:
-            r = await client.get(f"{self.url}/{key}")
+        r = await self._request("GET", key)
+        if r.status_code == 200:
             return r.content
+        return None
 
     async def get_stream(self, key: str) -> AsyncGenerator[bytes, None]:
         u = f"{self.url}/{key}"
-        ts = self._opts.get("timeout", 60)
-        async with httpx.AsyncClient(timeout=ts) as client:
-            async with client.stream("GET", u) as r:
-                async for chunk in r.aiter_bytes():
-                    yield chunk
+        async with self.client.stream("GET", u) as r:
+            async for chunk in r.aiter_bytes():
+                yield chunk
+
+    async def size(self, key: str) -> Union[int, None]:
+        r = await self._request("HEAD", key)
+        if r.status_code == 200 and "content-length" in r.headers:
+            return int(r.headers["content-length"])
+        return None
+
+    async def get_range(self, key: str, start: int, end: int) -> bytes:
+        r = await self._request("GET", key, headers=_range_header(start, end))
+        return _range_content(r, key, start, end)
+
+    async def _listdir(self, dirpath: str) -> List[Tuple[str, bool]]:
+        return _entries(await self._request("GET", dirpath))
+
+    async def list(
+        self,
+        prefix: str = "",
+        limit: Optional[int] = None,
+        cursor: Optional[str] = None,
+    ) -> KVPage:
+        return await async_page_of_walk(
+            self._listdir, prefix, cursor, limit or defaults.KV_LIST_LIMIT
+        )
+
+    async def stat(self, key: str) -> Union[KVStat, None]:
+        return _stat(await self._request("HEAD", key), key)
+
+    async def delete(self, key: str) -> bool:
+        return _deleted(await self._request("DELETE", key), key)
@@ -1,18 +1,32 @@
 import io
 import os
 from datetime import datetime, timedelta
-from typing import Any, AsyncGenerator, Dict, Generator, Union
+from typing import Any, AsyncGenerator, Dict, Generator, List, Optional, Union
 
+from google.api_core.exceptions import NotFound
 from google.cloud.storage import Client
 from smart_open import open
 
-from labfunctions.utils import run_async
+from labfunctions import defaults
+from labfunctions.utils import run_async, stream_async
 
-from .kvspec import AsyncKVSpec, GenericKVSpec
+from .kvspec import AsyncKVSpec, GenericKVSpec, KeyReadError, KVPage, KVStat
+
+# max sources of a compose request
+COMPOSE_MAX = 32
 
 
 class KVGS(GenericKVSpec):
-    """https://googleapis.dev/python/storage/latest/client.html"""
+    """https://googleapis.dev/python/storage/latest/client.html
+
+    Parallel uploads store each part as a temporal object which are
+    composed and deleted at the end; parallel downloads use ranged reads.
+
+    The cursor of `list` is the page token of the bucket.
+    """
+
+    parallel_put = True
+    parallel_get = True
 
     def __init__(self, bucket: str, client_opts: Dict[str, Any] = {}):
         self._opts = client_opts
@@ -60,13 +74,94 @@ class KVGS(GenericKVSpec):
 
     def get_stream(self, key: str) -> Generator[bytes, None, None]:
         uri = f"{self.uri}/{key}"
-        for chunk in open(uri, "rb", transport_params=self.params):
-            yield chunk
+        size = self._opts.get("chunk_size", defaults.KV_CHUNK_SIZE)
+        try:
+            with open(uri, "rb", transport_params=self.params) as f:
+                while True:
+                    chunk = f.read(size)
+                    if not chunk:
+                        break
+                    yield chunk
+        except Exception as e:
+            raise KeyReadError(self._bucket, key, str(e))
+
+    def _part_name(self, key: str, index: int) -> str:
+        return f"{key}.parts/{index:05d}"
+
+    def put_part(self, key: str, index: int, bdata: bytes) -> bool:
+        blob = self.bucket.blob(self._part_name(key, index))
+        blob.upload_from_string(bdata, content_type="application/octet-stream")
+        return True
+
+    def compose_parts(self, key: str, total: int) -> bool:
+        parts = [self.bucket.blob(self._part_name(key, i)) for i in range(total)]
+        dst = self.bucket.blob(key)
+        dst.content_type = "application/octet-stream"
+        try:
+            dst.compose(parts[:COMPOSE_MAX])
+            # the object composed so far is the first source of the next one
+            for i in range(COMPOSE_MAX, total, COMPOSE_MAX - 1):
+                dst.compose([dst] + parts[i : i + COMPOSE_MAX - 1])
+        except Exception:
+            return False
+        finally:
+            self.bucket.delete_blobs(parts, on_error=lambda blob: None)
+        return True
+
+    def size(self, key: str) -> Union[int, None]:
+        blob = self.bucket.get_blob(key)
+        return blob.size if blob else None
+
+    def etag(self, key: str) -> Union[str, None]:
+        blob = self.bucket.get_blob(key)
+        return str(blob.generation) if blob else None
+
+    def get_range(self, key: str, start: int, end: int) -> bytes:
+        # the end of gcs is included
+        return self.bucket.blob(key).download_as_bytes(start=start, end=end - 1)
+
+    def list(
+        self,
+        prefix: str = "",
+        limit: Optional[int] = None,
+        cursor: Optional[str] = None,
+    ) -> KVPage:
+        blobs = self.client.list_blobs(
+            self.bucket,
+            prefix=prefix,
+            page_size=limit or defaults.KV_LIST_LIMIT,
+            page_token=cursor,
+        )
+        page = next(blobs.pages, [])
+        return KVPage(keys=[b.name for b in page], cursor=blobs.next_page_token)
+
+    def stat(self, key: str) -> Union[KVStat, None]:
+        blob = self.bucket.get_blob(key)
+        if not blob:
+            return None
+        return KVStat(
+            key=key,
+            size=blob.size,
+            mtime=blob.updated.timestamp() if blob.updated else None,
+            etag=str(blob.generation),
+        )
+
+    def exists(self, key: str) -> bool:
+        return self.bucket.blob(key).exists()
+
+    def delete(self, key: str) -> bool:
+        try:
+            self.bucket.blob(key).delete()
+        except NotFound:
+            return False
+        return True
 
 
 class AsyncKVGS(AsyncKVSpec):
     """A hacky solution because thereisn't trustworthy async lib"""
 
+    parallel_get = True
+
     def __init__(self, bucket: str, client_opts: Dict[str, Any] = {}):
         self._opts = client_opts
         self._bucket = bucket
@@ -86,4 +181,59 @@ class AsyncKVGS(AsyncKVSpec):
         return rsp
 
     async def get_stream(self, key: str) -> AsyncGenerator[bytes, None]:
-        yield await run_async(self.client.get_stream, key)
+        """
+        The chunks are read in a thread, while up to `read_ahead` chunks
+        (see `client_opts`) wait to be consumed.
+        """
+        read_ahead = self._opts.get("read_ahead", defaults.KV_READ_AHEAD)
+        async for chunk in stream_async(self.client.get_stream(key), read_ahead):
+            yield chunk
+
+    async def put_parallel(
+        self,
+        key: str,
+        generator: Generator[bytes, None, None],
+        part_size: Optional[int] = None,
+        concurrency: Optional[int] = None,
+    ) -> bool:
+        return await run_async(
+            self.client.put_parallel, key, generator, part_size, concurrency
+        )
+
+    async def size(self, key: str) -> Union[int, None]:
+        return await run_async(self.client.size, key)
+
+    async def get_range(self, key: str, start: int, end: int) -> bytes:
+        return await run_async(self.client.get_range, key, start, end)
+
+    async def list(
+        self,
+        prefix: str = "",
+        limit: Optional[int] = None,
+        cursor: Optional[str] = None,
+    ) -> KVPage:
+        return await run_async(self.client.list, prefix, limit, cursor)
+
+    async def stat(self, key: str) -> Union[KVStat, None]:
+        return await run_async(self.client.stat, key)
+
+    async def exists(self, key: str) -> bool:
+        return await run_async(self.client.exists, key)
+
+    async def delete(self, key: str) -> bool:
+        return await run_async(self.client.delete, key)
+
+    async def get_many(
+        self, keys: List[str], concurrency: Optional[int] = None
+    ) -> Dict[str, Union[bytes, str, None]]:
+        return await run_async(self.client.get_many, keys, concurrency)
+
+    async def put_many(
+        self, items: Dict[str, bytes], concurrency: Optional[int] = None
+    ) -> Dict[str, bool]:
+        return await run_async(self.client.put_many, items, concurrency)
+
+    async def delete_many(
+        self, keys: List[str], concurrency: Optional[int] = None
+    ) -> int:
+        return await run_async(self.client.delete_many, keys, concurrency)
@@ -2,18 +2,62 @@ import asyncio
 import os
 import tempfile
 from pathlib import Path
-from typing import Any, AsyncGenerator, Dict, Generator, Union
+from typing import Any, AsyncGenerator, Dict, Generator, List, Optional, Tuple, Union
 
 import aiofiles
 from smart_open import open as sopen
 
+from labfunctions import defaults
 from labfunctions.utils import mkdir_p
 
-from .kvspec import AsyncKVSpec, GenericKVSpec, KeyReadError, KeyWriteError
+from .kvspec import (
+    AsyncKVSpec,
+    GenericKVSpec,
+    KeyReadError,
+    KeyWriteError,
+    KVPage,
+    KVStat,
+    page_of,
+    walk_keys,
+)
+
+
+def _listdir(root: str, dirpath: str) -> List[Tuple[str, bool]]:
+    try:
+        with os.scandir(f"{root}/{dirpath}") as entries:
+            return [(e.name, e.is_dir()) for e in entries]
+    except (FileNotFoundError, NotADirectoryError):
+        return []
+
+
+def _stat(uri: str, key: str) -> Union[KVStat, None]:
+    try:
+        st = os.stat(uri)
+    except OSError:
+        return None
+    return KVStat(
+        key=key,
+        size=st.st_size,
+        mtime=st.st_mtime,
+        etag=f"{st.st_mtime_ns}-{st.st_size}",
+    )
+
+
+def _delete(uri: str) -> bool:
+    try:
+        os.remove(uri)
+    except FileNotFoundError:
+        return False
+    return True
 
 
 class KVLocal(GenericKVSpec):
-    """https://googleapis.dev/python/storage/latest/client.html"""
+    """https://googleapis.dev/python/storage/latest/client.html
+
+    Only parallel downloads are supported, by ranged reads of the file.
+    """
+
+    parallel_get = True
 
     def __init__(self, bucket: str, client_opts: Dict[str, Any] = {}):
         self._opts = client_opts
@@ -67,10 +111,49 @@ class KVLocal(GenericKVSpec):
         except Exception as e:
             raise KeyReadError(self._bucket, key, str(e))
 
+    def size(self, key: str) -> Union[int, None]:
+        try:
+            return os.path.getsize(self.uri(key))
+        except OSError:
+            return None
+
+    def etag(self, key: str) -> Union[str, None]:
+        st = _stat(self.uri(key), key)
+        return st.etag if st else None
+
+    def list(
+        self,
+        prefix: str = "",
+        limit: Optional[int] = None,
+        cursor: Optional[str] = None,
+    ) -> KVPage:
+        root = f"{self._root}/{self._bucket}"
+        keys = walk_keys(lambda d: _listdir(root, d), prefix, cursor)
+        return page_of(keys, limit or defaults.KV_LIST_LIMIT)
+
+    def stat(self, key: str) -> Union[KVStat, None]:
+        return _stat(self.uri(key), key)
+
+    def exists(self, key: str) -> bool:
+        return os.path.isfile(self.uri(key))
+
+    def delete(self, key: str) -> bool:
+        return _delete(self.uri(key))
+
+    def get_range(self, key: str, start: int, end: int) -> bytes:
+        try:
+            with open(self.uri(key), "rb") as f:
+                f.seek(start)
+                return f.read(end - start)
+        except OSError as e:
+            raise KeyReadError(self._bucket, key, str(e))
+
 
 class AsyncKVLocal(AsyncKVSpec):
     """For local usage and testing"""
 
+    parallel_get = True
+
     def __init__(self, bucket: str, client_opts: Dict[str, Any] = {}):
         self._opts = client_opts
         self._bucket = bucket
@@ -125,3 +208,36 @@ class AsyncKVLocal(AsyncKVSpec):
 
         except Exception as e:
             raise KeyReadError(self._bucket, key, str(e))
+
+    async def size(self, key: str) -> Union[int, None]:
+        try:
+            return os.path.getsize(self.uri(key))
+        except OSError:
+            return None
+
+    async def get_range(self, key: str, start: int, end: int) -> bytes:
+        try:
+            async with aiofiles.open(self.uri(key), mode="rb") as f:
+                await f.seek(start)
+                return await f.read(end - start)
+        except OSError as e:
+            raise KeyReadError(self._bucket, key, str(e))
+
+    async def list(
+        self,
+        prefix: str = "",
+        limit: Optional[int] = None,
+        cursor: Optional[str] = None,
+    ) -> KVPage:
+        root = f"{self._root}/{self._bucket}"
+        keys = walk_keys(lambda d: _listdir(root, d), prefix, cursor)
+        return page_of(keys, limit or defaults.KV_LIST_LIMIT)
+
+    async def stat(self, key: str) -> Union[KVStat, None]:
+        return _stat(self.uri(key), key)
+
+    async def exists(self, key: str) -> bool:
+        return os.path.isfile(self.uri(key))
+
+    async def delete(self, key: str) -> bool:
+        return _delete(self.uri(key))
@@ -1,6 +1,24 @@
+import asyncio
 from abc import ABC, abstractmethod
-from typing import Any, AsyncGenerator, Dict, Generator, Union
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from itertools import chain, islice
+from typing import (
+    Any,
+    AsyncGenerator,
+    Awaitable,
+    Callable,
+    Dict,
+    Generator,
+    Iterable,
+    List,
+    Optional,
+    Tuple,
+    Union,
+)
 
+from labfunctions import defaults
 from labfunctions.utils import get_class
 
 
@@ -16,6 +34,127 @@ class KeyWriteError(Exception):
         super().__init__(msg)
 
 
+@dataclass
+class KVStat:
+    """
+    :param mtime: last modification, in seconds since the epoch
+    :param etag: see :meth:`GenericKVSpec.etag`
+    """
+
+    key: str
+    size: int
+    mtime: Optional[float] = None
+    etag: Optional[str] = None
+
+
+@dataclass
+class KVPage:
+    """
+    A page of keys returned by `list`, `cursor` is given to `list` to get
+    the next page, it's None in the last one.
+    """
+
+    keys: List[str]
+    cursor: Optional[str] = None
+
+
+def _sorted_entries(
+    dirpath: str, entries: List[Tuple[str, bool]]
+) -> List[Tuple[str, bool]]:
+    # a directory sorts as "name/", the prefix of all its keys
+    return sorted(
+        (f"{dirpath}{name}/" if is_dir else f"{dirpath}{name}", is_dir)
+        for name, is_dir in entries
+    )
+
+
+def _wanted(key: str, is_dir: bool, prefix: str, start_after: Optional[str]) -> bool:
+    if not is_dir:
+        return key.startswith(prefix) and (not start_after or key > start_after)
+    if not (key.startswith(prefix) or prefix.startswith(key)):
+        return False
+    return not start_after or key > start_after or start_after.startswith(key)
+
+
+def walk_keys(
+    listdir: Callable[[str], List[Tuple[str, bool]]],
+    prefix: str = "",
+    start_after: Optional[str] = None,
+) -> Generator[str, None, None]:
+    """
+    Keys of a store of files and directories in lexicographic order, as
+    object stores list them. `listdir` gets a directory, like "a/b/" or ""
+    for the root, and returns the names of its entries and if they are
+    directories. Only directories with keys of `prefix` after `start_after`
+    are listed.
+    """
+
+    def _walk(dirpath: str) -> Generator[str, None, None]:
+        for key, is_dir in _sorted_entries(dirpath, listdir(dirpath)):
+            if not _wanted(key, is_dir, prefix, start_after):
+                continue
+            if is_dir:
+                yield from _walk(key)
+            else:
+                yield key
+
+    yield from _walk(prefix[: prefix.rfind("/") + 1])
+
+
+def page_of(keys: Iterable[str], limit: int) -> KVPage:
+    """First `limit` keys of `keys`, the cursor is the last key of the page"""
+    page = list(islice(keys, limit + 1))
+    if len(page) > limit:
+        return KVPage(keys=page[:limit], cursor=page[limit - 1])
+    return KVPage(keys=page)
+
+
+async def async_page_of_walk(
+    listdir: Callable[[str], Awaitable[List[Tuple[str, bool]]]],
+    prefix: str,
+    start_after: Optional[str],
+    limit: int,
+) -> KVPage:
+    """:func:`page_of` the keys of :func:`walk_keys`, with an async `listdir`"""
+    keys: List[str] = []
+
+    async def _walk(dirpath: str) -> bool:
+        for key, is_dir in _sorted_entries(dirpath, await listdir(dirpath)):
+            if not _wanted(key, is_dir, prefix, start_after):
+                continue
+            if is_dir:
+                if not await _walk(key):
+                    return False
+                continue
+            keys.append(key)
+            if len(keys) > limit:
+                return False
+        return True
+
+    await _walk(prefix[: prefix.rfind("/") + 1])
+    return page_of(keys, limit)
+
+
+def parts_of(
+    generator: Generator[bytes, None, None], part_size: int
+) -> Generator[bytes, None, None]:
+    """It regroups the chunks of `generator` in parts of `part_size`,
+    the last one could be smaller"""
+    buffer = bytearray()
+    for chunk in generator:
+        buffer.extend(chunk)
+        while len(buffer) >= part_size:
+            yield bytes(buffer[:part_size])
+            del buffer[:part_size]
+    if buffer:
+        yield bytes(buffer)
+
+
+def ranges_of(size: int, part_size: int) -> List[Tuple[int, int]]:
+    """Ranges [start, end) of `part_size` which cover `size` bytes"""
+    return [(s, min(s + part_size, size)) for s in range(0, size, part_size)]
+
+
 class GenericKVSpec(ABC):
     """
     This is a generic KV store mostly use for project data related
@@ -25,8 +164,21 @@ class GenericKVSpec(ABC):
     For examples about how to use some of them see tests/test_io_kv.py
 
     This interface is offered in a sync and async version
+
+    Large objects can be moved with `put_parallel` and `get_parallel`,
+    which split them in parts of `part_size` transferred by `concurrency`
+    threads (both taken from `client_opts` if not given). A store supports
+    them setting `parallel_put`, and implementing `put_part` and
+    `compose_parts`, or `parallel_get`, and implementing `size` and
+    `get_range`; if not, they fall back to `put_stream` and `get_stream`.
+
+    Keys are listed by pages with `list`, and `get_many`, `put_many`
+    and `delete_many` move several objects using `concurrency` threads.
     """
 
+    parallel_put = False
+    parallel_get = False
+
     def __init__(self, bucket: str, client_opts: Dict[str, Any] = {}):
         self._opts = client_opts
         self._bucket = bucket
@@ -47,6 +199,164 @@ class GenericKVSpec(ABC):
     def get_stream(self, key: str) -> Generator[bytes, None, None]:
         pass
 
+    def _parallel_opts(
+        self, part_size: Optional[int], concurrency: Optional[int]
+    ) -> Tuple[int, int]:
+        part_size = part_size or self._opts.get("part_size", defaults.KV_PART_SIZE)
+        concurrency = concurrency or self._opts.get(
+            "concurrency", defaults.KV_CONCURRENCY
+        )
+        return part_size, concurrency
+
+    def put_part(self, key: str, index: int, bdata: bytes) -> bool:
+        raise NotImplementedError()
+
+    def compose_parts(self, key: str, total: int) -> bool:
+        """It joins the parts uploaded by `put_part` as `key`"""
+        raise NotImplementedError()
+
+    def size(self, key: str) -> Union[int, None]:
+        raise NotImplementedError()
+
+    def get_range(self, key: str, start: int, end: int) -> bytes:
+        """Bytes from `start` to `end`, not included"""
+        raise NotImplementedError()
+
+    def etag(self, key: str) -> Union[str, None]:
+        """
+        A value which changes when the object changes, like the etag or
+        the generation, None if the object doesn't exist or the store
+        can't tell it. Used by :class:`labfunctions.io.kv_cached.CachedKV`.
+        """
+        return None
+
+    def list(
+        self,
+        prefix: str = "",
+        limit: Optional[int] = None,
+        cursor: Optional[str] = None,
+    ) -> KVPage:
+        """
+        Up to `limit` keys starting with `prefix` in lexicographic order,
+        `cursor` is the one of the previous page.
+        """
+        raise NotImplementedError()
+
+    def iter_keys(self, prefix: str = "") -> Generator[str, None, None]:
+        """All the keys starting with `prefix`, listed by pages"""
+        cursor = None
+        while True:
+            page = self.list(prefix, cursor=cursor)
+            yield from page.keys
+            cursor = page.cursor
+            if cursor is None:
+                return
+
+    def stat(self, key: str) -> Union[KVStat, None]:
+        """None if `key` doesn't exist"""
+        raise NotImplementedError()
+
+    def exists(self, key: str) -> bool:
+        return self.stat(key) is not None
+
+    def delete(self, key: str) -> bool:
+        """False if `key` didn't exist"""
+        raise NotImplementedError()
+
+    def _map(
+        self, func: Callable[[Any], Any], items: List[Any], concurrency: Optional[int]
+    ) -> List[Any]:
+        _, concurrency = self._parallel_opts(None, concurrency)
+        with ThreadPoolExecutor(concurrency) as pool:
+            return list(pool.map(func, items))
+
+    def _get_or_none(self, key: str) -> Union[bytes, str, None]:
+        try:
+            return self.get(key)
+        except KeyReadError:
+            return None
+
+    def get_many(
+        self, keys: List[str], concurrency: Optional[int] = None
+    ) -> Dict[str, Union[bytes, str, None]]:
+        """Values of `keys`, None for the keys which couldn't be read"""
+        return dict(zip(keys, self._map(self._get_or_none, keys, concurrency)))
+
+    def put_many(
+        self, items: Dict[str, bytes], concurrency: Optional[int] = None
+    ) -> Dict[str, bool]:
+        """If each object was written"""
+        keys = list(items)
+        written = self._map(
+            lambda key: self.put(key, items[key]) is not False, keys, concurrency
+        )
+        return dict(zip(keys, written))
+
+    def delete_many(self, keys: List[str], concurrency: Optional[int] = None) -> int:
+        """Number of objects deleted"""
+        return sum(self._map(self.delete, keys, concurrency))
+
+    def put_parallel(
+        self,
+        key: str,
+        generator: Generator[bytes, None, None],
+        part_size: Optional[int] = None,
+        concurrency: Optional[int] = None,
+    ) -> bool:
+        """
+        It uploads `generator` in parts, at most `concurrency` parts
+        are kept in memory. Objects of one part are uploaded with `put`.
+        """
+        if not self.parallel_put:
+            return self.put_stream(key, generator)
+        part_size, concurrency = self._parallel_opts(part_size, concurrency)
+        parts = parts_of(generator, part_size)
+        first = next(parts, b"")
+        second = next(parts, None)
+        if second is None:
+            return self.put(key, first) is not False
+
+        done = []
+        pending = set()
+        with ThreadPoolExecutor(concurrency) as pool:
+            for index, part in enumerate(chain([first, second], parts)):
+                if len(pending) >= concurrency:
+                    finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    done.extend(finished)
+                pending.add(pool.submit(self.put_part, key, index, part))
+            done.extend(pending)
+        if not all(f.result() for f in done):
+            return False
+        return self.compose_parts(key, len(done))
+
+    def get_parallel(
+        self,
+        key: str,
+        part_size: Optional[int] = None,
+        concurrency: Optional[int] = None,
+    ) -> Generator[bytes, None, None]:
+        """
+        It downloads `key` by ranges in parallel, the parts are yielded in
+        order and at most `concurrency` parts are kept in memory.
+        """
+        part_size, concurrency = self._parallel_opts(part_size, concurrency)
+        size = self.size(key) if self.parallel_get else None
+        if size is None or size <= part_size:
+            yield from self.get_stream(key)
+            return
+
+        ranges = iter(ranges_of(size, part_size))
+        with ThreadPoolExecutor(concurrency) as pool:
+            pending = deque(
+                pool.submit(self.get_range, key, start, end)
+                for start, end in islice(ranges, concurrency)
+            )
+            while pending:
+                data = pending.popleft().result()
+                for start, end in islice(ranges, 1):
+                    pending.append(pool.submit(self.get_range, key, start, end))
+                yield data
+
     @staticmethod
     def create(store_class, bucket, opts: Dict[str, Any] = {}) -> "GenericKVSpec":
         Class = get_class(store_class)
@@ -63,8 +373,14 @@ class AsyncKVSpec(ABC):
 
 
     This interface is offered in a sync and async version
+
+    See :class:`GenericKVSpec` about `put_parallel` and `get_parallel`,
+    the parts of `get_parallel` are downloaded by concurrent tasks, as
+    the objects of `get_many`, `put_many` and `delete_many`.
     """
 
+    parallel_get = False
+
     def __init__(self, client_opts: Dict[str, Any], bucket: str):
         self._opts = client_opts
         self._bucket = bucket
@@ -87,6 +403,125 @@ class AsyncKVSpec(ABC):
     async def get_stream(self, key: str) -> AsyncGenerator[bytes, None]:
         pass
 
+    def _parallel_opts(
+        self, part_size: Optional[int], concurrency: Optional[int]
+    ) -> Tuple[int, int]:
+        part_size = part_size or self._opts.get("part_size", defaults.KV_PART_SIZE)
+        concurrency = concurrency or self._opts.get(
+            "concurrency", defaults.KV_CONCURRENCY
+        )
+        return part_size, concurrency
+
+    async def size(self, key: str) -> Union[int, None]:
+        raise NotImplementedError()
+
+    async def get_range(self, key: str, start: int, end: int) -> bytes:
+        """Bytes from `start` to `end`, not included"""
+        raise NotImplementedError()
+
+    async def put_parallel(
+        self,
+        key: str,
+        generator: Generator[bytes, None, None],
+        part_size: Optional[int] = None,
+        concurrency: Optional[int] = None,
+    ) -> bool:
+        return await self.put_stream(key, generator)
+
+    async def list(
+        self,
+        prefix: str = "",
+        limit: Optional[int] = None,
+        cursor: Optional[str] = None,
+    ) -> KVPage:
+        raise NotImplementedError()
+
+    async def iter_keys(self, prefix: str = "") -> AsyncGenerator[str, None]:
+        cursor = None
+        while True:
+            page = await self.list(prefix, cursor=cursor)
+            for key in page.keys:
+                yield key
+            cursor = page.cursor
+            if cursor is None:
+                return
+
+    async def stat(self, key: str) -> Union[KVStat, None]:
+        raise NotImplementedError()
+
+    async def exists(self, key: str) -> bool:
+        return await self.stat(key) is not None
+
+    async def delete(self, key: str) -> bool:
+        raise NotImplementedError()
+
+    async def _map(
+        self, func: Callable[[Any], Any], items: List[Any], concurrency: Optional[int]
+    ) -> List[Any]:
+        _, concurrency = self._parallel_opts(None, concurrency)
+        sem = asyncio.Semaphore(concurrency)
+
+        async def _run(item):
+            async with sem:
+                return await func(item)
+
+        return await asyncio.gather(*[_run(item) for item in items])
+
+    async def _get_or_none(self, key: str) -> Union[bytes, str, None]:
+        try:
+            return await self.get(key)
+        except KeyReadError:
+            return None
+
+    async def get_many(
+        self, keys: List[str], concurrency: Optional[int] = None
+    ) -> Dict[str, Union[bytes, str, None]]:
+        values = await self._map(self._get_or_none, keys, concurrency)
+        return dict(zip(keys, values))
+
+    async def put_many(
+        self, items: Dict[str, bytes], concurrency: Optional[int] = None
+    ) -> Dict[str, bool]:
+        async def _put(key):
+            return await self.put(key, items[key]) is not False
+
+        keys = list(items)
+        return dict(zip(keys, await self._map(_put, keys, concurrency)))
+
+    async def delete_many(
+        self, keys: List[str], concurrency: Optional[int] = None
+    ) -> int:
+        return sum(await self._map(self.delete, keys, concurrency))
+
+    async def get_parallel(
+        self,
+        key: str,
+        part_size: Optional[int] = None,
+        concurrency: Optional[int] = None,
+    ) -> AsyncGenerator[bytes, None]:
+        part_size, concurrency = self._parallel_opts(part_size, concurrency)
+        size = await self.size(key) if self.parallel_get else None
+        if size is None or size <= part_size:
+            async for chunk in self.get_stream(key):
+                yield chunk
+            return
+
+        ranges = iter(ranges_of(size, part_size))
+        pending = deque(
+            asyncio.ensure_future(self.get_range(key, start, end))
+            for start, end in islice(ranges, concurrency)
+        )
+        try:
+            while pending:
+                data = await pending.popleft()
+                for start, end in islice(ranges, 1):
+                    task = asyncio.ensure_future(self.get_range(key, start, end))
+                    pending.append(task)
+                yield data
+        finally:
+            for task in pending:
+                task.cancel()
+
     @staticmethod
     def create(store_class, bucket, opts: Dict[str, Any] = {}) -> "GenericKVSpec":
         Class = get_class(store_class)
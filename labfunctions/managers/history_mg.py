@@ -10,6 +10,7 @@ from labfunctions.types import (
     HistoryResult,
     NBTask,
 )
+from labfunctions.types.docker import DockerStatsSummary
 
 
 def select_history():
@@ -56,8 +57,39 @@ async def get_last(
     return HistoryLastResponse(rows=rsp)
 
 
+async def get_by_parent(
+    session, projectid: str, parentid: str, limit=None
+) -> HistoryLastResponse:
+    """It returns the executions of a parameter sweep"""
+    stmt = (
+        select(HistoryModel)
+        .where(HistoryModel.parent_id == parentid)
+        .where(HistoryModel.project_id == projectid)
+        .order_by(HistoryModel.created_at.desc())
+        .limit(limit)
+    )
+    r = await session.execute(stmt)
+    rsp = [
+        HistoryResult(
+            wfid=row.wfid,
+            execid=row.execid,
+            status=row.status,
+            result=row.result,
+            created_at=row.created_at.isoformat(),
+        )
+        for row in r.scalars()
+    ]
+    return HistoryLastResponse(rows=rsp)
+
+
+def _last_attempt(stmt):
+    """Retries register each attempt with the same execid, the last one wins"""
+    order = (HistoryModel.created_at.desc(), HistoryModel.id.desc())
+    return stmt.order_by(*order).limit(1)
+
+
 async def get_one(session, execid: str) -> Union[HistoryResult, None]:
-    stmt = select(HistoryModel).where(HistoryModel.execid == execid).limit(1)
+    stmt = _last_attempt(select(HistoryModel).where(HistoryModel.execid == execid))
     r = await session.execute(stmt)
     model: Union[HistoryModel, None] = r.scalar_one_or_none()
     hr = None
@@ -72,7 +104,29 @@ async def get_one(session, execid: str) -> Union[HistoryResult, None]:
     return hr
 
 
+async def set_resources(
+    session, projectid: str, execid: str, resources: DockerStatsSummary
+) -> bool:
+    """It adds the resources used by an execution already registered"""
+    stmt = _last_attempt(
+        select(HistoryModel)
+        .where(HistoryModel.execid == execid)
+        .where(HistoryModel.project_id == projectid)
+    )
+    r = await session.execute(stmt)
+    model: Union[HistoryModel, None] = r.scalar_one_or_none()
+    if not model:
+        return False
+    # a new dict, so the change of the json column is tracked
+    model.result = {**model.result, "resources": resources.dict()}
+    return True
+
+
 async def create(session, execution_result: ExecutionResult) -> HistoryModel:
+    return create_sync(session, execution_result)
+
+
+def create_sync(session, execution_result: ExecutionResult) -> HistoryModel:
     result_data = execution_result.dict()
 
     status = 0
@@ -87,6 +141,7 @@ async def create(session, execution_result: ExecutionResult) -> HistoryModel:
         nb_name=execution_result.name,
         result=result_data,
         status=status,
+        parent_id=execution_result.parentid,
     )
     session.add(row)
     return row
@@ -74,9 +74,7 @@ async def get_by_rid(session, runtimeid: str) -> Union[RuntimeData, None]:
     return None
 
 
-async def get_runtime(
-    session, projectid: str, runtime_name: str, version=None
-) -> Union[RuntimeData, None]:
+def _select_by_name(projectid: str, runtime_name: str, version=None):
     stmt = select_runtime().where(RuntimeModel.project_id == projectid)
     if version:
         stmt = (
@@ -90,6 +88,13 @@ async def get_runtime(
             .order_by(RuntimeModel.created_at.desc())
             .limit(1)
         )
+    return stmt
+
+
+async def get_runtime(
+    session, projectid: str, runtime_name: str, version=None
+) -> Union[RuntimeData, None]:
+    stmt = _select_by_name(projectid, runtime_name, version)
 
     rsp = await session.execute(stmt)
     model = rsp.scalar_one_or_none()
@@ -99,6 +104,19 @@ async def get_runtime(
     return None
 
 
+def get_runtime_sync(
+    session, projectid: str, runtime_name: str, version=None
+) -> Union[RuntimeData, None]:
+    stmt = _select_by_name(projectid, runtime_name, version)
+
+    rsp = session.execute(stmt)
+    model = rsp.scalar_one_or_none()
+    if model:
+        rd = model2runtime(model)
+        return rd
+    return None
+
+
 def get_by_rid_sync(session, runtimeid: str) -> Union[RuntimeData, None]:
     stmt = select_runtime().where(RuntimeModel.runtimeid == runtimeid).limit(1)
 
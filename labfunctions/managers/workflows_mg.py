@@ -1,5 +1,5 @@
 from datetime import datetime
-from typing import Any, Dict, List, Optional, Union
+from typing import Any, Dict, List, Optional, Tuple, Union
 
 from sqlalchemy import delete, select, update
 from sqlalchemy.exc import IntegrityError
@@ -31,6 +31,9 @@ def _update(wfid: str, projectid: str, wfd: WorkflowDataWeb):
     schedule = None
     if wfd.schedule:
         schedule = wfd.schedule.dict()
+    pipeline = None
+    if wfd.pipeline:
+        pipeline = wfd.pipeline.dict()
 
     wm_table = WorkflowModel.__table__
     stmt = (
@@ -39,6 +42,7 @@ def _update(wfid: str, projectid: str, wfd: WorkflowDataWeb):
         .values(
             nbtask=task_dict,
             schedule=schedule,
+            pipeline=pipeline,
             alias=wfd.alias,
             enabled=wfd.enabled,
             updated_at=datetime.utcnow(),
@@ -119,6 +123,20 @@ async def get_all(session, project_id=None) -> List[WorkflowData]:
     return wfs
 
 
+async def get_scheduled(session) -> List[Tuple[str, WorkflowData]]:
+    """All the enabled workflows with a schedule defined
+    :return: a list of (projectid, WorkflowData)
+    """
+    stmt = select(WorkflowModel).where(WorkflowModel.enabled.is_(True))
+    result = await session.execute(stmt)
+
+    wfs = []
+    for r in result.scalars():
+        if r.schedule:
+            wfs.append((r.project_id, WorkflowData(**r.to_dict(rules=WFDATA_RULES))))
+    return wfs
+
+
 async def get_by_alias(session, alias) -> Union[WorkflowModel, None]:
     stmt = select_workflow().where(WorkflowModel.alias == alias).limit(1)
     result = await session.execute(stmt)
@@ -140,12 +158,16 @@ async def register(session, projectid: str, wfd: WorkflowDataWeb, update=False)
     schedule = None
     if wfd.schedule:
         schedule = wfd.schedule.dict()
+    pipeline = None
+    if wfd.pipeline:
+        pipeline = wfd.pipeline.dict()
 
     obj = WorkflowModel(
         wfid=wfid,
         alias=wfd.alias,
         nbtask=wfd.nbtask.dict(),
         schedule=schedule,
+        pipeline=pipeline,
         project_id=projectid,
         enabled=wfd.enabled,
     )
@@ -79,6 +79,7 @@ class HistoryModel(Base, SerializerMixin, ProjectRelationMixin):
     :param result: is the result of the task. TaskResult
     :param elapsed_secs: Time in seconds from the start of the task to the end.
     :param status: -1 fail, 0 ok.
+    :param parent_id: execid of the parameter sweep, if the execution is part of one.
     """
 
     __tablename__ = "nb_history"
@@ -91,6 +92,7 @@ class HistoryModel(Base, SerializerMixin, ProjectRelationMixin):
     result = Column(JSON, nullable=False)
     elapsed_secs = Column(Float(), nullable=False)
     status = Column(Integer, index=True)
+    parent_id = Column(String(24), index=True, nullable=True)
 
     created_at = Column(
         DateTime(),
@@ -179,6 +181,7 @@ class WorkflowModel(Base, SerializerMixin, ProjectRelationMixin):
     :param nbtask: details to execute a notebook with specific parameters.
     :param schedule: when should be executed.
     :param enabled: if the task should run or not.
+    :param pipeline: optional DAG of notebooks to run instead of nbtask.
     """
 
     __tablename__ = "nb_workflow"
@@ -194,6 +197,7 @@ class WorkflowModel(Base, SerializerMixin, ProjectRelationMixin):
     # nb_name = Column(String(), nullable=False)
     nbtask = Column(JSON(), nullable=False)
     schedule = Column(JSON(), nullable=False)
+    pipeline = Column(JSON(), nullable=True)
     enabled = Column(Boolean, default=True, nullable=False)
 
     created_at = Column(DateTime(), server_default=functions.now(), nullable=False)
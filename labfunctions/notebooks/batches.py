@@ -0,0 +1,116 @@
+import json
+import time
+from typing import List, Optional, Union
+
+import redis
+
+from labfunctions import defaults
+from labfunctions.types import ExecutionNBTask
+
+# it adds the execution to the open batch of its queue, project and runtime,
+# or opens a new one. A batch is closed when it's full.
+_ADD = """
+local batchid = redis.call('GET', KEYS[1])
+local opened = 0
+if not batchid then
+    batchid = ARGV[2]
+    opened = 1
+    redis.call('SET', KEYS[1], batchid, 'PX', ARGV[3])
+end
+local items = ARGV[5] .. batchid
+local size = redis.call('RPUSH', items, ARGV[1])
+redis.call('EXPIRE', items, ARGV[6])
+if size >= tonumber(ARGV[4]) then
+    redis.call('DEL', KEYS[1])
+end
+return {opened, batchid}
+"""
+
+# it closes the batch if it's still open and takes its executions
+_CLOSE = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    redis.call('DEL', KEYS[1])
+end
+local items = redis.call('LRANGE', KEYS[2], 0, -1)
+redis.call('DEL', KEYS[2])
+return items
+"""
+
+
+class Batches:
+    """
+    Batches of short executions in Redis, which share a container.
+
+    The first execution queued for a queue, project and runtime opens a
+    batch for `window_secs`, and the caller should enqueue one job for it.
+    The executions queued while the batch is open are added to it, up to
+    `max_size`. When the agent runs the job, it waits until the window
+    ends, closes the batch and takes its executions.
+
+    Adding and closing are done by lua scripts, so an execution is never
+    added to a batch already taken.
+
+    :param redis_obj: the sync Redis instance used by RQ.
+    :param ttl_secs: executions of a batch not taken expire after this time.
+    """
+
+    def __init__(
+        self,
+        redis_obj: redis.Redis,
+        prefix=defaults.BATCH_PREFIX,
+        window_secs=defaults.BATCH_WINDOW_SECS,
+        max_size=defaults.BATCH_MAX_SIZE,
+        ttl_secs=defaults.BATCH_TTL,
+    ):
+        self.redis = redis_obj
+        self.window_secs = window_secs
+        self.max_size = max_size
+        self._prefix = prefix
+        self._ttl = ttl_secs
+        self._add = redis_obj.register_script(_ADD)
+        self._close = redis_obj.register_script(_CLOSE)
+
+    def open_key(self, qname: str, ctx: ExecutionNBTask) -> str:
+        return f"{self._prefix}.open.{qname}.{ctx.projectid}.{ctx.runtime}"
+
+    def items_key(self, batchid: str) -> str:
+        return f"{self._prefix}.items.{batchid}"
+
+    def add(self, ctx: ExecutionNBTask, qname: str) -> Union[str, None]:
+        """
+        It adds the execution to a batch.
+        :return: the id of the batch, only if the execution opened it.
+        """
+        opened, batchid = self._add(
+            keys=[self.open_key(qname, ctx)],
+            args=[
+                ctx.json(),
+                ctx.execid,
+                int(self.window_secs * 1000),
+                self.max_size,
+                self.items_key(""),
+                self._ttl,
+            ],
+        )
+        if not opened:
+            return None
+        return _decode(batchid)
+
+    def wait(self, open_key: str, batchid: str, max_wait: Optional[float] = None):
+        """It blocks until the window of the batch ends"""
+        max_wait = self.window_secs if max_wait is None else max_wait
+        if _decode(self.redis.get(open_key) or "") != batchid:
+            return
+        ms = self.redis.pttl(open_key)
+        if ms > 0:
+            time.sleep(min(ms / 1000, max_wait))
+
+    def close(self, open_key: str, batchid: str) -> List[ExecutionNBTask]:
+        items = self._close(keys=[open_key, self.items_key(batchid)], args=[batchid])
+        return [ExecutionNBTask(**json.loads(i)) for i in items]
+
+
+def _decode(value: Union[bytes, str]) -> str:
+    if isinstance(value, bytes):
+        return value.decode("utf-8")
+    return value
@@ -49,8 +49,13 @@ def create_notebook_ctx(
     execid: Optional[str] = None,
     runtime: Optional[RuntimeData] = None,
     wfid: Optional[str] = None,
+    runtime_image: Optional[str] = None,
 ) -> ExecutionNBTask:
-    """It creates the execution context of a notebook based on project and workflow data"""
+    """It creates the execution context of a notebook based on project and workflow data
+
+    :param runtime_image: if provided, it's used as docker image
+    instead of the one resolved from `runtime`.
+    """
     # root = Path.cwd()
     root = Path(defaults.NOTEBOOKS_DIR)
     today = today_string(format_="day")
@@ -71,8 +76,9 @@ def create_notebook_ctx(
     output_dir = f"{defaults.NB_OUTPUTS}/ok/{today}"
     error_dir = f"{defaults.NB_OUTPUTS}/errors/{today}"
 
-    output_name = f"{wfid}.{task.nb_name}.{execid}.ipynb"
-    _runtime = prepare_runtime(runtime, task.gpu_support)
+    ext = defaults.NB_OUTPUT_EXTS[task.mode]
+    output_name = f"{wfid}.{task.nb_name}.{execid}.{ext}"
+    _runtime = runtime_image or prepare_runtime(runtime, task.gpu_support)
     machine = task.machine or defaults.MACHINE_TYPE
     cluster = task.cluster or defaults.CLUSTER_NAME
 
@@ -96,6 +102,10 @@ def create_notebook_ctx(
         created_at=_now,
         notifications_ok=task.notifications_ok,
         notifications_fail=task.notifications_fail,
+        mode=task.mode,
+        checkpoint=task.checkpoint,
+        retry=task.retry,
+        output_policy=task.output_policy,
     )
 
 
@@ -113,5 +123,7 @@ def make_error_result(ctx: ExecutionNBTask, elapsed) -> ExecutionResult:
         error=True,
         elapsed_secs=round(elapsed, 2),
         created_at=ctx.created_at,
+        parentid=ctx.parentid,
+        node=ctx.node,
     )
     return result
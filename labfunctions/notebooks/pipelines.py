@@ -0,0 +1,300 @@
+import json
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+import redis
+from rq import Queue
+from rq.job import Job
+
+from labfunctions import defaults
+from labfunctions.executors import ExecID, docker_exec
+from labfunctions.types import (
+    ExecutionNBTask,
+    ExecutionResult,
+    PipelineData,
+    PipelineNode,
+    PipelineNodeState,
+    PipelineRun,
+)
+
+WAITING = "waiting"
+QUEUED = "queued"
+OK = "ok"
+FAILED = "failed"
+SKIPPED = "skipped"
+
+
+def node_ctx(
+    parent: ExecutionNBTask, node: PipelineNode, execid: Optional[str] = None
+) -> ExecutionNBTask:
+    """It creates the context of a node from the context of the pipeline"""
+    execid = execid or ExecID().firm_with(ExecID.types.dispatcher)
+    _params = {**parent.params, **node.params}
+    _params["EXECID"] = execid
+    ext = defaults.NB_OUTPUT_EXTS[parent.mode]
+    output_name = f"{parent.wfid}.{node.nb_name}.{execid}.{ext}"
+    return parent.copy(
+        update=dict(
+            execid=execid,
+            parentid=parent.execid,
+            node=node.name,
+            nb_name=node.nb_name,
+            params=_params,
+            pm_input=str(Path(defaults.NOTEBOOKS_DIR) / f"{node.nb_name}.ipynb"),
+            pm_output=f"{parent.output_dir}/{output_name}",
+            output_name=output_name,
+            machine=node.machine or parent.machine,
+            cluster=node.cluster or parent.cluster,
+            timeout=node.timeout or parent.timeout,
+        )
+    )
+
+
+def enqueue_node(redis_obj: redis.Redis, ctx: ExecutionNBTask, is_async=True) -> Job:
+    """It enqueues a node in its `cluster.machine` queue, when it ends
+    the nodes that depend on it are enqueued if they are ready"""
+    Q = Queue(f"{ctx.cluster}.{ctx.machine}", connection=redis_obj, is_async=is_async)
+    return Q.enqueue(
+        docker_exec.docker_exec,
+        ctx,
+        job_id=ctx.execid,
+        job_timeout=ctx.timeout,
+        meta=dict(is_async=is_async),
+        on_success=node_ok,
+        on_failure=node_failed,
+    )
+
+
+def node_ok(job: Job, connection: redis.Redis, result: ExecutionResult, *args):
+    """RQ success callback of a node"""
+    if result and result.retry_in is not None:
+        # a new attempt was enqueued with the same callbacks
+        return
+    error = bool(result and result.error)
+    elapsed = result.elapsed_secs if result else None
+    _next_nodes(job, connection, error, elapsed)
+
+
+def node_failed(job: Job, connection: redis.Redis, *args):
+    """RQ failure callback of a node"""
+    _next_nodes(job, connection, True, None)
+
+
+def _next_nodes(job: Job, connection: redis.Redis, error: bool, elapsed):
+    ctx: ExecutionNBTask = job.args[0]
+    is_async = job.meta.get("is_async", True)
+    pipes = Pipelines(connection)
+    ready, finished = pipes.finish(ctx.parentid, ctx.node, error, elapsed)
+    for nxt in ready:
+        enqueue_node(connection, nxt, is_async=is_async)
+    if finished:
+        # history is written by the control plane
+        qname = pipes.control_queue(ctx.parentid)
+        Q = Queue(qname, connection=connection, is_async=is_async)
+        Q.enqueue("labfunctions.scheduler.pipeline_finished", ctx.parentid)
+
+
+def critical_path(nodes: Dict[str, PipelineNodeState], needs: Dict[str, List[str]]):
+    """
+    Starting from the last node to end, it follows the need
+    which ended last, until a node without needs.
+    """
+    ended = [n for n in nodes.values() if n.ended_at]
+    if not ended:
+        return []
+    current = max(ended, key=lambda n: n.ended_at).name
+    path = [current]
+    while needs.get(current):
+        current = max(needs[current], key=lambda n: nodes[n].ended_at or 0)
+        path.insert(0, current)
+    return path
+
+
+class Pipelines:
+    """
+    State of the pipelines in Redis.
+
+    For each execution of a pipeline, the state of each node, the context of
+    the nodes not enqueued yet and how many of its needs are still
+    running are stored. When a node ends, the counter of each node which
+    depends on it is decremented, and the ones which reach zero are returned to
+    be enqueued, because HINCRBY is atomic, each node is enqueued only once
+    even if its needs end at the same time in different agents.
+
+    If a node fails, every node that depends on it, directly or not,
+    is skipped.
+
+    :param redis_obj: the sync Redis instance used by RQ.
+    :param ttl_secs: the state of a pipeline expires after this time.
+    """
+
+    def __init__(
+        self,
+        redis_obj: redis.Redis,
+        prefix=defaults.PIPELINE_PREFIX,
+        ttl_secs=defaults.PIPELINE_TTL,
+    ):
+        self.redis = redis_obj
+        self._prefix = prefix
+        self._ttl = ttl_secs
+
+    def key(self, runid: str, name: Optional[str] = None) -> str:
+        if name:
+            return f"{self._prefix}.{runid}.{name}"
+        return f"{self._prefix}.{runid}"
+
+    def _keys(self, runid: str) -> List[str]:
+        return [
+            self.key(runid, k)
+            for k in (None, "nodes", "ctx", "needs", "waiting", "skipped")
+        ]
+
+    def start(
+        self,
+        parent: ExecutionNBTask,
+        pipeline: PipelineData,
+        ctxs: Dict[str, ExecutionNBTask],
+        control_queue: str,
+    ) -> List[ExecutionNBTask]:
+        """
+        It registers a new execution of a pipeline, the execid of `parent`
+        is used as id of the execution.
+
+        :param ctxs: the context of each node by name.
+        :param control_queue: where :func:`labfunctions.scheduler.pipeline_finished`
+        is enqueued when the pipeline ends.
+        :return: the nodes to enqueue now.
+        """
+        runid = parent.execid
+        now = time.time()
+        ready = []
+        states = {}
+        waiting = {}
+        for node in pipeline.nodes:
+            state = PipelineNodeState(
+                name=node.name, status=WAITING, execid=ctxs[node.name].execid
+            )
+            if node.needs:
+                waiting[node.name] = len(node.needs)
+            else:
+                state.status = QUEUED
+                state.queued_at = now
+                ready.append(ctxs[node.name])
+            states[node.name] = state.json()
+
+        with self.redis.pipeline() as pipe:
+            pipe.hset(
+                self.key(runid),
+                mapping=dict(
+                    projectid=parent.projectid,
+                    wfid=parent.wfid,
+                    total=len(pipeline.nodes),
+                    ended=0,
+                    started_at=now,
+                    created_at=parent.created_at,
+                    control_queue=control_queue,
+                ),
+            )
+            pipe.hset(self.key(runid, "nodes"), mapping=states)
+            pipe.hset(
+                self.key(runid, "ctx"),
+                mapping={n: c.json() for n, c in ctxs.items()},
+            )
+            pipe.hset(
+                self.key(runid, "needs"),
+                mapping={n.name: json.dumps(n.needs) for n in pipeline.nodes},
+            )
+            if waiting:
+                pipe.hset(self.key(runid, "waiting"), mapping=waiting)
+            for k in self._keys(runid):
+                pipe.expire(k, self._ttl)
+            pipe.execute()
+        return ready
+
+    def control_queue(self, runid: str) -> str:
+        return _decode(self.redis.hget(self.key(runid), "control_queue"))
+
+    def _needs(self, runid: str) -> Dict[str, List[str]]:
+        data = self.redis.hgetall(self.key(runid, "needs"))
+        return {_decode(k): json.loads(v) for k, v in data.items()}
+
+    def _set_state(self, runid: str, state: PipelineNodeState):
+        self.redis.hset(self.key(runid, "nodes"), state.name, state.json())
+
+    def get_state(self, runid: str, name: str) -> PipelineNodeState:
+        data = self.redis.hget(self.key(runid, "nodes"), name)
+        return PipelineNodeState(**json.loads(data))
+
+    def finish(
+        self, runid: str, name: str, error=False, elapsed: Optional[float] = None
+    ) -> Tuple[List[ExecutionNBTask], bool]:
+        """
+        It registers the end of a node.
+
+        :return: the nodes ready to be enqueued, and if the pipeline ended.
+        """
+        now = time.time()
+        state = self.get_state(runid, name)
+        state.status = FAILED if error else OK
+        state.ended_at = now
+        state.elapsed_secs = elapsed
+        self._set_state(runid, state)
+
+        needs = self._needs(runid)
+        dependents = [n for n, ns in needs.items() if name in ns]
+        ready = []
+        skipped = 0
+        if not error:
+            for n in dependents:
+                remaining = self.redis.hincrby(self.key(runid, "waiting"), n, -1)
+                if remaining == 0:
+                    data = self.redis.hget(self.key(runid, "ctx"), n)
+                    nstate = self.get_state(runid, n)
+                    nstate.status = QUEUED
+                    nstate.queued_at = now
+                    self._set_state(runid, nstate)
+                    ready.append(ExecutionNBTask(**json.loads(data)))
+        else:
+            pending = list(dependents)
+            while pending:
+                n = pending.pop()
+                if self.redis.sadd(self.key(runid, "skipped"), n):
+                    skipped += 1
+                    nstate = self.get_state(runid, n)
+                    nstate.status = SKIPPED
+                    self._set_state(runid, nstate)
+                    pending.extend(d for d, ns in needs.items() if n in ns)
+            self.redis.expire(self.key(runid, "skipped"), self._ttl)
+
+        ended = self.redis.hincrby(self.key(runid), "ended", 1 + skipped)
+        total = int(self.redis.hget(self.key(runid), "total"))
+        return ready, ended >= total
+
+    def summary(self, runid: str) -> Union[Tuple[Dict[str, Any], PipelineRun], None]:
+        """
+        :return: the metadata of the execution (projectid, wfid, created_at...)
+        and the state of each node with the critical path.
+        """
+        meta = self.redis.hgetall(self.key(runid))
+        if not meta:
+            return None
+        meta = {_decode(k): _decode(v) for k, v in meta.items()}
+        data = self.redis.hgetall(self.key(runid, "nodes"))
+        nodes = {
+            _decode(k): PipelineNodeState(**json.loads(v)) for k, v in data.items()
+        }
+        ends = [n.ended_at for n in nodes.values() if n.ended_at]
+        elapsed = max(ends) - float(meta["started_at"]) if ends else 0.0
+        run = PipelineRun(
+            nodes=list(nodes.values()),
+            critical_path=critical_path(nodes, self._needs(runid)),
+            elapsed_secs=round(elapsed, 2),
+        )
+        return meta, run
+
+
+def _decode(value: Union[bytes, str]) -> str:
+    if isinstance(value, bytes):
+        return value.decode("utf-8")
+    return value
@@ -0,0 +1,129 @@
+import hashlib
+import json
+from datetime import datetime
+from typing import Union
+
+import redis
+from rq.job import Job
+
+from labfunctions import defaults
+from labfunctions.types import ExecutionNBTask, ExecutionResult, ResultsCacheStats
+
+
+def cache_key(ctx: ExecutionNBTask, digest: str) -> str:
+    """
+    Content address of an execution. Notebooks are copied inside the runtime
+    image of the project when it is built, so the digest of the image
+    identifies the content of the notebook. The name of the image is not
+    enough: a version of a runtime could be built again, and the default
+    image doesn't include the notebooks of the project.
+
+    :param digest: the digest of `ctx.runtime`, see :meth:`ResultsCache.digest`.
+    """
+    params = {
+        k: v for k, v in ctx.params.items() if k not in defaults.RESULTS_CACHE_IGNORE
+    }
+    data = json.dumps(
+        dict(
+            projectid=ctx.projectid,
+            nb=ctx.pm_input,
+            runtime=ctx.runtime,
+            digest=digest,
+            params=params,
+        ),
+        sort_keys=True,
+        default=str,
+    )
+    return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+
+def cache_result(job: Job, connection: redis.Redis, result: ExecutionResult, *args):
+    """RQ success callback, only results ok are cached"""
+    ctx: ExecutionNBTask = job.args[0]
+    if result and not result.error and ctx.cache_key:
+        ResultsCache(connection).put(ctx.cache_key, result, ctx.cache_ttl)
+
+
+class ResultsCache:
+    """
+    Cache of :class:`labfunctions.types.core.ExecutionResult` by
+    :func:`cache_key`. The result points to the output notebook already
+    uploaded to the KV store, so a hit doesn't need to copy anything.
+
+    Hits and misses are counted by workflow.
+
+    The digests of the runtime images are stored by the builder, only
+    executions in images with a known digest can be cached.
+
+    :param redis_obj: the sync Redis instance used by RQ.
+    """
+
+    def __init__(self, redis_obj: redis.Redis, prefix=defaults.RESULTS_CACHE_PREFIX):
+        self.redis = redis_obj
+        self._prefix = prefix
+
+    def key(self, key: str) -> str:
+        return f"{self._prefix}.{key}"
+
+    def stats_key(self, projectid: str, wfid: str) -> str:
+        return f"{self._prefix}.stats.{projectid}.{wfid}"
+
+    def digest_key(self, image: str) -> str:
+        return f"{self._prefix}.digest.{image}"
+
+    def set_digest(self, image: str, digest: str):
+        self.redis.set(self.digest_key(image), digest)
+
+    def digest(self, image: str) -> Union[str, None]:
+        data = self.redis.get(self.digest_key(image))
+        if not data:
+            return None
+        return _decode(data)
+
+    def put(self, key: str, result: ExecutionResult, ttl_secs=None):
+        self.redis.set(
+            self.key(key), result.json(), ex=ttl_secs or defaults.RESULTS_CACHE_TTL
+        )
+
+    def get(self, key: str) -> Union[ExecutionResult, None]:
+        data = self.redis.get(self.key(key))
+        if not data:
+            return None
+        return ExecutionResult(**json.loads(data))
+
+    def lookup(self, ctx: ExecutionNBTask) -> Union[ExecutionResult, None]:
+        """
+        It looks for a previous result of `ctx`, counting the hit or the miss.
+        If found, it returns the result to register for this execution.
+        """
+        cached = self.get(ctx.cache_key)
+        self.redis.hincrby(
+            self.stats_key(ctx.projectid, ctx.wfid), "hits" if cached else "misses"
+        )
+        if not cached:
+            return None
+        return cached.copy(
+            update=dict(
+                projectid=ctx.projectid,
+                wfid=ctx.wfid,
+                name=ctx.nb_name,
+                execid=ctx.execid,
+                params=ctx.params,
+                elapsed_secs=0.0,
+                created_at=datetime.utcnow().isoformat(),
+                cached_from=cached.execid,
+            )
+        )
+
+    def invalidate(self, key: str):
+        self.redis.delete(self.key(key))
+
+    def stats(self, projectid: str, wfid: str) -> ResultsCacheStats:
+        data = self.redis.hgetall(self.stats_key(projectid, wfid))
+        return ResultsCacheStats(**{_decode(k): int(v) for k, v in data.items()})
+
+
+def _decode(value: Union[bytes, str]) -> str:
+    if isinstance(value, bytes):
+        return value.decode("utf-8")
+    return value
@@ -0,0 +1,66 @@
+import random
+import re
+from datetime import timedelta
+from typing import Callable, Union
+
+from rq import Queue
+from rq.job import Job
+
+from labfunctions.types import ExecutionNBTask, ExecutionResult, RetryData
+
+# as a string, because the executor imports this module
+_DOCKER_EXEC = "labfunctions.executors.docker_exec.docker_exec"
+
+
+def retry_delay(
+    conf: RetryData, attempt: int, rand: Callable[[], float] = random.random
+) -> float:
+    """Secs to wait before the attempt after `attempt`"""
+    delay = conf.backoff_secs * conf.backoff_factor ** (attempt - 1)
+    delay = min(delay, conf.max_backoff_secs)
+    return delay + delay * conf.jitter * rand()
+
+
+def should_retry(conf: RetryData, attempt: int, result: ExecutionResult) -> bool:
+    if not result.error or attempt >= conf.max_attempts:
+        return False
+    if not conf.on_exit_codes and not conf.on_errors:
+        return True
+    if conf.on_exit_codes and result.exit_code in conf.on_exit_codes:
+        return True
+    msg = result.error_msg or ""
+    return any(re.search(pattern, msg) for pattern in conf.on_errors or [])
+
+
+def enqueue_retry(
+    job: Job, ctx: ExecutionNBTask, result: ExecutionResult
+) -> Union[Job, None]:
+    """
+    If the execution should be retried, the next attempt is added to the
+    scheduled registry of the queue of `job`, instead of waiting in the
+    worker, so the workers should run with the RQ scheduler.
+
+    The new job keeps the callbacks and the meta of `job`, and the
+    `retry_in` of `result` is set; callbacks should ignore those results,
+    the last attempt will call them again.
+
+    :return: the job of the next attempt, if any.
+    """
+    if not ctx.retry or not should_retry(ctx.retry, ctx.attempt, result):
+        return None
+
+    delay = retry_delay(ctx.retry, ctx.attempt)
+    nxt = ctx.copy(update=dict(attempt=ctx.attempt + 1))
+    is_async = job.meta.get("is_async", True)
+    Q = Queue(job.origin, connection=job.connection, is_async=is_async)
+    kwargs = dict(
+        job_id=f"{ctx.execid}.{nxt.attempt}",
+        job_timeout=job.timeout,
+        meta=job.meta,
+        on_success=job.success_callback,
+        on_failure=job.failure_callback,
+    )
+    result.retry_in = round(delay, 2)
+    if not is_async:
+        return Q.enqueue(_DOCKER_EXEC, nxt, **kwargs)
+    return Q.enqueue_in(timedelta(seconds=delay), _DOCKER_EXEC, nxt, **kwargs)
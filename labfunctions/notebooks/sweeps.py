@@ -0,0 +1,181 @@
+import itertools
+import json
+from typing import Any, Dict, List, Optional, Union
+
+import redis
+from rq import Queue
+from rq.job import Job
+
+from labfunctions import defaults
+from labfunctions.executors import ExecID, docker_exec
+from labfunctions.types import ExecutionNBTask, ExecutionResult, SweepData, SweepStatus
+
+
+def expand_sweep(sweep: SweepData) -> List[Dict[str, Any]]:
+    """It returns the list of params of each execution of the sweep"""
+    params = []
+    if sweep.grid:
+        names = list(sweep.grid.keys())
+        for values in itertools.product(*[sweep.grid[n] for n in names]):
+            params.append(dict(zip(names, values)))
+    if sweep.items:
+        params.extend(sweep.items)
+    return params
+
+
+def child_ctx(
+    parent: ExecutionNBTask, params: Dict[str, Any], execid: Optional[str] = None
+) -> ExecutionNBTask:
+    """It creates the context of one execution of a sweep from the
+    context of the parent"""
+    execid = execid or ExecID().firm_with(ExecID.types.dispatcher)
+    _params = {**parent.params, **params}
+    _params["EXECID"] = execid
+    ext = defaults.NB_OUTPUT_EXTS[parent.mode]
+    output_name = f"{parent.wfid}.{parent.nb_name}.{execid}.{ext}"
+    return parent.copy(
+        update=dict(
+            execid=execid,
+            parentid=parent.execid,
+            params=_params,
+            output_name=output_name,
+            pm_output=f"{parent.output_dir}/{output_name}",
+        )
+    )
+
+
+def enqueue_child(
+    redis_obj: redis.Redis, ctx: ExecutionNBTask, qname=None, is_async=True
+) -> Job:
+    """
+    Like :meth:`labfunctions.scheduler.SchedulerExecutor.enqueue_notebook`
+    but the job reports back to the sweep when it ends, which enqueues the
+    next pending execution in the same queue.
+    """
+    qname = qname or f"{ctx.cluster}.{ctx.machine}"
+    Q = Queue(qname, connection=redis_obj, is_async=is_async)
+    return Q.enqueue(
+        docker_exec.docker_exec,
+        ctx,
+        job_id=ctx.execid,
+        job_timeout=ctx.timeout,
+        meta=dict(is_async=is_async),
+        on_success=child_ok,
+        on_failure=child_failed,
+    )
+
+
+def child_ok(job: Job, connection: redis.Redis, result: ExecutionResult, *args):
+    """RQ success callback of a sweep execution"""
+    if result and result.retry_in is not None:
+        # a new attempt was enqueued with the same callbacks
+        return
+    error = bool(result and result.error)
+    _next_child(job, connection, error)
+
+
+def child_failed(job: Job, connection: redis.Redis, *args):
+    """RQ failure callback of a sweep execution"""
+    _next_child(job, connection, True)
+
+
+def _next_child(job: Job, connection: redis.Redis, error: bool):
+    ctx: ExecutionNBTask = job.args[0]
+    sweeps = Sweeps(connection)
+    nxt = sweeps.finish(ctx.parentid, error=error)
+    if nxt:
+        enqueue_child(
+            connection, nxt, qname=job.origin, is_async=job.meta.get("is_async", True)
+        )
+
+
+class Sweeps:
+    """
+    State of the parameter sweeps in Redis.
+
+    The contexts of the executions not started yet are kept in a list and
+    the counters of each sweep in a hash. Only `max_concurrency` executions
+    are enqueued at the beginning, then, each execution which ends enqueues
+    the next one from the pending list, so the concurrency of the sweep is
+    kept without any coordination between agents.
+
+    If a worker dies without reporting, its slot is lost, the counters
+    will show it as running.
+
+    :param redis_obj: the sync Redis instance used by RQ.
+    :param ttl_secs: the state of a sweep expires after this time.
+    """
+
+    def __init__(
+        self,
+        redis_obj: redis.Redis,
+        prefix=defaults.SWEEP_PREFIX,
+        ttl_secs=defaults.SWEEP_TTL,
+    ):
+        self.redis = redis_obj
+        self._prefix = prefix
+        self._ttl = ttl_secs
+
+    def key(self, parentid: str) -> str:
+        return f"{self._prefix}.{parentid}"
+
+    def pending_key(self, parentid: str) -> str:
+        return f"{self._prefix}.{parentid}.pending"
+
+    def create(
+        self, parent: ExecutionNBTask, children: List[ExecutionNBTask], concurrency
+    ) -> List[ExecutionNBTask]:
+        """
+        It registers a new sweep and returns the executions to start now,
+        the rest are kept as pending.
+        """
+        start = children[:concurrency]
+        pending = children[concurrency:]
+        key = self.key(parent.execid)
+        pkey = self.pending_key(parent.execid)
+        with self.redis.pipeline() as pipe:
+            pipe.hset(
+                key,
+                mapping=dict(
+                    projectid=parent.projectid,
+                    wfid=parent.wfid,
+                    total=len(children),
+                    running=len(start),
+                    done=0,
+                    failed=0,
+                ),
+            )
+            if pending:
+                pipe.rpush(pkey, *[c.json() for c in pending])
+            pipe.expire(key, self._ttl)
+            pipe.expire(pkey, self._ttl)
+            pipe.execute()
+        return start
+
+    def finish(self, parentid: str, error=False) -> Union[ExecutionNBTask, None]:
+        """It registers the end of an execution and returns the next one"""
+        key = self.key(parentid)
+        with self.redis.pipeline() as pipe:
+            pipe.hincrby(key, "failed" if error else "done", 1)
+            pipe.lpop(self.pending_key(parentid))
+            _, data = pipe.execute()
+        if not data:
+            self.redis.hincrby(key, "running", -1)
+            return None
+        return ExecutionNBTask(**json.loads(data))
+
+    def status(self, parentid: str) -> Union[SweepStatus, None]:
+        with self.redis.pipeline() as pipe:
+            pipe.hgetall(self.key(parentid))
+            pipe.llen(self.pending_key(parentid))
+            data, pending = pipe.execute()
+        if not data:
+            return None
+        data = {_decode(k): _decode(v) for k, v in data.items()}
+        return SweepStatus(parentid=parentid, pending=pending, **data)
+
+
+def _decode(value: Union[bytes, str]) -> str:
+    if isinstance(value, bytes):
+        return value.decode("utf-8")
+    return value
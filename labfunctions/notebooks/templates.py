@@ -0,0 +1,166 @@
+import json
+from datetime import datetime
+from typing import Any, Dict, Optional, Union
+
+import redis
+
+from labfunctions import defaults
+from labfunctions.types import ExecutionNBTask, ExecutionTemplate, NBTask, PipelineData
+from labfunctions.types.runtimes import RuntimeData
+
+from .context import create_notebook_ctx, prepare_runtime
+
+# it writes the template read from the database by the dispatcher, only if
+# it's missing and the workflow wasn't changed since the dispatcher
+# took the version, otherwise a deleted or disabled workflow could be
+# written again.
+_REFILL = """
+local version = redis.call('GET', KEYS[2]) or '0'
+if version ~= ARGV[1] or redis.call('EXISTS', KEYS[1]) == 1 then
+    return 0
+end
+redis.call('SET', KEYS[1], ARGV[2], 'EX', ARGV[3])
+redis.call('SADD', KEYS[3], ARGV[4])
+return 1
+"""
+
+
+def create_template(
+    projectid: str,
+    wfid: str,
+    task: NBTask,
+    runtime: Optional[RuntimeData] = None,
+    pipeline: Optional[PipelineData] = None,
+) -> ExecutionTemplate:
+    """It resolves everything that doesn't change between executions of a workflow"""
+    return ExecutionTemplate(
+        projectid=projectid,
+        wfid=wfid,
+        nbtask=task,
+        runtime=prepare_runtime(runtime, task.gpu_support),
+        created_at=datetime.utcnow().isoformat(),
+        pipeline=pipeline,
+    )
+
+
+def ctx_from_template(
+    tpl: ExecutionTemplate, execid: str, params: Optional[Dict[str, Any]] = None
+) -> ExecutionNBTask:
+    """It creates a new execution context from a template
+
+    :param params: if provided, it overrides the params of the task.
+    """
+    task = tpl.nbtask
+    if params:
+        task = task.copy(update={"params": {**task.params, **params}})
+    return create_notebook_ctx(
+        tpl.projectid, task, execid, wfid=tpl.wfid, runtime_image=tpl.runtime
+    )
+
+
+class ExecutionTemplates:
+    """
+    Store of :class:`labfunctions.types.core.ExecutionTemplate` in Redis.
+
+    Each template is stored as a json string in its own key, and the wfids
+    of each project are tracked in a set to invalidate all the templates
+    of a project at once, for instance, when a new runtime is created.
+
+    The server writes templates when workflows are registered and
+    the dispatcher only reads them, if a template is missing, the dispatcher
+    falls back to the database and refills it with :meth:`refill`.
+
+    Each write or invalidation from the server increments the version of
+    the workflow, the dispatcher takes the version before querying the
+    database and the refill is discarded if the version changed meanwhile.
+    The server should write or invalidate a template after the
+    transaction of the workflow is committed.
+
+    :param redis_obj: a sync Redis instance, usually the one used by RQ.
+    :param ttl_secs: templates expires after this time as a safety net.
+    """
+
+    def __init__(
+        self,
+        redis_obj: redis.Redis,
+        prefix=defaults.EXECUTION_TEMPLATE_PREFIX,
+        ttl_secs=defaults.EXECUTION_TEMPLATE_TTL,
+    ):
+        self.redis = redis_obj
+        self._prefix = prefix
+        self._ttl = ttl_secs
+        self._refill = redis_obj.register_script(_REFILL)
+
+    def key(self, projectid: str, wfid: str) -> str:
+        return f"{self._prefix}.{projectid}.{wfid}"
+
+    def project_key(self, projectid: str) -> str:
+        return f"{self._prefix}.{projectid}"
+
+    def version_key(self, projectid: str, wfid: str) -> str:
+        return f"{self._prefix}.version.{projectid}.{wfid}"
+
+    def _incr_version(self, pipe, projectid: str, wfid: str):
+        vkey = self.version_key(projectid, wfid)
+        pipe.incr(vkey)
+        pipe.expire(vkey, self._ttl)
+
+    def version(self, projectid: str, wfid: str) -> int:
+        return int(self.redis.get(self.version_key(projectid, wfid)) or 0)
+
+    def put(self, tpl: ExecutionTemplate):
+        """It writes the template, used by the server"""
+        with self.redis.pipeline() as pipe:
+            self._incr_version(pipe, tpl.projectid, tpl.wfid)
+            pipe.set(self.key(tpl.projectid, tpl.wfid), tpl.json(), ex=self._ttl)
+            pipe.sadd(self.project_key(tpl.projectid), tpl.wfid)
+            pipe.execute()
+
+    def refill(self, tpl: ExecutionTemplate, version: int) -> bool:
+        """
+        It writes the template only if not exists and the workflow
+        is still in `version`. Used by the dispatcher.
+
+        :param version: taken with :meth:`version` before querying the database.
+        :return: True if the template was written.
+        """
+        written = self._refill(
+            keys=[
+                self.key(tpl.projectid, tpl.wfid),
+                self.version_key(tpl.projectid, tpl.wfid),
+                self.project_key(tpl.projectid),
+            ],
+            args=[version, tpl.json(), self._ttl, tpl.wfid],
+        )
+        return bool(written)
+
+    def get(self, projectid: str, wfid: str) -> Union[ExecutionTemplate, None]:
+        data = self.redis.get(self.key(projectid, wfid))
+        if not data:
+            return None
+        tpl = ExecutionTemplate(**json.loads(data))
+        if tpl.version != defaults.EXECUTION_TEMPLATE_VERSION:
+            return None
+        return tpl
+
+    def invalidate(self, projectid: str, wfid: str):
+        with self.redis.pipeline() as pipe:
+            self._incr_version(pipe, projectid, wfid)
+            pipe.delete(self.key(projectid, wfid))
+            pipe.srem(self.project_key(projectid), wfid)
+            pipe.execute()
+
+    def invalidate_project(self, projectid: str):
+        pkey = self.project_key(projectid)
+        wfids = [_decode(wfid) for wfid in self.redis.smembers(pkey)]
+        with self.redis.pipeline() as pipe:
+            for wfid in wfids:
+                self._incr_version(pipe, projectid, wfid)
+            pipe.delete(pkey, *[self.key(projectid, wfid) for wfid in wfids])
+            pipe.execute()
+
+
+def _decode(value: Union[bytes, str]) -> str:
+    if isinstance(value, bytes):
+        return value.decode("utf-8")
+    return value
@@ -8,12 +8,14 @@ from typing import Optional
 from zipfile import ZipFile
 
 import httpx
+from rq import get_current_job
 
 import docker
 from labfunctions import client, defaults
 from labfunctions.commands import DockerCommand
 from labfunctions.conf import load_client, load_server
 from labfunctions.io.kvspec import GenericKVSpec
+from labfunctions.notebooks.results_cache import ResultsCache
 
 # from labfunctions.types.docker import DockerBuildLog, DockerBuildLowLog, DockerPushLog
 from labfunctions.types.docker import DockerBuildLog
@@ -41,7 +43,7 @@ class BuildTask:
 
     def get_runtime_file(self, full_zip_file_path, download_key_zip):
         with open(full_zip_file_path, "wb") as f:
-            for chunk in self.kv.get_stream(download_key_zip):
+            for chunk in self.kv.get_parallel(download_key_zip):
                 f.write(chunk)
 
     def run(self, ctx: BuildCtx) -> DockerBuildLog:
@@ -92,6 +94,9 @@ def builder_exec(ctx: BuildCtx):
         kvstore=kv,
     )
     rsp = task.run(ctx)
+    job = get_current_job()
+    if job and rsp.digest:
+        ResultsCache(job.connection).set_digest(rsp.image, rsp.digest)
     if not os.getenv("LF_RUN_LOCAL"):
         task.register(ctx)
     return rsp
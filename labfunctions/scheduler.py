@@ -1,6 +1,8 @@
 import asyncio
 import logging
+import time
 from collections import namedtuple
+from dataclasses import asdict, dataclass
 from datetime import datetime, timedelta
 from typing import Any, Dict, List, Optional, Union
 
@@ -22,36 +24,160 @@ from labfunctions.conf.server_settings import settings
 from labfunctions.db.sync import SQL
 from labfunctions.errors.runtimes import RuntimeNotFound
 from labfunctions.executors import ExecID, docker_exec
-from labfunctions.managers import projects_mg, runtimes_mg, workflows_mg
+from labfunctions.managers import history_mg, projects_mg, runtimes_mg, workflows_mg
 from labfunctions.models import WorkflowModel
-from labfunctions.notebooks import create_notebook_ctx
+from labfunctions.notebooks import batches, pipelines, results_cache, sweeps
+from labfunctions.notebooks.templates import (
+    ExecutionTemplates,
+    create_template,
+    ctx_from_template,
+)
 from labfunctions.runtimes.builder import builder_exec
 
 # from labfunctions.notebooks import nb_job_executor
-from labfunctions.types import ExecutionNBTask, NBTask, ScheduleData, WorkflowDataWeb
+from labfunctions.types import (
+    ExecutionNBTask,
+    ExecutionResult,
+    ExecutionTemplate,
+    NBTask,
+    PipelineData,
+    ScheduleData,
+    SweepData,
+    WorkflowDataWeb,
+)
 from labfunctions.types.runtimes import BuildCtx
+from labfunctions.types.workflows import WFQueueReq
 from labfunctions.utils import get_version, run_async
 
 _DEFAULT_SCH_TASK_TO = 60 * 5  # 5 minutes
 
 
+def prepare_template_sync(session, projectid: str, wfid: str) -> ExecutionTemplate:
+    """It builds the execution template of a workflow from the database"""
+
+    wm = workflows_mg.get_by_prj_and_wfid_sync(session, projectid, wfid)
+    if not wm:
+        raise errors.WorkflowNotFound(projectid, wfid)
+    if not wm.enabled:
+        raise errors.WorkflowDisabled(projectid, wfid)
+
+    task = NBTask(**wm.nbtask)
+    runtime = None
+    if task.runtime:
+        runtime = runtimes_mg.get_runtime_sync(
+            session, projectid, task.runtime, task.version
+        )
+        if not runtime:
+            raise RuntimeNotFound(f"{projectid}/{task.runtime}/{task.version}")
+    pipeline = None
+    if wm.pipeline:
+        pipeline = PipelineData(**wm.pipeline)
+    return create_template(projectid, wfid, task, runtime, pipeline)
+
+
 def prepare_notebook_job(
     session, projectid: str, wfid: str, execid: str
 ) -> ExecutionNBTask:
     """It prepares the task execution of the notebook"""
+    tpl = prepare_template_sync(session, projectid, wfid)
+    return ctx_from_template(tpl, execid)
 
-    wm = workflows_mg.get_by_prj_and_wfid_sync(session, projectid, wfid)
-    if wm and wm.enabled:
-        task = NBTask(**wm.nbtask)
-        runtime = None
-        if task.runtime:
-            runtime = runtimes_mg.get_by_rid_sync(session, runtime)
-        exec_nb_ctx = create_notebook_ctx(projectid, task, execid, runtime, wfid=wfid)
-    return exec_nb_ctx
+
+@dataclass
+class ResourcesStats:
+    """Setup cost of :class:`DispatcherResources` inside a process
+
+    :param setups: how many times the resources were created
+    :param setup_secs: total time in seconds spent creating them
+    :param dispatches: how many dispatches reused them
+    """
+
+    setups: int = 0
+    setup_secs: float = 0.0
+    dispatches: int = 0
+
+
+class DispatcherResources:
+    """
+    It holds the resources used by :func:`scheduler_dispatcher`: a SQL engine
+    with its connection pool, a Redis client and a :class:`SchedulerExecutor`.
+
+    Creating them is expensive compared with the dispatch itself, so they
+    are created once per worker process (see :func:`init_dispatcher_resources`)
+    and reused by every dispatch executed in that process.
+
+    :param sql_dsn: sync sql dsn, usually `settings.SQL`
+    :param redis_dsn: redis dsn of RQ, usually `settings.RQ_REDIS`
+    :param qname: control queue name
+    :param is_async: passed to :class:`SchedulerExecutor`
+    """
+
+    stats = ResourcesStats()
+
+    def __init__(self, sql_dsn: str, redis_dsn: str, qname: str, is_async=True):
+        _started = time.time()
+        self.db = SQL(sql_dsn)
+        self.redis = redis.from_url(redis_dsn)
+        self.scheduler = SchedulerExecutor(
+            redis_obj=self.redis, qname=qname, is_async=is_async
+        )
+        self.Session = self.db.sessionmaker()
+
+        self.stats.setups += 1
+        self.stats.setup_secs += time.time() - _started
+
+    def close(self):
+        self.db.engine.dispose()
+        self.redis.close()
+
+    @classmethod
+    def get_stats(cls) -> Dict[str, Any]:
+        return asdict(cls.stats)
+
+
+_resources: Optional[DispatcherResources] = None
+
+
+def init_dispatcher_resources(
+    sql_dsn: Optional[str] = None,
+    redis_dsn: Optional[str] = None,
+    qname: Optional[str] = None,
+    is_async=True,
+) -> DispatcherResources:
+    """
+    Creates the resources shared by the dispatchers of this process.
+    It should be called once by the worker of the control queue before
+    start working. If resources were already created, they are closed and
+    replaced.
+    """
+    global _resources  # pylint: disable=global-statement
+
+    if _resources:
+        _resources.close()
+    _resources = DispatcherResources(
+        sql_dsn or settings.SQL,
+        redis_dsn or settings.RQ_REDIS,
+        qname or settings.CONTROL_QUEUE,
+        is_async=is_async,
+    )
+    return _resources
+
+
+def get_dispatcher_resources() -> DispatcherResources:
+    """It returns the resources of this process, creating them if needed"""
+    if not _resources:
+        return init_dispatcher_resources()
+    return _resources
 
 
 def scheduler_dispatcher(
-    projectid: str, wfid: str, execid=None, redis_obj=None, db=None, is_async=True
+    projectid: str,
+    wfid: str,
+    execid=None,
+    redis_obj=None,
+    db=None,
+    is_async=True,
+    params: Optional[Dict[str, Any]] = None,
 ) -> Union[Job, None]:
     """
     This is the entrypoint of any workflow or job to be executed by RQ and it
@@ -76,44 +202,131 @@ def scheduler_dispatcher(
     Also, adopting this strategy, allows to react dinamically to changes
     in the workflow
 
+    The execution context is built from the template of the workflow stored
+    in Redis (see :class:`labfunctions.notebooks.templates.ExecutionTemplates`),
+    only if it is missing the database is queried and the template is
+    written again.
+
+    If `redis_obj` or `db` are not provided, the engine, redis client and
+    scheduler are taken from :func:`get_dispatcher_resources`, so they are
+    shared between calls in the same worker process. The shared scheduler is
+    only used when it was created with the same `is_async` of the call.
+
     Parameters
     ----------
     :param projectid: is the id of project, from ProjectModel
     :type str:
     :param wfid: wfid from WorkflowModel
     :type str:
+    :param params: optional overrides of the workflow params for this execution.
+    :type Dict[str, Any]:
 
     :return: a Job instance from RQ a or None if the Job or the project is not found
     :rtype: an Union between Job or None.
     """
-    _db = db or SQL(settings.SQL)
-    _redis = redis_obj or redis.from_url(settings.RQ_REDIS)
-    _q = settings.CONTROL_QUEUE  # control_q
-    scheduler = SchedulerExecutor(redis_obj=_redis, qname=_q, is_async=is_async)
+    if redis_obj or db:
+        _db = db or SQL(settings.SQL)
+        _redis = redis_obj or redis.from_url(settings.RQ_REDIS)
+        _q = settings.CONTROL_QUEUE  # control_q
+        scheduler = SchedulerExecutor(redis_obj=_redis, qname=_q, is_async=is_async)
+        Session = _db.sessionmaker()
+    else:
+        resources = get_dispatcher_resources()
+        resources.stats.dispatches += 1
+        scheduler = resources.scheduler
+        if scheduler.is_async != is_async:
+            scheduler = SchedulerExecutor(
+                redis_obj=resources.redis, qname=scheduler.qname, is_async=is_async
+            )
+        Session = resources.Session
 
     logger = logging.getLogger(__name__)
 
-    Session = _db.sessionmaker()
-
+    try:
+        # signed = firm_or_new(execid, "dispatcher")
+        if not execid:
+            execid = str(ExecID())
+        execid = ExecID(execid=execid).firm_with(ExecID.types.dispatcher)
+        tpl = scheduler.templates.get(projectid, wfid)
+        if not tpl:
+            version = scheduler.templates.version(projectid, wfid)
+            with Session() as session:
+                tpl = prepare_template_sync(session, projectid, wfid)
+            scheduler.templates.refill(tpl, version)
+        exec_nb_ctx = ctx_from_template(tpl, execid, params=params)
+
+        if tpl.pipeline:
+            scheduler.enqueue_pipeline(exec_nb_ctx, tpl.pipeline)
+        elif tpl.nbtask.sweep:
+            scheduler.enqueue_sweep(
+                exec_nb_ctx, tpl.nbtask.sweep, qname=exec_nb_ctx.machine
+            )
+        else:
+            cached = None
+            digest = None
+            if tpl.nbtask.cache:
+                digest = scheduler.results.digest(exec_nb_ctx.runtime)
+            if digest:
+                exec_nb_ctx.cache_key = results_cache.cache_key(exec_nb_ctx, digest)
+                exec_nb_ctx.cache_ttl = tpl.nbtask.cache.ttl_secs
+                cached = scheduler.results.lookup(exec_nb_ctx)
+            if cached:
+                with Session() as session:
+                    with session.begin():
+                        history_mg.create_sync(session, cached)
+                logger.info(f"CACHED {wfid} with {execid} from {cached.cached_from}")
+                return
+            if tpl.nbtask.batch:
+                scheduler.enqueue_batched(exec_nb_ctx, qname=exec_nb_ctx.machine)
+            else:
+                scheduler.enqueue_notebook(exec_nb_ctx, qname=exec_nb_ctx.machine)
+        logger.info(f"SCHEDULING {wfid} with {execid}")
+
+    except errors.WorkflowNotFound as e:
+        logger.error(e)
+    except errors.WorkflowDisabled as e:
+        logger.warning(e)
+        scheduler.cancel_job(wfid)
+    except RuntimeNotFound as e:
+        logger.error(e)
+        scheduler.cancel_job(wfid)
+
+
+def pipeline_finished(runid: str, redis_obj=None, db=None):
+    """
+    It registers in the history the summary of a pipeline execution:
+    the state and timing of each node and its critical path. It is enqueued
+    in the control queue by the last node to end,
+    see :class:`labfunctions.notebooks.pipelines.Pipelines`.
+    """
+    if redis_obj or db:
+        _redis = redis_obj or redis.from_url(settings.RQ_REDIS)
+        Session = (db or SQL(settings.SQL)).sessionmaker()
+    else:
+        resources = get_dispatcher_resources()
+        _redis = resources.redis
+        Session = resources.Session
+
+    data = pipelines.Pipelines(_redis).summary(runid)
+    if not data:
+        logging.getLogger(__name__).warning(f"Pipeline {runid} not found")
+        return
+    meta, run = data
+    result = ExecutionResult(
+        projectid=meta["projectid"],
+        execid=runid,
+        wfid=meta["wfid"],
+        name=df.PIPELINE_NAME,
+        params={},
+        input_=",".join(run.critical_path),
+        error=any(n.status != pipelines.OK for n in run.nodes),
+        elapsed_secs=run.elapsed_secs,
+        created_at=meta["created_at"],
+        pipeline=run,
+    )
     with Session() as session:
-        try:
-            # signed = firm_or_new(execid, "dispatcher")
-            if not execid:
-                execid = str(ExecID())
-            execid = ExecID(execid=execid).firm_with(ExecID.types.dispatcher)
-            exec_nb_ctx = prepare_notebook_job(session, projectid, wfid, execid)
-
-            scheduler.enqueue_notebook(exec_nb_ctx, qname=exec_nb_ctx.machine)
-            logger.info(f"SCHEDULING {wfid} with {execid}")
-
-        except errors.WorkflowNotFound as e:
-            logger.error(e)
-        except errors.WorkflowDisabled as e:
-            logger.warning(e)
-            scheduler.cancel_job(wfid)
-        except RuntimeNotFound as e:
-            logger.error(e)
-            scheduler.cancel_job(wfid)
+        with session.begin():
+            history_mg.create_sync(session, result)
 
 
 class SchedulerExecutor:
@@ -135,9 +348,14 @@ class SchedulerExecutor:
         self.qname = qname
         # on_success=rq_job_ok, on_failure=rq_job_error)
         self.scheduler = Scheduler(queue=self.Q, connection=self.redis)
+        self.templates = ExecutionTemplates(self.redis)
+        self.sweeps = sweeps.Sweeps(self.redis)
+        self.pipelines = pipelines.Pipelines(self.redis)
+        self.results = results_cache.ResultsCache(self.redis)
+        self.batches = batches.Batches(self.redis)
         self.is_async = is_async
 
-    def dispatcher(self, projectid, wfid, execid=None) -> Job:
+    def dispatcher(self, projectid, wfid, execid=None, params=None) -> Job:
         """
         Entrypoint of a task execution. Beacause it is a dispatcher it only needs
         the references of job to execute. It will dispatch a job to
@@ -163,16 +381,41 @@ class SchedulerExecutor:
             wfid,
             str(final_id),
             is_async=self.is_async,
+            params=params,
             job_id=final_id,
         )
         return j
 
+    def dispatcher_many(self, projectid, workflows: List[WFQueueReq]) -> List[Job]:
+        """
+        Like :meth:`dispatcher` but for many workflows of the same project,
+        all the jobs are enqueued in a single redis transaction.
+        """
+        datas = []
+        for wf in workflows:
+            _id = ExecID().firm_with(ExecID.types.web)
+            final_id = ExecID(_id).firm_with(ExecID.types.dispatcher)
+            datas.append(
+                Queue.prepare_data(
+                    scheduler_dispatcher,
+                    args=(projectid, wf.wfid, final_id),
+                    kwargs=dict(is_async=self.is_async, params=wf.params),
+                    job_id=final_id,
+                )
+            )
+        with self.redis.pipeline() as pipe:
+            jobs = self.Q.enqueue_many(datas, pipeline=pipe)
+            pipe.execute()
+        return jobs
+
     def enqueue_notebook(self, nb_job_ctx: ExecutionNBTask, qname=None) -> Job:
         """
         It executes a :class:`labfunctions.types.core.NBTask`
         in the remote machine with runtime configuration of
         the project for this task
 
+        If the context has a `cache_key`, the result is stored in the
+        results cache when the execution ends ok.
 
         :param nb_job_ctx: a prepared notebook execution task
         :type nb_job_ctx: labfunctions.types.core.ExecutionNBTask
@@ -183,15 +426,82 @@ class SchedulerExecutor:
         """
         qname = qname or f"{nb_job_ctx.cluster}.{nb_job_ctx.machine}"
 
+        on_success = None
+        if nb_job_ctx.cache_key:
+            on_success = results_cache.cache_result
+
         Q = Queue(qname, connection=self.redis, is_async=self.is_async)
         job = Q.enqueue(
             docker_exec.docker_exec,
             nb_job_ctx,
             job_id=nb_job_ctx.execid,
             job_timeout=nb_job_ctx.timeout,
+            on_success=on_success,
         )
         return job
 
+    def enqueue_batched(
+        self, nb_job_ctx: ExecutionNBTask, qname=None
+    ) -> Union[Job, None]:
+        """
+        Like :meth:`enqueue_notebook`, but the execution is added to a batch
+        of executions of the same project and runtime, which run in the same
+        container, see :class:`labfunctions.notebooks.batches.Batches`.
+
+        :return: the job of the batch, only if this execution opened it.
+        """
+        qname = qname or f"{nb_job_ctx.cluster}.{nb_job_ctx.machine}"
+        batchid = self.batches.add(nb_job_ctx, qname)
+        if not batchid:
+            return None
+
+        Q = Queue(qname, connection=self.redis, is_async=self.is_async)
+        job = Q.enqueue(
+            docker_exec.docker_exec_batch,
+            self.batches.open_key(qname, nb_job_ctx),
+            batchid,
+            job_timeout=nb_job_ctx.timeout * self.batches.max_size,
+        )
+        return job
+
+    def enqueue_sweep(
+        self, nb_job_ctx: ExecutionNBTask, sweep: SweepData, qname=None
+    ) -> List[Job]:
+        """
+        It expands a parameter sweep into one execution for each set of
+        params, all of them share the execid of `nb_job_ctx` as `parentid`.
+        Only `sweep.max_concurrency` executions are enqueued now, the rest
+        are enqueued as the previous ones end,
+        see :class:`labfunctions.notebooks.sweeps.Sweeps`.
+
+        :return: the jobs enqueued now.
+        """
+        children = [sweeps.child_ctx(nb_job_ctx, p) for p in sweeps.expand_sweep(sweep)]
+        if not children:
+            return [self.enqueue_notebook(nb_job_ctx, qname=qname)]
+        start = self.sweeps.create(nb_job_ctx, children, sweep.max_concurrency)
+        return [
+            sweeps.enqueue_child(self.redis, c, qname=qname, is_async=self.is_async)
+            for c in start
+        ]
+
+    def enqueue_pipeline(
+        self, nb_job_ctx: ExecutionNBTask, pipeline: PipelineData
+    ) -> List[Job]:
+        """
+        It starts a pipeline of notebooks, using the execid of `nb_job_ctx`
+        as id of the execution. Nodes without needs are enqueued now and the
+        rest as soon as their needs end,
+        see :class:`labfunctions.notebooks.pipelines.Pipelines`.
+
+        :return: the jobs enqueued now.
+        """
+        ctxs = {n.name: pipelines.node_ctx(nb_job_ctx, n) for n in pipeline.nodes}
+        ready = self.pipelines.start(nb_job_ctx, pipeline, ctxs, self.qname)
+        return [
+            pipelines.enqueue_node(self.redis, c, is_async=self.is_async) for c in ready
+        ]
+
     def enqueue_build(self, build_ctx: BuildCtx) -> Job:
         """
         TODO: in the future a special queue should exists.
@@ -276,8 +586,31 @@ class SchedulerExecutor:
     async def cancle_job_async(self, wfid):
         await run_async(self.scheduler.cancel, wfid)
 
+    async def register_template(self, session, projectid, wfid, wd: WorkflowDataWeb):
+        """
+        It writes the execution template of a workflow, used by
+        :func:`scheduler_dispatcher`. It should be called every time that a
+        workflow is registered or updated, after the transaction is committed.
+        If the workflow is disabled or its runtime doesn't exist,
+        the template is invalidated instead.
+        """
+        task = wd.nbtask
+        runtime = None
+        if task.runtime and wd.enabled:
+            runtime = await runtimes_mg.get_runtime(
+                session, projectid, task.runtime, task.version
+            )
+        if not wd.enabled or (task.runtime and not runtime):
+            await run_async(self.templates.invalidate, projectid, wfid)
+            return
+        tpl = create_template(projectid, wfid, task, runtime, wd.pipeline)
+        await run_async(self.templates.put, tpl)
+
     async def delete_workflow(self, session, projectid, wfid: str):
-        """Delete job from redis and db"""
+        """
+        Delete job from redis and db. The template of the workflow
+        should be invalidated after the transaction is committed.
+        """
 
         await run_async(self.cancel_job, wfid)
         await workflows_mg.delete_wf(session, projectid, wfid)
@@ -2,18 +2,29 @@ from . import user
 from .client import WorkflowsFile
 from .config import ClientSettings, ServerSettings
 from .core import (
+    CellStats,
+    CheckpointData,
     ExecutionNBTask,
     ExecutionResult,
+    ExecutionTemplate,
     HistoryLastResponse,
     HistoryRequest,
     HistoryResult,
     NBTask,
+    OutputPolicyData,
+    ResultsCacheData,
+    ResultsCacheStats,
+    RetryData,
     ScheduleData,
     SimpleExecCtx,
+    SweepData,
+    SweepHistory,
+    SweepStatus,
     WorkflowData,
     WorkflowDataWeb,
     WorkflowsList,
 )
+from .pipelines import PipelineData, PipelineNode, PipelineNodeState, PipelineRun
 from .projects import ProjectData, ProjectReq
 from .runtimes import ProjectBundleFile, RuntimeData, RuntimeReq, RuntimeSpec
 from .security import TokenCreds
@@ -30,6 +30,8 @@ class AgentConfig(BaseModel):
     heartbeat_check_every: int
     agent_name: Optional[str] = None
     workers_n = 1
+    in_process: bool = False
+    warm_pool: bool = False
 
 
 class AgentRequest(BaseModel):
@@ -90,6 +90,10 @@ class ServerSettings(BaseSettings):
     PROJECTS_STORE_BUCKET = "labfunctions"
     EXT_KV_LOCAL_ROOT: Optional[str] = None
     EXT_KV_FILE_URL: Optional[str] = None
+    # used when the store class is labfunctions.io.kv_cached.CachedKV
+    EXT_KV_CACHE_BACKEND: Optional[str] = None
+    EXT_KV_CACHE_DIR: Optional[str] = None
+    EXT_KV_CACHE_MAX_BYTES: Optional[int] = None
 
     SETTINGS_MODULE: Optional[str] = None
     DNS_IP_ADDRESS: str = "8.8.8.8"
@@ -123,6 +127,10 @@ class ClientSettings(BaseSettings):
     PROJECTS_STORE_BUCKET = "labfunctions"
     EXT_KV_LOCAL_ROOT: Optional[str] = None
     EXT_KV_FILE_URL: Optional[str] = None
+    # used when the store class is labfunctions.io.kv_cached.CachedKV
+    EXT_KV_CACHE_BACKEND: Optional[str] = None
+    EXT_KV_CACHE_DIR: Optional[str] = None
+    EXT_KV_CACHE_MAX_BYTES: Optional[int] = None
 
     SETTINGS_MODULE: Optional[str] = None
     # DOCKER_COMPOSE: Dict[str, Any] = None
@@ -1,11 +1,13 @@
 from dataclasses import dataclass
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Tuple
 
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, conint, validator
+from typing_extensions import Literal
 
 from labfunctions import defaults
 
-from .docker import DockerfileImage
+from .docker import DockerfileImage, DockerStatsSummary
+from .pipelines import PipelineData, PipelineRun
 
 
 class ScheduleData(BaseModel):
@@ -17,6 +19,101 @@ class ScheduleData(BaseModel):
     interval: Optional[str] = None
 
 
+class SweepData(BaseModel):
+    """
+    A parameter sweep: the notebook is executed once for each combination
+    of params, each combination is merged over the params of the task.
+
+    :param grid: every combination of the values of each param is executed.
+    :param items: an explicit list of params, executed after the grid.
+    :param max_concurrency: max executions running at the same time.
+    """
+
+    grid: Optional[Dict[str, List[Any]]] = None
+    items: Optional[List[Dict[str, Any]]] = None
+    max_concurrency: conint(gt=0) = defaults.SWEEP_MAX_CONCURRENCY
+
+
+class ResultsCacheData(BaseModel):
+    """
+    Opt-in cache of results: if the notebook, the runtime and the params
+    are the same than a previous execution which ended ok, the execution is
+    skipped and the output of the previous one is used. Only workflows
+    with a runtime built by the project are cached, see
+    :func:`labfunctions.notebooks.results_cache.cache_key`.
+
+    :param ttl_secs: how long a result is reused.
+    """
+
+    ttl_secs: int = defaults.RESULTS_CACHE_TTL
+
+
+class CheckpointData(BaseModel):
+    """
+    Opt-in checkpoints of the namespace of the kernel, stored in the kv store
+    of the project. If the execution is retried, the last checkpoint is
+    restored and it continues from the cell after it.
+    See :mod:`labfunctions.executors.checkpoints`.
+
+    :param tag: a checkpoint is stored after each cell with this tag.
+    :param every_secs: if provided, a checkpoint is also stored after any cell
+    when this time passed since the last one.
+    """
+
+    tag: str = defaults.CHECKPOINT_TAG
+    every_secs: Optional[int] = None
+
+
+class RetryData(BaseModel):
+    """
+    Retries of failed executions. The attempt n + 1 is enqueued after
+    `backoff_secs * backoff_factor ** (n - 1)` secs, up to `max_backoff_secs`,
+    plus a random jitter of up to `jitter` times that delay.
+
+    If `on_exit_codes` and `on_errors` are empty, any error is retried,
+    if not, the error should match one of them.
+
+    :param max_attempts: max number of executions, including the first one.
+    :param on_exit_codes: exit codes of the container, besides them, -1 is
+    a timeout and -3 an error of docker, like a failed pull of the image.
+    :param on_errors: regular expressions searched in the error message.
+    """
+
+    max_attempts: int = defaults.RETRY_MAX_ATTEMPTS
+    backoff_secs: float = defaults.RETRY_BACKOFF_SECS
+    backoff_factor: float = 2.0
+    max_backoff_secs: float = defaults.RETRY_MAX_BACKOFF_SECS
+    jitter: float = 0.1
+    on_exit_codes: Optional[List[int]] = None
+    on_errors: Optional[List[str]] = None
+
+
+class OutputPolicyData(BaseModel):
+    """
+    Limits of the outputs stored with the notebook of an execution,
+    applied by the executor before the notebook is uploaded,
+    see :mod:`labfunctions.executors.outputs`.
+
+    :param max_cell_bytes: outputs of a cell beyond this size are truncated,
+    dropped or externalized.
+    :param action: "truncate" keeps the first `max_cell_bytes` of text outputs
+    and drops rich outputs, "drop" removes all the outputs of the cell,
+    "externalize" stores them as objects of the kv store of the project,
+    which are referenced from the notebook.
+    :param externalize_images: if true, images are externalized whatever
+    their size.
+    """
+
+    max_cell_bytes: int = defaults.OUTPUT_MAX_CELL_BYTES
+    action: Literal["truncate", "drop", "externalize"] = "truncate"
+    externalize_images: bool = False
+
+
+class ResultsCacheStats(BaseModel):
+    hits: int = 0
+    misses: int = 0
+
+
 class NBTask(BaseModel):
     """
     NBTask is the task definition. It will be executed by papermill.
@@ -37,6 +134,23 @@ class NBTask(BaseModel):
     :param notifications_ok: If ok send a notification to discord or slack.
     :param notifications_fail: If not ok, send notification to discord or slack.
     but internally the task also send a notification if the user wants.
+    :param sweep: if provided, the task is executed for each set of params of
+    the sweep, see :class:`SweepData`.
+    :param cache: if provided, results are reused, see :class:`ResultsCacheData`.
+    :param batch: if true, executions queued in a short window for the same
+    project and runtime share a container, see
+    :class:`labfunctions.notebooks.batches.Batches`. Meant for short notebooks,
+    it can't be used with `cache` or `retry`.
+    :param mode: "notebook" runs it with papermill, "script" converts it to
+    a python script, which runs without a kernel and its output is a log
+    with stdout and stderr instead of a notebook, see
+    :mod:`labfunctions.executors.scripts`.
+    :param checkpoint: if provided, the namespace of the kernel is stored
+    after some cells, see :class:`CheckpointData`. Not used in script mode.
+    :param retry: if provided, failed executions are retried,
+    see :class:`RetryData`. Not available for batched executions.
+    :param output_policy: if provided, large outputs are removed from
+    the notebook before it is stored, see :class:`OutputPolicyData`.
     """
 
     nb_name: str
@@ -52,12 +166,38 @@ class NBTask(BaseModel):
     timeout: int = 10800  # secs 3h default
     notifications_ok: Optional[List[str]] = None
     notifications_fail: Optional[List[str]] = None
+    sweep: Optional[SweepData] = None
+    cache: Optional[ResultsCacheData] = None
+    batch: bool = False
+    mode: Literal["notebook", "script"] = "notebook"
+    checkpoint: Optional[CheckpointData] = None
+    retry: Optional[RetryData] = None
+    output_policy: Optional[OutputPolicyData] = None
     # schedule: Optional[ScheduleData] = None
 
+    @validator("batch")
+    def check_batch(cls, batch, values):  # pylint: disable=no-self-argument
+        # the status of each execution of a batch is not known by the agent
+        if batch and values.get("cache"):
+            raise ValueError("batched executions can't be cached")
+        return batch
+
+    @validator("retry")
+    def check_retry(cls, retry, values):  # pylint: disable=no-self-argument
+        if retry and values.get("batch"):
+            raise ValueError("batched executions can't be retried")
+        return retry
+
 
 class ExecutionNBTask(BaseModel):
     """It will be send to task_handler, and it has the
     configuration needed for papermill to run a specific notebook.
+
+    :param params_key: if params are too big, they are stored in the kv store
+    of the project under this key, and `params` is empty.
+    :param mode: see :class:`NBTask`.
+    :param attempt: number of the attempt of this execution, from 1,
+    see :class:`RetryData`.
     """
 
     projectid: str
@@ -84,11 +224,63 @@ class ExecutionNBTask(BaseModel):
     remote_output: Optional[str]
     notifications_ok: Optional[List[str]] = None
     notifications_fail: Optional[List[str]] = None
+    parentid: Optional[str] = None
+    node: Optional[str] = None
+    cache_key: Optional[str] = None
+    cache_ttl: Optional[int] = None
+    params_key: Optional[str] = None
+    mode: Literal["notebook", "script"] = "notebook"
+    checkpoint: Optional[CheckpointData] = None
+    retry: Optional[RetryData] = None
+    attempt: int = 1
+    output_policy: Optional[OutputPolicyData] = None
+
+
+class ExecutionTemplate(BaseModel):
+    """
+    It's the part of an :class:`ExecutionNBTask` that doesn't change
+    between executions of the same workflow, it is stored in Redis
+    when a workflow is registered, and used by the dispatcher to build
+    the execution context without querying the database.
+
+    :param runtime: the final docker image to use.
+    :param pipeline: if the workflow is a pipeline of notebooks.
+    :param version: schema version, templates with other version are ignored.
+    """
+
+    projectid: str
+    wfid: str
+    nbtask: NBTask
+    runtime: str
+    created_at: str
+    pipeline: Optional[PipelineData] = None
+    version: int = defaults.EXECUTION_TEMPLATE_VERSION
 
 
 class ExecutionResult(BaseModel):
     """
     Is the result of a ExecutionTask execution.
+
+    :param node: name of the node if it is part of a pipeline.
+    :param pipeline: summary of a pipeline execution, only for the pipeline
+    itself, which is registered when all its nodes end.
+    :param cached_from: if the result was taken from the results cache,
+    the execid of the execution which produced it.
+    :param output_encoding: encoding of the notebook uploaded, see
+    `defaults.NB_OUTPUT_ENCODINGS`; if empty, it was stored as is.
+    :param cells: profile of each code cell executed, as rows of
+    (cell index, wall secs, peak rss delta in kb, output size in bytes),
+    the rss delta is None if it couldn't be measured.
+    :param resources: resources used by the container of the execution.
+    :param resumed_from: index of the cell of the checkpoint restored,
+    if the execution continued from a checkpoint.
+    :param attempt: number of the attempt, from 1.
+    :param exit_code: exit code of the container, see :class:`RetryData`.
+    :param retry_in: if the execution failed and a new attempt was enqueued,
+    secs until it runs.
+    :param output_size: bytes of the notebook as executed, only if the task
+    has a :class:`OutputPolicyData`.
+    :param output_stored_size: bytes of the notebook after the policy.
     """
 
     projectid: str
@@ -109,6 +301,30 @@ class ExecutionResult(BaseModel):
     output_dir: Optional[str] = None
     error_dir: Optional[str] = None
     error_msg: Optional[str] = None
+    parentid: Optional[str] = None
+    node: Optional[str] = None
+    pipeline: Optional[PipelineRun] = None
+    cached_from: Optional[str] = None
+    output_encoding: Optional[str] = None
+    cells: Optional[List[Tuple[int, float, Optional[int], int]]] = None
+    resources: Optional[DockerStatsSummary] = None
+    resumed_from: Optional[int] = None
+    attempt: int = 1
+    exit_code: Optional[int] = None
+    retry_in: Optional[float] = None
+    output_size: Optional[int] = None
+    output_stored_size: Optional[int] = None
+
+
+class CellStats(BaseModel):
+    """Aggregated profile of a cell between executions of a workflow"""
+
+    cell: int
+    runs: int
+    mean_secs: float
+    max_secs: float
+    max_mem_kb: Optional[int] = None
+    max_output_bytes: int = 0
 
 
 @dataclass
@@ -137,20 +353,48 @@ class HistoryLastResponse(BaseModel):
     rows: List[HistoryResult]
 
 
+class SweepStatus(BaseModel):
+    """Aggregated status of a parameter sweep
+
+    :param parentid: execid of the sweep, shared by its executions.
+    """
+
+    parentid: str
+    projectid: str
+    wfid: str
+    total: int
+    pending: int
+    running: int
+    done: int
+    failed: int
+
+
+class SweepHistory(BaseModel):
+    status: Optional[SweepStatus] = None
+    rows: List[HistoryResult]
+
+
 class WorkflowData(BaseModel):
     wfid: str
     alias: str
     nbtask: Dict[str, Any]
     enabled: bool = True
     schedule: Optional[ScheduleData] = None
+    pipeline: Optional[Dict[str, Any]] = None
 
 
 class WorkflowDataWeb(BaseModel):
+    """
+    :param pipeline: if defined, the workflow runs a DAG of notebooks
+    instead of `nbtask.nb_name`, the rest of `nbtask` is shared by every node.
+    """
+
     alias: str
     nbtask: NBTask
     enabled: bool = True
     wfid: Optional[str] = None
     schedule: Optional[ScheduleData] = None
+    pipeline: Optional[PipelineData] = None
 
 
 @dataclass
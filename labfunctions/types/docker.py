@@ -15,9 +15,17 @@ class DockerPushLog(BaseModel):
 
 
 class DockerBuildLog(BaseModel):
+    """
+    :param image: full name of the image built, with its version.
+    :param digest: id of the image built, it changes with the content
+    of the image even if the name is the same.
+    """
+
     build_log: DockerBuildLowLog
     push_log: Optional[DockerPushLog] = None
     error: bool
+    image: Optional[str] = None
+    digest: Optional[str] = None
 
 
 class DockerResources(BaseModel):
@@ -31,9 +39,32 @@ class DockerVolume(BaseModel):
     extra: Dict[str, Any] = {}
 
 
+class DockerStatsSummary(BaseModel):
+    """
+    Resources used by a container, sampled from the docker stats api.
+
+    :param samples: how many samples were taken
+    :param cpu_peak: percent of cpu, 100 is one core
+    :param mem_peak: memory in bytes, without the page cache
+    :param net_rx: total bytes received by the network
+    :param blk_read: total bytes read from block devices
+    """
+
+    samples: int = 0
+    cpu_peak: float = 0.0
+    cpu_mean: float = 0.0
+    mem_peak: int = 0
+    mem_mean: int = 0
+    net_rx: int = 0
+    net_tx: int = 0
+    blk_read: int = 0
+    blk_write: int = 0
+
+
 class DockerRunResult(BaseModel):
     msg: str
     status: int
+    stats: Optional[DockerStatsSummary] = None
 
 
 class DockerfileImage(BaseModel):
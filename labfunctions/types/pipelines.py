@@ -0,0 +1,85 @@
+from typing import Any, Dict, List, Optional
+
+from pydantic import BaseModel, validator
+
+
+class PipelineNode(BaseModel):
+    """
+    A notebook of a pipeline. Runtime, version and the fields not defined here
+    are taken from the `nbtask` of the workflow, and its params are merged
+    with the params of the workflow.
+
+    :param name: unique name of the node inside the pipeline
+    :param needs: names of the nodes that must end ok before this one starts
+    """
+
+    name: str
+    nb_name: str
+    params: Dict[str, Any] = {}
+    needs: List[str] = []
+    machine: Optional[str] = None
+    cluster: Optional[str] = None
+    timeout: Optional[int] = None
+
+
+class PipelineData(BaseModel):
+    """
+    A DAG of notebooks. Each node is enqueued as soon as all the nodes
+    in its `needs` end ok, if one of them fails, it is skipped.
+    """
+
+    nodes: List[PipelineNode]
+
+    @validator("nodes")
+    def check_dag(cls, nodes):  # pylint: disable=no-self-argument
+        names = [n.name for n in nodes]
+        if len(set(names)) != len(names):
+            raise ValueError("node names must be unique")
+        needs = {n.name: set(n.needs) for n in nodes}
+        for n in nodes:
+            missing = needs[n.name] - set(names)
+            if missing:
+                raise ValueError(f"{n.name} needs unknown nodes: {missing}")
+        # Kahn's algorithm: if some node is never ready there is a cycle
+        ready = [n for n, deps in needs.items() if not deps]
+        seen = 0
+        while ready:
+            current = ready.pop()
+            seen += 1
+            for n, deps in needs.items():
+                if current in deps:
+                    deps.discard(current)
+                    if not deps:
+                        ready.append(n)
+        if seen != len(nodes):
+            raise ValueError("pipeline has cycles")
+        return nodes
+
+
+class PipelineNodeState(BaseModel):
+    """
+    :param status: one of waiting, queued, ok, failed or skipped
+    :param queued_at: timestamp when the node was enqueued
+    :param ended_at: timestamp when the node ended
+    """
+
+    name: str
+    status: str
+    execid: Optional[str] = None
+    queued_at: Optional[float] = None
+    ended_at: Optional[float] = None
+    elapsed_secs: Optional[float] = None
+
+
+class PipelineRun(BaseModel):
+    """
+    Summary of a pipeline execution
+
+    :param critical_path: chain of nodes which determined the duration
+    of the pipeline, following from the last node to end, the need which
+    ended last.
+    """
+
+    nodes: List[PipelineNodeState]
+    critical_path: List[str]
+    elapsed_secs: float
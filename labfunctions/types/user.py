@@ -27,3 +27,14 @@ class AgentReq(BaseModel):
 class AgentJWTResponse(BaseModel):
     agent_name: str
     creds: JWTResponse
+
+
+class AgentCredentials(BaseModel):
+    """Credentials of a project cached by the agent, see
+    :class:`labfunctions.executors.credentials.CredentialsCache`"""
+
+    projectid: str
+    private_key: str
+    agent_token: AgentJWTResponse
+    fetched_at: float
+    expires_at: float
@@ -1,4 +1,4 @@
-from typing import List, Optional
+from typing import Any, Dict, List, Optional
 
 from pydantic import BaseModel
 
@@ -13,3 +13,21 @@ class WFCreateRsp(BaseModel):
 class WFPushRsp(BaseModel):
     created: Optional[List[WFCreateRsp]] = []
     errors: Optional[List[WFCreateRsp]] = []
+
+
+class WFQueueReq(BaseModel):
+    wfid: str
+    params: Optional[Dict[str, Any]] = None
+
+
+class WFQueueManyReq(BaseModel):
+    """Used to enqueue many workflows of a project at once
+
+    :param params: optional overrides of each workflow params
+    """
+
+    workflows: List[WFQueueReq]
+
+
+class WFQueueManyRsp(BaseModel):
+    execids: List[str]
@@ -9,11 +9,14 @@ import socket
 import subprocess
 import sys
 import unicodedata
+import zlib
+from collections import deque
 from datetime import datetime
 from functools import wraps
 from importlib import import_module
 from pathlib import Path
 from time import time
+from typing import Any, AsyncGenerator, Deque, Generator, Iterable, Optional
 
 import toml
 import yaml
@@ -83,6 +86,64 @@ def run_sync(func, *args, **kwargs):
     return rsp
 
 
+async def stream_async(
+    generator: Generator[bytes, None, None], read_ahead: int = 4
+) -> AsyncGenerator[bytes, None]:
+    """
+    It iterates a sync generator from async code. Each item is read by
+    a call in the default executor, and up to `read_ahead` items are read
+    while the previous ones are consumed; no thread is held while waiting
+    for the consumer. If the consumer stops, the generator is closed.
+    """
+    loop = asyncio.get_running_loop()
+    iterator = iter(generator)
+    end = object()
+    ready: Deque[Any] = deque()
+    fetching: Optional[asyncio.Future] = None
+    waiter: Optional[asyncio.Future] = None
+    finished = False
+
+    def fetch():
+        nonlocal fetching
+        fetching = loop.run_in_executor(None, next, iterator, end)
+        fetching.add_done_callback(fetched)
+
+    def fetched(future: asyncio.Future):
+        nonlocal fetching, finished
+        fetching = None
+        if future.cancelled():
+            return
+        item = future.exception() or future.result()
+        ready.append(item)
+        finished = finished or item is end or isinstance(item, Exception)
+        if not finished and len(ready) < read_ahead:
+            fetch()
+        if waiter and not waiter.done():
+            waiter.set_result(None)
+
+    fetch()
+    try:
+        while True:
+            if not ready:
+                waiter = loop.create_future()
+                await waiter
+                continue
+            item = ready.popleft()
+            if item is end:
+                break
+            if isinstance(item, Exception):
+                raise item
+            if not finished and fetching is None:
+                fetch()
+            yield item
+    finally:
+        finished = True
+        if fetching is not None:
+            await asyncio.wait([fetching])
+        if hasattr(generator, "close"):
+            await loop.run_in_executor(None, generator.close)
+
+
 def get_query_param(request, key, default_val=None):
     val = request.args.get(key, [default_val])
     return val[0]
@@ -394,6 +455,28 @@ def binary_file_reader(fp: str, chunk_size=1024):
             yield data
 
 
+def gzip_file_reader(fp: str, chunk_size=defaults.NB_OUTPUT_CHUNK_SIZE):
+    """
+    Like :func:`binary_file_reader` but it yields the file compressed with gzip
+    """
+    compressor = zlib.compressobj(wbits=31)
+    for data in binary_file_reader(fp, chunk_size):
+        compressed = compressor.compress(data)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def gunzip_stream(generator: Iterable[bytes]) -> Generator[bytes, None, None]:
+    """It decompress a stream of gzip data"""
+    decompressor = zlib.decompressobj(wbits=31)
+    for data in generator:
+        decompressed = decompressor.decompress(data)
+        if decompressed:
+            yield decompressed
+    yield decompressor.flush()
+
+
 def open_publickey(fp) -> str:
     with open(fp, "r") as f:
         data = f.read()
@@ -5,18 +5,25 @@ from dataclasses import asdict
 
 import httpx
 from sanic import Blueprint
-from sanic.response import json
+from sanic.response import empty, json, raw
 from sanic_ext import openapi
 
 from labfunctions import defaults
 from labfunctions.conf.server_settings import settings
 from labfunctions.defaults import API_VERSION
+from labfunctions.io.kvspec import KeyReadError
 from labfunctions.managers import history_mg
 from labfunctions.managers.users_mg import inject_user
 from labfunctions.security.web import protected
-from labfunctions.types import ExecutionResult, HistoryRequest, NBTask
-from labfunctions.utils import today_string
-from labfunctions.web.utils import get_kvstore, get_query_param2
+from labfunctions.types import ExecutionResult, HistoryRequest, NBTask, SweepHistory
+from labfunctions.types.docker import DockerStatsSummary
+from labfunctions.utils import run_async, secure_filename, today_string
+from labfunctions.web.utils import (
+    get_kvstore,
+    get_query_param2,
+    get_scheduler,
+    stream_reader,
+)
 
 history_bp = Blueprint("history", url_prefix="history", version=API_VERSION)
 
@@ -78,6 +85,47 @@ async def history_detail_job(request, projectid: str, execid: str):
         return json(dict(msg="not found"), 404)
 
 
+@history_bp.post("/<projectid>/detail/<execid>/_resources")
+@openapi.parameter("projectid", str, "path")
+@openapi.parameter("execid", str, "path")
+@openapi.body({"application/json": DockerStatsSummary})
+@openapi.response(204, "Updated")
+@openapi.response(404, dict(msg=str), "Not Found")
+@protected()
+async def history_set_resources(request, projectid: str, execid: str):
+    """Add the resources used by the container of an execution"""
+    # pylint: disable=unused-argument
+    resources = DockerStatsSummary(**request.json)
+    session = request.ctx.session
+    async with session.begin():
+        ok = await history_mg.set_resources(session, projectid, execid, resources)
+    if ok:
+        return empty()
+    return json(dict(msg="not found"), 404)
+
+
+@history_bp.get("/<projectid>/sweep/<parentid>")
+@openapi.parameter("projectid", str, "path")
+@openapi.parameter("parentid", str, "path")
+@openapi.response(200, SweepHistory, "Found")
+@openapi.response(404, dict(msg=str), "Not Found")
+@openapi.parameter("lt", int, "lt")
+@protected()
+async def history_sweep(request, projectid, parentid):
+    """Get the aggregated status and the executions of a parameter sweep"""
+    lt = get_query_param2(request, "lt", 100)
+    sche = get_scheduler(request)
+    status = await run_async(sche.sweeps.status, parentid)
+    session = request.ctx.session
+    async with session.begin():
+        h = await history_mg.get_by_parent(session, projectid, parentid, limit=lt)
+    if not status and not h.rows:
+        return json(dict(msg="not found"), 404)
+
+    rsp = SweepHistory(status=status, rows=h.rows)
+    return json(rsp.dict(), 200)
+
+
 @history_bp.get("/<projectid>/<wfid>")
 @openapi.parameter("projectid", str, "path")
 @openapi.parameter("wfid", str, "path")
@@ -103,7 +151,8 @@ async def history_last_job(request, wfid, projectid):
 @protected()
 async def history_output_ok(request, projectid):
     """
-    Upload a workflow project
+    Upload the notebook of an execution as a multipart file.
+    It's kept for older clients, see `/_output`.
     """
     # pylint: disable=unused-argument
     kv_store = get_kvstore(request)
@@ -127,7 +176,8 @@ async def history_output_ok(request, projectid):
 @protected()
 async def history_output_fail(request, projectid):
     """
-    Upload a workflow project
+    Upload the notebook of a failed execution as a multipart file.
+    It's kept for older clients, see `/_output`.
     """
     # pylint: disable=unused-argument
 
@@ -146,6 +196,162 @@ async def history_output_fail(request, projectid):
     return json(dict(msg="OK"), 201)
 
 
+@history_bp.post("/<projectid>/_output", stream=True)
+@openapi.parameter("projectid", str, "path")
+@openapi.parameter("output_name", str, "query")
+@openapi.parameter("error", bool, "query")
+@openapi.parameter("encoding", str, "query")
+@openapi.response(201, "Created")
+@openapi.response(400, dict(msg=str), "Bad params")
+@protected()
+async def history_output_stream(request, projectid):
+    """
+    Upload the notebook of an execution, the body is streamed to the
+    kv store without loading it in memory. If `encoding` is given, the body
+    should be already encoded and the key is marked with the extension
+    of the encoding.
+    """
+    # pylint: disable=unused-argument
+    output_name = get_query_param2(request, "output_name", None)
+    encoding = get_query_param2(request, "encoding", None)
+    if not output_name:
+        return json(dict(msg="output_name is required"), 400)
+    if encoding and encoding not in defaults.NB_OUTPUT_ENCODINGS:
+        return json(dict(msg=f"encoding {encoding} not supported"), 400)
+
+    kind = "ok"
+    if get_query_param2(request, "error", "false") == "true":
+        kind = "errors"
+    today = today_string(format_="day")
+    output_dir = pathlib.Path(projectid) / defaults.NB_OUTPUTS / kind / today
+    fp = str(output_dir / secure_filename(output_name))
+    if encoding:
+        fp = f"{fp}{defaults.NB_OUTPUT_ENCODINGS[encoding]}"
+
+    kv_store = get_kvstore(request)
+    await kv_store.put_stream(fp, stream_reader(request))
+
+    return json(dict(msg="OK"), 201)
+
+
+@history_bp.post("/<projectid>/_output_object/<execid>", stream=True)
+@openapi.parameter("projectid", str, "path")
+@openapi.parameter("execid", str, "path")
+@openapi.parameter("name", str, "query")
+@openapi.response(201, dict(uri=str), "Created")
+@openapi.response(400, dict(msg=str), "Bad params")
+@protected()
+async def history_output_object_put(request, projectid, execid):
+    """
+    Store an output externalized from the notebook of an execution.
+    The uri returned is relative to the project, as the ones used by
+    :func:`history_get_output`.
+    """
+    # pylint: disable=unused-argument
+    name = get_query_param2(request, "name", None)
+    if not name:
+        return json(dict(msg="name is required"), 400)
+    uri = str(
+        pathlib.Path(defaults.NB_OUTPUTS)
+        / defaults.OUTPUT_OBJECTS_DIR
+        / secure_filename(execid)
+        / secure_filename(name)
+    )
+    kv_store = get_kvstore(request)
+    await kv_store.put_stream(f"{projectid}/{uri}", stream_reader(request))
+
+    return json(dict(uri=uri), 201)
+
+
+@history_bp.post("/<projectid>/_params/<execid>")
+@openapi.parameter("projectid", str, "path")
+@openapi.parameter("execid", str, "path")
+@openapi.response(201, dict(key=str), "Created")
+@protected()
+async def history_params_put(request, projectid, execid):
+    """
+    Store the params of an execution, used by the agents when params are
+    too big to be sent with the execution context.
+    """
+    # pylint: disable=unused-argument
+    root = pathlib.Path(projectid) / defaults.EXECUTIONTASK_PARAMS_DIR
+    key = str(root / f"{secure_filename(execid)}.json")
+    kv_store = get_kvstore(request)
+    await kv_store.put(key, request.body)
+
+    return json(dict(key=key), 201)
+
+
+@history_bp.get("/<projectid>/_params")
+@openapi.parameter("projectid", str, "path")
+@openapi.parameter("key", str, "query")
+@openapi.response(200, "Found")
+@openapi.response(404, dict(msg=str), "Not Found")
+@protected()
+async def history_params_get(request, projectid):
+    """Get the params stored by :func:`history_params_put`"""
+    # pylint: disable=unused-argument
+    key = get_query_param2(request, "key", "")
+    root = f"{projectid}/{defaults.EXECUTIONTASK_PARAMS_DIR}/"
+    if not key.startswith(root) or ".." in key:
+        return json(dict(msg="not found"), 404)
+    kv_store = get_kvstore(request)
+    try:
+        data = await kv_store.get(key)
+    except KeyReadError:
+        data = None
+    if not data:
+        return json(dict(msg="not found"), 404)
+
+    return raw(data, content_type="application/json")
+
+
+def _checkpoint_key(projectid: str, execid: str) -> str:
+    root = pathlib.Path(projectid) / defaults.CHECKPOINTS_DIR
+    return str(root / f"{secure_filename(execid)}.pickle")
+
+
+@history_bp.post("/<projectid>/_checkpoint/<execid>", stream=True)
+@openapi.parameter("projectid", str, "path")
+@openapi.parameter("execid", str, "path")
+@openapi.response(201, "Created")
+@protected()
+async def history_checkpoint_put(request, projectid, execid):
+    """
+    Store the last checkpoint of an execution, see
+    :mod:`labfunctions.executors.checkpoints`. The body is streamed.
+    """
+    # pylint: disable=unused-argument
+    kv_store = get_kvstore(request)
+    await kv_store.put_stream(
+        _checkpoint_key(projectid, execid), stream_reader(request)
+    )
+    return json(dict(msg="OK"), 201)
+
+
+@history_bp.get("/<projectid>/_checkpoint/<execid>")
+@openapi.parameter("projectid", str, "path")
+@openapi.parameter("execid", str, "path")
+@openapi.response(200, "Found")
+@openapi.response(404, dict(msg=str), "Not Found")
+@protected()
+async def history_checkpoint_get(request, projectid, execid):
+    """Get the last checkpoint of an execution"""
+    # pylint: disable=unused-argument
+    kv_store = get_kvstore(request)
+    stream = kv_store.get_stream(_checkpoint_key(projectid, execid))
+    try:
+        first = await stream.__anext__()
+    except (KeyReadError, StopAsyncIteration):
+        return json(dict(msg="not found"), 404)
+
+    response = await request.respond(content_type="application/octet-stream")
+    await response.send(first)
+    async for chunk in stream:
+        await response.send(chunk)
+    await response.eof()
+
+
 @history_bp.get("/<projectid>/_get_output")
 @openapi.parameter("projectid", str, "path")
 @openapi.parameter("file", str, "query")
@@ -159,6 +365,6 @@ async def history_get_output(request, projectid):
     key = f"{projectid}/{uri}"
     response = await request.respond(content_type="application/octet-stream")
     kv_store = get_kvstore(request)
-    async for chunk in kv_store.get_stream(key):
+    async for chunk in kv_store.get_parallel(key):
         await response.send(chunk)
     await response.eof()
@@ -8,7 +8,8 @@ from labfunctions.defaults import API_VERSION
 from labfunctions.managers import runtimes_mg
 from labfunctions.security.web import protected
 from labfunctions.types.runtimes import RuntimeData, RuntimeReq
-from labfunctions.web.utils import get_query_param2
+from labfunctions.utils import run_async
+from labfunctions.web.utils import get_query_param2, get_templates
 
 runtimes_bp = Blueprint("runtimes", url_prefix="runtimes", version=API_VERSION)
 
@@ -39,6 +40,8 @@ async def runtimes_create(request: Request, projectid):
     rq = RuntimeReq(**request.json)
     async with session.begin():
         created = await runtimes_mg.create(session, rq)
+    # workflows could be using the latest version of this runtime
+    await run_async(get_templates(request).invalidate_project, projectid)
     code = 201
     if not created:
         code = 200
@@ -54,5 +57,6 @@ async def runtimes_delete(request: Request, projectid: str, rid: str):
     session = request.ctx.session
     async with session.begin():
         await runtimes_mg.delete_by_rid(session, rid)
+    await run_async(get_templates(request).invalidate_project, projectid)
 
     return json({"msg": "ok"}, 200)
@@ -3,6 +3,7 @@ from sanic import Blueprint, Request, Sanic
 from labfunctions import defaults
 from labfunctions.conf.server_settings import settings
 from labfunctions.io.kvspec import AsyncKVSpec
+from labfunctions.notebooks.templates import ExecutionTemplates
 from labfunctions.scheduler import SchedulerExecutor
 
 
@@ -28,6 +29,11 @@ def get_scheduler(
     return SchedulerExecutor(r, qname=qname, is_async=is_async)
 
 
+def get_templates(request: Request) -> ExecutionTemplates:
+    current_app = Sanic.get_app(request.app.name)
+    return ExecutionTemplates(current_app.ctx.rq_redis)
+
+
 def get_kvstore(request: Request) -> AsyncKVSpec:
     return Sanic.get_app(request.app.name).ctx.kv_store
 
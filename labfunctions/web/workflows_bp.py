@@ -9,7 +9,7 @@ from sanic.response import json
 from sanic_ext import openapi
 
 from labfunctions.conf.server_settings import settings
-from labfunctions.defaults import API_VERSION
+from labfunctions.defaults import API_VERSION, QUEUE_MANY_MAX
 from labfunctions.errors.generics import WorkflowRegisterError
 from labfunctions.executors import ExecID
 
@@ -21,11 +21,13 @@ from labfunctions.security.web import protected
 from labfunctions.types import (
     NBTask,
     ProjectData,
+    ResultsCacheStats,
     ScheduleData,
     WorkflowData,
     WorkflowDataWeb,
     WorkflowsList,
 )
+from labfunctions.types.workflows import WFQueueManyReq, WFQueueManyRsp
 from labfunctions.utils import (
     get_query_param,
     parse_page_limit,
@@ -85,7 +87,10 @@ async def notebooks_run(request, projectid):
 
     nb_ctx = create_notebook_ctx(projectid, task, execid=id_, runtime=runtime)
     scheduler = get_scheduler(request, is_async=is_async)
-    await run_async(scheduler.enqueue_notebook, nb_ctx)
+    if task.sweep:
+        await run_async(scheduler.enqueue_sweep, nb_ctx, task.sweep)
+    else:
+        await run_async(scheduler.enqueue_notebook, nb_ctx)
 
     return json(nb_ctx.dict(), 202)
 
@@ -134,7 +139,8 @@ async def workflow_create(request, projectid):
         except WorkflowRegisterError as e:
             return json(dict(msg="workflow already exist"), status=200)
 
-        return json(dict(wfid=wfid), status=201)
+    await scheduler.register_template(session, projectid, wfid, wfd)
+    return json(dict(wfid=wfid), status=201)
 
 
 @workflows_bp.put("/<projectid>")
@@ -164,7 +170,8 @@ async def workflow_update(request, projectid):
         except WorkflowRegisterError as e:
             return json(dict(msg=str(e)), status=503)
 
-        return json(dict(wfid=wfid), status=201)
+    await scheduler.register_template(session, projectid, wfid, wfd)
+    return json(dict(wfid=wfid), status=201)
 
 
 @workflows_bp.delete("/<projectid>/<wfid>")
@@ -179,6 +186,7 @@ async def workflow_delete(request, projectid, wfid):
     async with session.begin():
         await scheduler.delete_workflow(session, projectid, wfid)
         await session.commit()
+    await run_async(scheduler.templates.invalidate, projectid, wfid)
 
     return json(dict(msg="done"), 200)
 
@@ -217,6 +225,41 @@ async def workflow_enqueue(request, projectid, wfid):
     return json(dict(execid=job.id), 202)
 
 
+@workflows_bp.post("/<projectid>/queue")
+@openapi.parameter("projectid", str, "path")
+@openapi.body({"application/json": WFQueueManyReq})
+@openapi.response(202, WFQueueManyRsp)
+@openapi.response(400, {"msg": str}, description="Too many workflows")
+@protected()
+async def workflow_enqueue_many(request, projectid):
+    """Enqueue many workflows in a single round trip.
+    The execids are returned in the same order as the workflows requested"""
+    try:
+        req = WFQueueManyReq(**request.json)
+    except ValidationError:
+        return json(dict(msg="wrong params"), 400)
+    if len(req.workflows) > QUEUE_MANY_MAX:
+        return json(dict(msg=f"Max {QUEUE_MANY_MAX} workflows by request"), 400)
+    sche = get_scheduler(request, is_async=is_async)
+    jobs = await run_async(sche.dispatcher_many, projectid, req.workflows)
+    rsp = WFQueueManyRsp(execids=[j.id for j in jobs])
+
+    return json(rsp.dict(), 202)
+
+
+@workflows_bp.get("/<projectid>/_cache/<wfid>")
+@openapi.parameter("projectid", str, "path")
+@openapi.parameter("wfid", str, "path")
+@openapi.response(200, ResultsCacheStats)
+@protected()
+async def workflow_cache_stats(request, projectid, wfid):
+    """Hits and misses of the results cache of a workflow"""
+    # pylint: disable=unused-argument
+    sche = get_scheduler(request)
+    stats = await run_async(sche.results.stats, projectid, wfid)
+    return json(stats.dict(), 200)
+
+
 @workflows_bp.post("/<projectid>/_ctx/<wfid>")
 @openapi.parameter("projectid", str, "path")
 @openapi.parameter("wfid", str, "path")
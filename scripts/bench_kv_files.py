@@ -0,0 +1,137 @@
+"""
+Throughput of KVFiles with a new client per call against the pooled
+client, using a local stand-in of the fileserver (see fileserver.conf).
+It also compares the download of a large object with one stream against
+ranged parallel downloads; on localhost a single connection isn't limited
+by the network, use --conn-rate to cap the bandwidth of each connection
+of the stand-in, as a remote fileserver or bucket would.
+
+    python scripts/bench_kv_files.py --objects 500 --large 256 --conn-rate 50
+"""
+import argparse
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httpx
+
+from labfunctions.io.kv_files import KVFiles
+
+
+class FileserverHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    data = {}
+    connections = 0
+    conn_rate = 0  # MiB/s of each connection, 0 is unlimited
+
+    def setup(self):
+        super().setup()
+        type(self).connections += 1
+
+    def do_PUT(self):
+        size = int(self.headers.get("Content-Length", 0))
+        self.data[self.path] = self.rfile.read(size)
+        self.send_response(201)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def do_GET(self):
+        body = self.data.get(self.path)
+        if body is None:
+            self.send_response(404)
+            body = b""
+        elif self.headers.get("Range"):
+            start, end = self.headers["Range"].split("=")[1].split("-")
+            body = body[int(start) : int(end) + 1]
+            self.send_response(206)
+        else:
+            self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if not self.conn_rate:
+            self.wfile.write(body)
+            return
+        for start in range(0, len(body), 2**20):
+            chunk = body[start : start + 2**20]
+            self.wfile.write(chunk)
+            time.sleep(len(chunk) / 2**20 / self.conn_rate)
+
+    def do_HEAD(self):
+        body = self.data.get(self.path)
+        self.send_response(404 if body is None else 200)
+        self.send_header("Content-Length", str(len(body or b"")))
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+class PerCallKVFiles(KVFiles):
+    """How KVFiles worked before, a new client for each request"""
+
+    def put(self, key, bdata):
+        with httpx.Client() as client:
+            r = client.put(f"{self.url}/{key}", content=bdata)
+        return r.status_code == 201
+
+    def get(self, key):
+        with httpx.Client() as client:
+            r = client.get(f"{self.url}/{key}")
+        return r.content if r.status_code == 200 else None
+
+
+def run(kv: KVFiles, objects: int, data: bytes) -> float:
+    started = time.perf_counter()
+    for i in range(objects):
+        kv.put(f"obj{i}", data)
+        kv.get(f"obj{i}")
+    return time.perf_counter() - started
+
+
+def run_large(kv: KVFiles, concurrency: int) -> float:
+    started = time.perf_counter()
+    if concurrency == 1:
+        size = sum(len(c) for c in kv.get_stream("large"))
+    else:
+        chunks = kv.get_parallel("large", concurrency=concurrency)
+        size = sum(len(c) for c in chunks)
+    return size / (time.perf_counter() - started) / 2**20
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--objects", type=int, default=500)
+    parser.add_argument("--size", type=int, default=64 * 1024)
+    parser.add_argument("--large", type=int, default=256, help="size in MiB")
+    parser.add_argument("--conn-rate", type=float, default=0, help="MiB/s")
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FileserverHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    opts = dict(url=f"http://127.0.0.1:{server.server_port}")
+    data = b"x" * args.size
+    try:
+        for name, Class in (("per call", PerCallKVFiles), ("pooled", KVFiles)):
+            FileserverHandler.connections = 0
+            kv = Class("bench", opts)
+            elapsed = run(kv, args.objects, data)
+            kv.close()
+            ops = args.objects * 2 / elapsed
+            print(
+                f"{name:>8}: {ops:8.1f} req/s, "
+                f"{FileserverHandler.connections} connections"
+            )
+
+        FileserverHandler.conn_rate = args.conn_rate
+        kv = KVFiles("bench", dict(part_size=8 * 2**20, **opts))
+        kv.put("large", b"x" * args.large * 2**20)
+        for concurrency in (1, 2, 4, 8):
+            mibs = run_large(kv, concurrency)
+            print(f"large object, {concurrency} connections: {mibs:8.1f} MiB/s")
+        kv.close()
+    finally:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,8 @@
 import asyncio
 import os
 import tempfile
+import threading
+from http.server import ThreadingHTTPServer
 
 import aioredis
 import pytest
@@ -21,7 +23,7 @@ from .factories import (
     create_user_model2,
     create_workflow_model,
 )
-from .resources import TestTokenStore, create_app
+from .resources import FileserverHandler, TestTokenStore, create_app
 
 # SQL_URI = os.getenv("SQLTEST")
 # ASQL_URI = os.getenv("ASQLTEST")
@@ -139,6 +141,20 @@ def tempdir():
         yield tmpdirname
 
 
+@pytest.fixture
+def fileserver():
+    """url of a local stand-in of the fileserver, see FileserverHandler"""
+    FileserverHandler.data = {}
+    FileserverHandler.unavailable = set()
+    FileserverHandler.connections = 0
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FileserverHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_port}"
+    server.shutdown()
+    server.server_close()
+
+
 @pytest.fixture
 async def sanic_app(async_conn):
     # from labfunctions.conf.server_settings import settings
@@ -1,5 +1,7 @@
 from contextvars import ContextVar
 from dataclasses import asdict
+from http.server import BaseHTTPRequestHandler
+from json import dumps as json_dumps
 from typing import Optional, Union
 
 from sanic import Sanic
@@ -103,3 +105,94 @@ def create_app(bluprints, db, web_redis, rq_redis=None, app_name="test"):
         return json(dict(msg="We are ok"))
 
     return _app
+
+
+class FileserverHandler(BaseHTTPRequestHandler):
+    """
+    A stand-in of the fileserver for labfunctions.io.kv_files,
+    objects are kept in `data` and ranged requests are supported.
+    Directories are listed as the json autoindex of nginx.
+    The first request to a path in `unavailable` gets a 503.
+    """
+
+    protocol_version = "HTTP/1.1"
+    data = {}
+    unavailable = set()
+    connections = 0
+
+    def setup(self):
+        super().setup()
+        type(self).connections += 1
+
+    def _unavailable(self) -> bool:
+        if self.path in self.unavailable:
+            self.unavailable.discard(self.path)
+            self._respond(503)
+            return True
+        return False
+
+    def _respond(self, status: int, body: bytes = b""):
+        self.send_response(status)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_body(self) -> bytes:
+        if self.headers.get("Transfer-Encoding") != "chunked":
+            return self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        body = b""
+        while True:
+            size = int(self.rfile.readline().strip(), 16)
+            body += self.rfile.read(size)
+            self.rfile.readline()
+            if size == 0:
+                return body
+
+    def do_PUT(self):
+        body = self._read_body()
+        if not self._unavailable():
+            self.data[self.path] = body
+            self._respond(201)
+
+    def _listing(self) -> Union[bytes, None]:
+        entries = {}
+        for path, body in self.data.items():
+            if path.startswith(self.path):
+                name, _, rest = path[len(self.path) :].partition("/")
+                entries[name] = dict(name=name, type="directory" if rest else "file")
+        if not entries:
+            return None
+        return json_dumps(list(entries.values())).encode("utf-8")
+
+    def do_GET(self):
+        if self._unavailable():
+            return
+        if self.path.endswith("/"):
+            body = self._listing()
+        else:
+            body = self.data.get(self.path)
+        if body is None:
+            self._respond(404)
+        elif self.headers.get("Range"):
+            start, end = self.headers["Range"].split("=")[1].split("-")
+            self._respond(206, body[int(start) : int(end) + 1])
+        else:
+            self._respond(200, body)
+
+    def do_HEAD(self):
+        body = self.data.get(self.path)
+        self.send_response(404 if body is None else 200)
+        self.send_header("Content-Length", str(len(body or b"")))
+        if body is not None:
+            self.send_header("Last-Modified", "Sun, 18 Oct 2026 10:00:00 GMT")
+            self.send_header("ETag", f'"{hash(body):x}"')
+        self.end_headers()
+
+    def do_DELETE(self):
+        if self._unavailable():
+            return
+        body = self.data.pop(self.path, None)
+        self._respond(404 if body is None else 204)
+
+    def log_message(self, *args):
+        pass
@@ -0,0 +1,75 @@
+from pytest_mock import MockerFixture
+
+from labfunctions import scheduler
+from labfunctions.executors.local_exec import ctx_files
+from labfunctions.hashes import generate_random
+from labfunctions.notebooks.batches import Batches
+from labfunctions.notebooks.templates import create_template
+
+from .factories import ExecutionNBTaskFactory, NBTaskFactory
+
+
+def test_batches_add_close(redis):
+    batches = Batches(redis, window_secs=10)
+    qname = f"test.{generate_random()}"
+    first = ExecutionNBTaskFactory(runtime="test:1")
+    second = ExecutionNBTaskFactory(projectid=first.projectid, runtime="test:1")
+    other = ExecutionNBTaskFactory(projectid=first.projectid, runtime="test:2")
+
+    batchid = batches.add(first, qname)
+    added = batches.add(second, qname)
+    other_batchid = batches.add(other, qname)
+    ctxs = batches.close(batches.open_key(qname, first), batchid)
+    after = batches.add(second, qname)
+
+    assert batchid == first.execid
+    assert added is None
+    assert other_batchid == other.execid
+    assert [c.execid for c in ctxs] == [first.execid, second.execid]
+    assert after == second.execid
+
+
+def test_batches_max_size(redis):
+    batches = Batches(redis, window_secs=10, max_size=2)
+    qname = f"test.{generate_random()}"
+    ctxs = [ExecutionNBTaskFactory(projectid="test", runtime="t") for _ in range(3)]
+
+    ids = [batches.add(ctx, qname) for ctx in ctxs]
+    open_key = batches.open_key(qname, ctxs[0])
+    batches.wait(open_key, ids[0], max_wait=0.1)
+    closed = batches.close(open_key, ids[0])
+
+    assert ids == [ctxs[0].execid, None, ctxs[2].execid]
+    assert len(closed) == 2
+    assert redis.get(open_key).decode("utf-8") == ctxs[2].execid
+
+
+def test_batches_dispatcher(mocker: MockerFixture, redis):
+    task = NBTaskFactory(params={"RUN": generate_random()}, batch=True)
+    tpl = create_template("test", "wfid-batch", task)
+    sche = scheduler.SchedulerExecutor(redis, qname="test", is_async=False)
+    sche.batches.window_secs = 10
+    sche.templates.put(tpl)
+    enqueue = mocker.patch("labfunctions.scheduler.Queue.enqueue")
+    notebook = mocker.patch.object(sche, "enqueue_notebook")
+    mocker.patch("labfunctions.scheduler.SchedulerExecutor", return_value=sche)
+    db = mocker.MagicMock()
+
+    scheduler.scheduler_dispatcher("test", "wfid-batch", redis_obj=redis, db=db)
+    scheduler.scheduler_dispatcher("test", "wfid-batch", redis_obj=redis, db=db)
+    open_key, batchid = enqueue.call_args.args[1:]
+    ctxs = sche.batches.close(open_key, batchid)
+
+    assert enqueue.call_count == 1
+    assert not notebook.called
+    assert len(ctxs) == 2
+
+
+def test_batches_ctx_files(monkeypatch):
+    monkeypatch.setenv("LF_EXECUTION_TASK_FILE", "/tmp/lf/a.json:/tmp/lf/b.json")
+    files = ctx_files()
+    monkeypatch.setenv("LF_EXECUTION_TASK_FILE", "/tmp/lf/a.json")
+    single = ctx_files()
+
+    assert files == ["/tmp/lf/a.json", "/tmp/lf/b.json"]
+    assert single == ["/tmp/lf/a.json"]
@@ -7,6 +7,7 @@ from pytest_mock import MockerFixture
 from labfunctions.client.nbclient import NBClient
 from labfunctions.conf.server_settings import settings
 from labfunctions.io.kvspec import GenericKVSpec
+from labfunctions.notebooks.results_cache import ResultsCache
 from labfunctions.runtimes import builder
 
 from .factories import BuildCtxFactory, DockerBuildLogFactory, ProjectDataFactory
@@ -45,7 +46,7 @@ def test_builder_BuildTask_get_runtime(mocker: MockerFixture, kvstore, tempdir):
             yield str(x).encode()
 
     mock = mocker.MagicMock()
-    mock.get_stream.return_value = [str(x).encode() for x in range(6)]
+    mock.get_parallel.return_value = [str(x).encode() for x in range(6)]
     # mock.get_stream = stream_data
     client = NBClient(url_service="http://localhost:8000")
     task = builder.BuildTask(client, kvstore=kvstore)
@@ -53,7 +54,7 @@ def test_builder_BuildTask_get_runtime(mocker: MockerFixture, kvstore, tempdir):
     task.get_runtime_file(f"{tempdir}/test.zip", "dowload_zip_url")
     is_file = Path(f"{tempdir}/test.zip").is_file()
     assert is_file
-    assert mock.get_stream.called
+    assert mock.get_parallel.called
 
 
 def test_builder_BuildTask_run(mocker: MockerFixture, kvstore, tempdir):
@@ -130,3 +131,19 @@ def test_builder_exec(mocker: MockerFixture, kvstore):
     assert task_mock.call_args[0][0].execid == ctx.execid
     # assert task_mock.call_args_list[0][0][0] == ctx.projectid
     assert result.error is False
+
+
+def test_builder_exec_digest(mocker: MockerFixture, redis):
+    ctx = BuildCtxFactory()
+    log = DockerBuildLogFactory(image="nbworkflows/test:1", digest="sha256:1")
+    mocker.patch("labfunctions.runtimes.builder.BuildTask.run", return_value=log)
+    mocker.patch("labfunctions.runtimes.builder.BuildTask.register")
+    mocker.patch("labfunctions.runtimes.builder.client.from_env")
+    mocker.patch(
+        "labfunctions.runtimes.builder.get_current_job",
+        return_value=mocker.MagicMock(connection=redis),
+    )
+
+    builder.builder_exec(ctx)
+
+    assert ResultsCache(redis).digest("nbworkflows/test:1") == "sha256:1"
@@ -0,0 +1,134 @@
+import io
+import tarfile
+import threading
+
+from pytest_mock import MockerFixture
+
+from labfunctions.commands import DockerCommand, LogsStream, StatsSampler, parse_stats
+
+
+def test_commands_logs_stream():
+    batches = []
+    stream = LogsStream(batches.append, batch_lines=2, batch_secs=60, tail=3)
+
+    stream.feed(b"line 1\nline")
+    stream.feed(b" 2\nline 3\n")
+    stream.feed("line 4\nñ".encode("utf-8")[:-1])
+    stream.feed("ñ".encode("utf-8")[-1:])
+    stream.close()
+
+    assert batches == [["line 1", "line 2", "line 3"], ["line 4", "ñ"]]
+    assert stream.text == "line 3\nline 4\nñ"
+
+
+def test_commands_logs_stream_timer(mocker: MockerFixture):
+    published = threading.Event()
+    batches = []
+
+    def publish(lines):
+        batches.append(lines)
+        published.set()
+
+    def logs(**kwargs):
+        yield b"first\n"
+        # the container is quiet until the batch is published
+        yield b"published\n" if published.wait(timeout=5) else b"timeout\n"
+
+    container = mocker.MagicMock()
+    container.logs.side_effect = logs
+    stream = LogsStream(publish, batch_lines=100, batch_secs=0.05)
+
+    stream.follow(container)
+
+    assert batches == [["first"], ["published"]]
+
+
+def test_commands_docker_run_stream(mocker: MockerFixture):
+    batches = []
+    container = mocker.MagicMock()
+    container.wait.return_value = {"StatusCode": 0}
+    container.logs.return_value = iter([b"first\n", b"second\n"])
+    client = mocker.MagicMock()
+    client.containers.run.return_value = container
+
+    cmd = DockerCommand(docker_client=client)
+    stream = LogsStream(batches.append, batch_lines=1, tail=1)
+    rsp = cmd.run("lab exec local", "test:1", logs_stream=stream)
+
+    assert rsp.status == 0
+    assert rsp.msg == "second"
+    assert batches == [["first"], ["second"]]
+    container.logs.assert_called_once_with(stream=True, follow=True)
+
+
+def test_commands_docker_run_files(mocker: MockerFixture):
+    container = mocker.MagicMock()
+    container.wait.return_value = {"StatusCode": 0}
+    container.logs.return_value = b"ok"
+    client = mocker.MagicMock()
+    client.containers.create.return_value = container
+
+    cmd = DockerCommand(docker_client=client)
+    rsp = cmd.run("lab exec local", "test:1", files={"/tmp/lf/ctx.json": b"{}"})
+    path, data = container.put_archive.call_args.args
+    with tarfile.open(fileobj=io.BytesIO(data)) as tar:
+        content = tar.extractfile("tmp/lf/ctx.json").read()
+
+    assert rsp.status == 0
+    assert path == "/"
+    assert content == b"{}"
+    container.start.assert_called_once()
+    client.containers.run.assert_not_called()
+
+
+def _stats_sample(cpu, mem, rx):
+    return {
+        "cpu_stats": {
+            "cpu_usage": {"total_usage": cpu},
+            "system_cpu_usage": 1000,
+            "online_cpus": 2,
+        },
+        "precpu_stats": {"cpu_usage": {"total_usage": 0}, "system_cpu_usage": 0},
+        "memory_stats": {"usage": mem, "stats": {"inactive_file": 10}, "limit": 100},
+        "networks": {"eth0": {"rx_bytes": rx, "tx_bytes": 1}},
+        "blkio_stats": {
+            "io_service_bytes_recursive": [
+                {"op": "read", "value": 3},
+                {"op": "write", "value": 4},
+            ]
+        },
+    }
+
+
+def test_commands_parse_stats():
+    sample = parse_stats(_stats_sample(250, 60, 7))
+    empty = parse_stats({})
+
+    assert sample["cpu"]["percent"] == 50.0
+    assert sample["mem"]["mem_usage"] == 50
+    assert sample["net"] == {"rx_bytes": 7, "tx_bytes": 1}
+    assert sample["blk"] == {"read_bytes": 3, "write_bytes": 4}
+    assert empty["cpu"]["percent"] == 0.0
+
+
+def test_commands_docker_run_stats(mocker: MockerFixture):
+    samples = []
+    container = mocker.MagicMock()
+    container.wait.return_value = {"StatusCode": 0}
+    container.logs.return_value = b"ok"
+    container.stats.return_value = iter(
+        [_stats_sample(100, 30, 5), {"memory_stats": {}}, _stats_sample(300, 50, 9)]
+    )
+    client = mocker.MagicMock()
+    client.containers.run.return_value = container
+
+    cmd = DockerCommand(docker_client=client)
+    sampler = StatsSampler(interval=0, publish=samples.append)
+    rsp = cmd.run("lab exec local", "test:1", stats_sampler=sampler)
+
+    assert rsp.stats.samples == 2
+    assert rsp.stats.cpu_peak == 60.0
+    assert rsp.stats.cpu_mean == 40.0
+    assert rsp.stats.mem_peak == 40
+    assert rsp.stats.net_rx == 9
+    assert len(samples) == 2
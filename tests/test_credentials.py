@@ -0,0 +1,117 @@
+import os
+import stat
+from multiprocessing import Pool
+
+import jwt
+
+from labfunctions.executors.credentials import CredentialsCache
+from labfunctions.executors.nbtask_base import NBTaskDocker
+from labfunctions.types.security import JWTResponse
+from labfunctions.types.user import AgentJWTResponse
+
+
+class Clock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def _client(mocker, exp=None):
+    claims = {"usr": "agent"}
+    if exp:
+        claims["exp"] = exp
+    token = jwt.encode(claims, "secret", algorithm="HS256")
+    client = mocker.MagicMock()
+    client.projects_private_key.return_value = "private key"
+    client.projects_agent_token.return_value = AgentJWTResponse(
+        agent_name="agent", creds=JWTResponse(access_token=token, refresh_token="r")
+    )
+    return client
+
+
+def test_credentials_cache(mocker, tempdir):
+    client = _client(mocker)
+    clock = Clock()
+    cache = CredentialsCache(client, cache_dir=tempdir, ttl_secs=100, now=clock)
+    other = CredentialsCache(client, cache_dir=tempdir, ttl_secs=100, now=clock)
+
+    key = cache.private_key("prj")
+    token = other.agent_token("prj")
+    calls = client.projects_private_key.call_count
+    clock.now += 90
+    cache.get("prj")
+    refreshed = client.projects_private_key.call_count
+    clock.now += 200
+    other.get("prj")
+    mode = stat.S_IMODE(os.stat(cache._path("prj")).st_mode)
+
+    assert key == "private key"
+    assert token.agent_name == "agent"
+    assert calls == 1
+    assert refreshed == 2
+    assert client.projects_private_key.call_count == 3
+    assert mode == 0o600
+
+
+def test_credentials_cache_refresh_locked(mocker, tempdir):
+    client = _client(mocker)
+    clock = Clock()
+    cache = CredentialsCache(client, cache_dir=tempdir, ttl_secs=100, now=clock)
+    cache.get("prj")
+    clock.now += 90
+    with cache._lock("prj"):
+        # another worker is refreshing them, the cached ones are still valid
+        creds = cache.get("prj")
+    client.projects_agent_token.side_effect = ConnectionError()
+    failed = cache.get("prj")
+
+    assert creds.fetched_at == 1000.0
+    assert failed.fetched_at == 1000.0
+    assert cache.fetched == 1
+
+
+def test_credentials_cache_token_exp(mocker, tempdir):
+    client = _client(mocker, exp=1500)
+    cache = CredentialsCache(
+        client, cache_dir=tempdir, ttl_secs=1000, margin_secs=100, now=Clock()
+    )
+
+    creds = cache.get("prj")
+
+    assert creds.expires_at == 1400
+
+
+def _get_key(tempdir):
+    # each process has its own client, only one should call the web server
+    from unittest import mock
+
+    client = mock.MagicMock()
+    client.projects_private_key.return_value = "private key"
+    client.projects_agent_token.return_value = AgentJWTResponse(
+        agent_name="agent", creds=JWTResponse(access_token="invalid")
+    )
+    cache = CredentialsCache(client, cache_dir=tempdir)
+    cache.get("prj")
+    return cache.fetched
+
+
+def test_credentials_cache_processes(tempdir):
+    with Pool(4) as pool:
+        fetched = pool.map(_get_key, [tempdir] * 8)
+
+    assert sum(fetched) == 1
+
+
+def test_credentials_nbtask_docker(mocker, tempdir):
+    client = _client(mocker)
+    client._addr = "http://localhost:8000"
+    task = NBTaskDocker(client, creds=CredentialsCache(client, cache_dir=tempdir))
+
+    env = task.build_env({"projectid": "prj"})
+    env.update(task.agent_env("prj"))
+
+    assert env["LF_AGENT_REFRESH_TOKEN"] == "r"
+    assert client.projects_private_key.call_count == 1
+    assert client.projects_agent_token.call_count == 1
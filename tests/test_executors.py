@@ -0,0 +1,193 @@
+import base64
+import json
+
+import nbformat
+import pytest
+from nbformat.v4 import new_code_cell, new_markdown_cell, new_notebook, new_output
+from pydantic import ValidationError
+from pytest_mock import MockerFixture
+
+from labfunctions import defaults
+from labfunctions.executors.local_exec import ctx_from_env
+from labfunctions.executors.nbtask_base import NBTaskDocker
+from labfunctions.executors.outputs import apply_output_policy
+from labfunctions.executors.profiling import CellsProfiler, slowest_cells
+from labfunctions.executors.scripts import (
+    ScriptConversionError,
+    notebook_to_script,
+    run_script,
+)
+from labfunctions.types import OutputPolicyData
+
+from .factories import ExecutionNBTaskFactory, ExecutionResultFactory
+
+
+def test_executors_offload_params(mocker: MockerFixture):
+    client = mocker.MagicMock()
+    client.history_put_params.return_value = "test/params/execid.json"
+    task = NBTaskDocker(client)
+    small = ExecutionNBTaskFactory(runtime="test:1")
+    big = ExecutionNBTaskFactory(
+        runtime="test:1", params={"DATA": "x" * defaults.EXECUTIONTASK_PARAMS_MAX}
+    )
+
+    same = task.offload_params(small)
+    offloaded = task.offload_params(big)
+
+    assert same is small
+    assert offloaded.params == {}
+    assert offloaded.params_key == "test/params/execid.json"
+    assert big.params["DATA"]
+    client.history_put_params.assert_called_once_with(
+        big.projectid, big.execid, big.params
+    )
+
+
+def test_executors_ctx_from_env(mocker: MockerFixture, tmp_path, monkeypatch):
+    params = {"DATA": "big"}
+    client = mocker.MagicMock()
+    client.history_get_params.return_value = params
+    ctx = ExecutionNBTaskFactory(runtime="test:1", params={}, params_key="key")
+    ctx_file = tmp_path / "ctx.json"
+    ctx_file.write_text(ctx.json())
+    monkeypatch.delenv(defaults.EXECUTIONTASK_VAR, raising=False)
+    monkeypatch.setenv(defaults.EXECUTIONTASK_FILE_VAR, str(ctx_file))
+
+    from_file = ctx_from_env(client)
+    monkeypatch.delenv(defaults.EXECUTIONTASK_FILE_VAR)
+    monkeypatch.setenv(
+        defaults.EXECUTIONTASK_VAR, json.dumps(ctx.dict(exclude={"params_key"}))
+    )
+    from_var = ctx_from_env(client)
+
+    assert from_file.params == params
+    assert from_var.execid == ctx.execid
+    assert from_var.params == {}
+    client.history_get_params.assert_called_once_with(ctx.projectid, "key")
+
+
+def test_executors_cells_profiler():
+    profiler = CellsProfiler()
+    hooks = profiler.hooks()
+    cell = {"outputs": [{"text": "hello"}]}
+
+    hooks["on_cell_execute"](cell=cell, cell_index=1)
+    hooks["on_cell_executed"](cell=cell, cell_index=1, execute_reply={})
+    hooks["on_cell_executed"](cell=cell, cell_index=2, execute_reply={})
+    index, secs, _, output_bytes = profiler.rows[0]
+
+    assert len(profiler.rows) == 1
+    assert index == 1
+    assert secs >= 0
+    assert output_bytes == len(json.dumps(cell["outputs"]))
+
+
+def test_executors_slowest_cells():
+    results = [
+        ExecutionResultFactory(cells=[(0, 1.0, 10, 5), (1, 3.0, None, 0)]),
+        ExecutionResultFactory(cells=[(0, 2.0, 20, 50), (1, 5.0, None, 0)]),
+        ExecutionResultFactory(cells=None),
+    ]
+
+    stats = slowest_cells(results, top=1)
+
+    assert len(stats) == 1
+    assert stats[0].cell == 1
+    assert stats[0].mean_secs == 4.0
+    assert stats[0].max_mem_kb is None
+    assert slowest_cells(results)[1].max_output_bytes == 50
+
+
+def _notebook(*sources):
+    nb = new_notebook(cells=[new_markdown_cell("# Title")])
+    nb.cells.append(new_code_cell(sources[0], metadata={"tags": ["parameters"]}))
+    nb.cells.extend(new_code_cell(src) for src in sources[1:])
+    return nb
+
+
+def test_executors_notebook_to_script():
+    code = notebook_to_script(_notebook("X = 1", "print(X)"))
+    without_params = notebook_to_script(new_notebook(cells=[new_code_cell("a")]))
+
+    assert code.index("X = 1") < code.index("# Parameters") < code.index("print(X)")
+    assert "# Title" not in code
+    assert without_params.startswith("# Parameters")
+    with pytest.raises(ScriptConversionError):
+        notebook_to_script(_notebook("X = 1", "!ls"))
+
+
+def test_executors_run_script(tmp_path):
+    nb_path = str(tmp_path / "etl.ipynb")
+    nbformat.write(_notebook("X = 1", "print(X * 2)", "assert X < 3"), nb_path)
+    cache_dir = str(tmp_path / "cache")
+
+    status, tail = run_script(
+        nb_path, {"X": 2}, str(tmp_path / "out.log"), 10, cache_dir=cache_dir
+    )
+    failed, failed_tail = run_script(
+        nb_path, {"X": 5}, str(tmp_path / "failed.log"), 10, cache_dir=cache_dir
+    )
+
+    assert status == 0
+    assert tail.strip() == "4"
+    assert (tmp_path / "out.log").read_text().strip() == "4"
+    assert failed == 1
+    assert "AssertionError" in failed_tail
+    assert len(list((tmp_path / "cache").iterdir())) == 1
+
+
+def _executed(tmp_path):
+    nb = new_notebook(cells=[new_code_cell("print"), new_code_cell("plot")])
+    nb.cells[0].outputs = [new_output("stream", name="stdout", text="x" * 500)]
+    nb.cells[1].outputs = [
+        new_output(
+            "display_data",
+            data={
+                "image/png": base64.b64encode(b"png" * 100).decode(),
+                "text/plain": "<Figure>",
+            },
+        )
+    ]
+    path = str(tmp_path / "output.ipynb")
+    nbformat.write(nb, path)
+    return path
+
+
+def test_executors_output_policy_truncate(tmp_path):
+    path = _executed(tmp_path)
+
+    original, stored = apply_output_policy(path, OutputPolicyData(max_cell_bytes=100))
+    nb = nbformat.read(path, 4)
+
+    assert stored < original
+    assert nb.cells[0].outputs[0]["text"] == "x" * 100
+    assert "removed" in nb.cells[0].outputs[-1]["text"]
+    assert nb.cells[1].outputs[0]["data"] == {"text/plain": "<Figure>"}
+    with pytest.raises(ValidationError):
+        OutputPolicyData(action="other")
+
+
+def test_executors_output_policy_externalize(tmp_path):
+    path = _executed(tmp_path)
+    stored = {}
+
+    def store(name, data):
+        stored[name] = data
+        return f"outputs/objects/execid/{name}"
+
+    policy = OutputPolicyData(
+        max_cell_bytes=1000, action="externalize", externalize_images=True
+    )
+    apply_output_policy(path, policy, store)
+    nb = nbformat.read(path, 4)
+    dropped = OutputPolicyData(max_cell_bytes=10, action="drop")
+    apply_output_policy(path, dropped)
+    empty = nbformat.read(path, 4)
+
+    assert stored == {"cell1.0.png": b"png" * 100}
+    assert nb.cells[0].outputs[0]["text"] == "x" * 500
+    assert "image/png" not in nb.cells[1].outputs[0]["data"]
+    assert nb.cells[1].outputs[0].metadata.labfunctions == {
+        "image/png": "outputs/objects/execid/cell1.0.png"
+    }
+    assert "dropped" in empty.cells[0].outputs[0]["text"]
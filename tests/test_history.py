@@ -1,11 +1,15 @@
 import pytest
 from pytest_mock import MockerFixture
 
+from labfunctions import defaults
 from labfunctions.defaults import API_VERSION
+from labfunctions.hashes import generate_random
 from labfunctions.managers import history_mg
 from labfunctions.managers.history_mg import HistoryLastResponse
 from labfunctions.models import HistoryModel
 from labfunctions.types import HistoryLastResponse
+from labfunctions.types.docker import DockerStatsSummary
+from labfunctions.utils import today_string
 
 from .factories import (
     ExecutionResultFactory,
@@ -114,3 +118,160 @@ async def test_history_mg_create(async_session):
     assert isinstance(model_ok, HistoryModel)
     assert model_err.status == -1
     assert model_ok.status == 0
+
+
+@pytest.mark.asyncio
+async def test_history_mg_set_resources(async_session):
+    exec_ok = ExecutionResultFactory(error=False)
+    resources = DockerStatsSummary(samples=1, mem_peak=10)
+    model = await history_mg.create(async_session, exec_ok)
+
+    ok = await history_mg.set_resources(
+        async_session, exec_ok.projectid, exec_ok.execid, resources
+    )
+    not_found = await history_mg.set_resources(
+        async_session, exec_ok.projectid, "not-exist", resources
+    )
+
+    assert ok
+    assert not not_found
+    assert model.result["resources"]["mem_peak"] == 10
+
+
+@pytest.mark.asyncio
+async def test_history_mg_attempts(async_session):
+    first = ExecutionResultFactory(error=True, attempt=1)
+    second = first.copy(update=dict(error=False, attempt=2))
+    resources = DockerStatsSummary(samples=1, mem_peak=10)
+    model_first = await history_mg.create(async_session, first)
+    model_second = await history_mg.create(async_session, second)
+
+    ok = await history_mg.set_resources(
+        async_session, first.projectid, first.execid, resources
+    )
+    last = await history_mg.get_one(async_session, first.execid)
+
+    assert ok
+    assert last.status == 0
+    assert last.result.attempt == 2
+    assert model_second.result["resources"]["mem_peak"] == 10
+    assert model_first.result["resources"] is None
+
+
+@pytest.mark.asyncio
+async def test_history_bp_output_stream(sanic_app, access_token):
+    headers = {"Authorization": f"Bearer {access_token}"}
+    req, res = await sanic_app.asgi_client.post(
+        f"{version}/history/test/_output",
+        params=dict(output_name="test.ipynb", error="true", encoding="gzip"),
+        content=b"compressed",
+        headers=headers,
+    )
+    req, res_bad = await sanic_app.asgi_client.post(
+        f"{version}/history/test/_output",
+        params=dict(output_name="test.ipynb", encoding="zip"),
+        content=b"compressed",
+        headers=headers,
+    )
+    kv = sanic_app.ctx.kv_store
+    today = today_string(format_="day")
+    stored = await kv.get(f"test/{defaults.NB_OUTPUTS}/errors/{today}/test.ipynb.gz")
+
+    assert res.status_code == 201
+    assert res_bad.status_code == 400
+    assert stored == b"compressed"
+
+
+@pytest.mark.asyncio
+async def test_history_bp_params(sanic_app, access_token):
+    headers = {"Authorization": f"Bearer {access_token}"}
+    params = {"DATA": "x" * 100}
+    req, res = await sanic_app.asgi_client.post(
+        f"{version}/history/test/_params/execid-test", json=params, headers=headers
+    )
+    key = res.json["key"]
+    req, res_get = await sanic_app.asgi_client.get(
+        f"{version}/history/test/_params", params=dict(key=key), headers=headers
+    )
+    req, res_other = await sanic_app.asgi_client.get(
+        f"{version}/history/other/_params", params=dict(key=key), headers=headers
+    )
+
+    assert res.status_code == 201
+    assert res_get.status_code == 200
+    assert res_get.json == params
+    assert res_other.status_code == 404
+
+
+@pytest.mark.asyncio
+async def test_history_bp_checkpoint(sanic_app, access_token):
+    headers = {"Authorization": f"Bearer {access_token}"}
+    execid = f"execid-{generate_random()}"
+    req, res_404 = await sanic_app.asgi_client.get(
+        f"{version}/history/test/_checkpoint/{execid}", headers=headers
+    )
+    req, res = await sanic_app.asgi_client.post(
+        f"{version}/history/test/_checkpoint/{execid}",
+        content=b"checkpoint",
+        headers=headers,
+    )
+    req, res_get = await sanic_app.asgi_client.get(
+        f"{version}/history/test/_checkpoint/{execid}", headers=headers
+    )
+
+    assert res_404.status_code == 404
+    assert res.status_code == 201
+    assert res_get.status_code == 200
+    assert res_get.content == b"checkpoint"
+
+
+@pytest.mark.asyncio
+async def test_history_bp_output_object(sanic_app, access_token):
+    headers = {"Authorization": f"Bearer {access_token}"}
+    execid = f"execid-{generate_random()}"
+    req, res = await sanic_app.asgi_client.post(
+        f"{version}/history/test/_output_object/{execid}",
+        params=dict(name="cell1.0.png"),
+        content=b"image",
+        headers=headers,
+    )
+    uri = res.json["uri"]
+    req, res_get = await sanic_app.asgi_client.get(
+        f"{version}/history/test/_get_output",
+        params=dict(file=uri),
+        headers=headers,
+    )
+    req, res_400 = await sanic_app.asgi_client.post(
+        f"{version}/history/test/_output_object/{execid}",
+        content=b"image",
+        headers=headers,
+    )
+
+    assert res.status_code == 201
+    assert uri == f"outputs/objects/{execid}/cell1.0.png"
+    assert res_get.content == b"image"
+    assert res_400.status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_history_bp_set_resources(sanic_app, access_token, mocker: MockerFixture):
+    set_resources = mocker.patch(
+        "labfunctions.web.history_bp.history_mg.set_resources",
+        side_effect=[True, False],
+    )
+    headers = {"Authorization": f"Bearer {access_token}"}
+    resources = DockerStatsSummary(samples=1, mem_peak=10)
+    req, res = await sanic_app.asgi_client.post(
+        f"{version}/history/test/detail/execid-test/_resources",
+        json=resources.dict(),
+        headers=headers,
+    )
+    req, res_404 = await sanic_app.asgi_client.post(
+        f"{version}/history/test/detail/execid-other/_resources",
+        json=resources.dict(),
+        headers=headers,
+    )
+
+    assert res.status_code == 204
+    assert res_404.status_code == 404
+    assert set_resources.call_args_list[0].args[3] == resources
@@ -3,8 +3,19 @@ from io import BytesIO
 
 import pytest
 
+from labfunctions.io.kv_cached import CachedKV
+from labfunctions.io.kv_files import AsyncKVFiles, KVFiles
 from labfunctions.io.kv_local import AsyncKVLocal, KVLocal
-from labfunctions.io.kvspec import AsyncKVSpec, GenericKVSpec
+from labfunctions.io.kvspec import (
+    AsyncKVSpec,
+    GenericKVSpec,
+    KeyReadError,
+    KVPage,
+    parts_of,
+    walk_keys,
+)
+
+from .resources import FileserverHandler
 
 
 def write_stream():
@@ -63,3 +74,280 @@ async def test_io_kv_local_async_stream_rw():
         value = obj.getvalue().decode()
 
     assert "0" in value
+
+
+def test_io_kv_files_pooled(fileserver):
+    kv = KVFiles("test", dict(url=fileserver, backoff=0))
+    for x in range(5):
+        kv.put(f"obj{x}", b"hello world")
+    FileserverHandler.unavailable.add("/test/obj0")
+    res = kv.get("obj0")
+    missing = kv.get("missing")
+    kv.close()
+
+    assert res == b"hello world"
+    assert missing is None
+    assert FileserverHandler.connections == 1
+
+
+def test_io_kv_files_retries(fileserver):
+    kv = KVFiles("test", dict(url=fileserver, backoff=0, retries=0))
+    FileserverHandler.unavailable.add("/test/obj")
+
+    ok = kv.put("obj", b"hello world")
+
+    assert not ok
+
+
+@pytest.mark.asyncio
+async def test_io_kv_files_async_pooled(fileserver):
+    kv = AsyncKVFiles("test", dict(url=fileserver, backoff=0))
+    FileserverHandler.unavailable.add("/test/obj")
+    ok = await kv.put("obj", b"hello world")
+    res = await kv.get("obj")
+    chunks = [c async for c in kv.get_stream("obj")]
+    await kv.close()
+
+    assert ok
+    assert res == b"hello world"
+    assert b"".join(chunks) == b"hello world"
+    assert FileserverHandler.connections == 1
+
+
+class PartsKVLocal(KVLocal):
+    """Parts are uploaded as objects and joined at the end"""
+
+    parallel_put = True
+
+    def put_part(self, key, index, bdata):
+        self.put(f"{key}.parts/{index}", bdata)
+        return True
+
+    def compose_parts(self, key, total):
+        parts = (self.get(f"{key}.parts/{i}") for i in range(total))
+        return self.put_stream(key, parts)
+
+
+def test_io_kv_parts_of():
+    parts = list(parts_of(iter([b"abc", b"defgh", b"i"]), 4))
+
+    assert parts == [b"abcd", b"efgh", b"i"]
+
+
+def test_io_kv_parallel(tempdir):
+    data = bytes(range(256)) * 40
+    kv = PartsKVLocal(tempdir)
+    fallback = KVLocal(tempdir)
+
+    ok = kv.put_parallel("big", iter([data[:1000], data[1000:]]), part_size=1024)
+    kv.put_parallel("small", iter([b"hello"]), part_size=1024)
+    fallback.put_parallel("other", iter([data]), part_size=1024)
+    parts = list(kv.get_parallel("big", part_size=1024, concurrency=3))
+
+    assert ok
+    assert len(parts) == 10
+    assert b"".join(parts) == data
+    assert kv.get("small") == b"hello"
+    assert fallback.get("other") == data
+
+
+def test_io_kv_files_parallel(fileserver):
+    data = bytes(range(256)) * 40
+    kv = KVFiles("test", dict(url=fileserver, part_size=1024, concurrency=4))
+    kv.put_parallel("big", iter([data]))
+
+    parts = list(kv.get_parallel("big"))
+    kv.close()
+
+    assert len(parts) == 10
+    assert b"".join(parts) == data
+
+
+@pytest.mark.asyncio
+async def test_io_kv_parallel_async(fileserver, tempdir):
+    data = bytes(range(256)) * 40
+    kv = AsyncKVFiles("test", dict(url=fileserver, part_size=1024))
+    local = AsyncKVLocal(tempdir, dict(part_size=1024))
+    await kv.put("big", data)
+    await local.put("big", data)
+
+    parts = [p async for p in kv.get_parallel("big", concurrency=3)]
+    local_parts = [p async for p in local.get_parallel("big")]
+    await kv.close()
+
+    assert len(parts) == 10
+    assert b"".join(parts) == data
+    assert b"".join(local_parts) == data
+
+
+@pytest.mark.asyncio
+async def test_io_kv_gcs_async_stream(mocker):
+    from labfunctions.io.kv_gcs import AsyncKVGS
+
+    sync_kv = mocker.MagicMock()
+    sync_kv.get_stream.return_value = (str(x).encode() for x in range(10))
+    kv = AsyncKVGS.__new__(AsyncKVGS)
+    kv._opts = dict(read_ahead=2)
+    kv.client = sync_kv
+
+    chunks = [c async for c in kv.get_stream("test")]
+
+    assert chunks == [str(x).encode() for x in range(10)]
+
+
+def test_io_kv_cached(tempdir, monkeypatch):
+    monkeypatch.setenv("LF_EXT_KV_LOCAL_ROOT", f"{tempdir}/remote")
+    opts = dict(
+        backend="labfunctions.io.kv_local.KVLocal",
+        cache_dir=f"{tempdir}/cache",
+        max_bytes=250,
+    )
+    kv = GenericKVSpec.create("labfunctions.io.kv_cached.CachedKV", "test", opts)
+    other = CachedKV("test", opts)
+    kv.put("a", b"a" * 100)
+    kv.put("b", b"b" * 100)
+
+    first = kv.get("a")
+    streamed = b"".join(other.get_stream("a"))
+    kv.get("b")
+    kv.put("b", b"B" * 100)
+    changed = kv.get("b")
+    stats = kv.get_stats()
+    with pytest.raises(KeyReadError):
+        kv.get("missing")
+
+    assert first == b"a" * 100
+    assert streamed == first
+    assert changed == b"B" * 100
+    assert other.stats.hits == 1
+    assert kv.stats.misses == 3
+    # "a" was the least recently used
+    assert kv.stats.evictions == 1
+    assert not kv._path("a", kv.etag("a")).exists()
+    assert stats["entries"] == 2
+    assert stats["bytes"] == 200
+    with pytest.raises(ValueError):
+        CachedKV("test", dict(cache_dir=f"{tempdir}/cache"))
+
+
+def test_io_kv_walk_keys():
+    tree = {
+        "": [("b", False), ("a", True), ("a.c", False)],
+        "a/": [("z", False), ("b", True)],
+        "a/b/": [("c", False)],
+    }
+    listed = []
+
+    def listdir(dirpath):
+        listed.append(dirpath)
+        return tree.get(dirpath, [])
+
+    keys = list(walk_keys(listdir))
+    listed.clear()
+    after = list(walk_keys(listdir, start_after="a/z"))
+    prefixed = list(walk_keys(listdir, prefix="a/b"))
+
+    assert keys == ["a.c", "a/b/c", "a/z", "b"]
+    assert after == ["b"]
+    # "a/b/" only has keys before "a/z"
+    assert "a/b/" not in listed[:2]
+    assert prefixed == ["a/b/c"]
+
+
+def test_io_kv_local_list_stat_delete(tempdir):
+    kv = KVLocal(tempdir)
+    written = kv.put_many({f"p/{i}": str(i).encode() for i in range(5)})
+    kv.put("other", b"x")
+
+    first = kv.list("p/", limit=2)
+    second = kv.list("p/", limit=2, cursor=first.cursor)
+    stat = kv.stat("p/1")
+    etag = kv.etag("p/1")
+    values = kv.get_many(["p/1", "missing"])
+    deleted = kv.delete_many(["p/0", "p/1", "missing"])
+
+    assert all(written.values())
+    assert first == KVPage(keys=["p/0", "p/1"], cursor="p/1")
+    assert second.keys == ["p/2", "p/3"]
+    assert list(kv.iter_keys()) == ["other", "p/2", "p/3", "p/4"]
+    assert stat.size == 1
+    assert stat.etag == etag
+    assert values == {"p/1": b"1", "missing": None}
+    assert deleted == 2
+    assert not kv.exists("p/0")
+    assert kv.stat("p/0") is None
+    assert kv.delete("p/0") is False
+
+
+def test_io_kv_files_list_stat_delete(fileserver):
+    kv = KVFiles("test_list", dict(url=fileserver, backoff=0))
+    kv.put_many({"a/1": b"1", "a/2": b"22", "a/b/3": b"3", "c": b"4"})
+
+    page = kv.list("a/", limit=2)
+    keys = list(kv.iter_keys())
+    stat = kv.stat("a/2")
+    deleted = kv.delete_many(["a/1", "missing"])
+    kv.close()
+
+    assert page == KVPage(keys=["a/1", "a/2"], cursor="a/2")
+    assert keys == ["a/1", "a/2", "a/b/3", "c"]
+    assert stat.size == 2
+    assert stat.mtime is not None
+    assert stat.etag
+    assert deleted == 1
+    assert "/test_list/a/1" not in FileserverHandler.data
+
+
+@pytest.mark.asyncio
+async def test_io_kv_files_async_list(fileserver):
+    kv = AsyncKVFiles("test_alist", dict(url=fileserver, backoff=0))
+    await kv.put_many({"a/1": b"1", "a/b/2": b"2", "c": b"3"})
+
+    page = await kv.list(limit=2)
+    keys = [k async for k in kv.iter_keys()]
+    values = await kv.get_many(["a/1", "c", "missing"])
+    deleted = await kv.delete_many(["a/1", "c"])
+    exists = await kv.exists("a/b/2")
+    await kv.close()
+
+    assert page == KVPage(keys=["a/1", "a/b/2"], cursor="a/b/2")
+    assert keys == ["a/1", "a/b/2", "c"]
+    assert values == {"a/1": b"1", "c": b"3", "missing": None}
+    assert deleted == 2
+    assert exists
+
+
+def test_io_kv_gcs_list(mocker):
+    from labfunctions.io.kv_gcs import KVGS
+
+    blob = mocker.Mock()
+    blob.name = "p/a"
+    blobs = mocker.MagicMock()
+    blobs.pages = iter([[blob]])
+    blobs.next_page_token = "token"
+    kv = KVGS.__new__(KVGS)
+    kv.client = mocker.MagicMock()
+    kv.client.list_blobs.return_value = blobs
+    kv.bucket = mocker.MagicMock()
+
+    page = kv.list("p/", limit=1, cursor="prev")
+
+    kv.client.list_blobs.assert_called_once_with(
+        kv.bucket, prefix="p/", page_size=1, page_token="prev"
+    )
+    assert page == KVPage(keys=["p/a"], cursor="token")
+
+
+def test_io_kv_cached_delete(tempdir, monkeypatch):
+    monkeypatch.setenv("LF_EXT_KV_LOCAL_ROOT", f"{tempdir}/remote")
+    opts = dict(backend="labfunctions.io.kv_local.KVLocal", cache_dir=tempdir)
+    kv = CachedKV("test", opts)
+    kv.put("a", b"a")
+    kv.get("a")
+    path = kv.cached_path("a")
+
+    deleted = kv.delete("a")
+
+    assert deleted
+    assert not path.exists()
+    assert not kv.exists("a")
@@ -0,0 +1,207 @@
+import nbformat
+import papermill as pm
+import pytest
+from nbformat.v4 import new_code_cell, new_notebook
+
+from labfunctions import defaults
+from labfunctions.executors import kernels
+from labfunctions.executors.checkpoints import Checkpointer
+from labfunctions.executors.kernels import KernelPool
+from labfunctions.types import CheckpointData
+
+
+class FakeKernel:
+    def __init__(self, kernel_name, cwd, env=None):
+        self.kernel_name = kernel_name
+        self.cwd = cwd
+        self.env = env
+        self.runs = 0
+        self.scope = None
+        self.restarts = 0
+        self.closed = False
+
+    def is_alive(self):
+        return not self.closed
+
+    def restart(self):
+        self.restarts += 1
+
+    def close(self):
+        self.closed = True
+
+
+def _pool(**kwargs):
+    return KernelPool(kernel_cls=FakeKernel, **kwargs)
+
+
+def test_kernels_pool_reuse():
+    pool = _pool(size=1)
+    pool.warm()
+    first = pool.acquire("python3")
+    second = pool.acquire("python3")
+    pool.release(first)
+    pool.release(second)
+    third = pool.acquire("python3")
+
+    assert third is first
+    assert second.closed
+    assert pool.stats.hits == 2
+    assert pool.stats.misses == 1
+    assert pool.get_stats()["hit_rate"] == 0.667
+
+
+def test_kernels_pool_recycle():
+    pool = _pool(size=2, max_runs=2, reset="restart")
+    pk = pool.acquire("python3")
+    pool.release(pk)
+    restarts = pk.restarts
+    pool.acquire("python3")
+    pool.release(pk)
+    failed = pool.acquire("python3")
+    pool.release(failed, ok=False)
+
+    assert restarts == 1
+    assert pk.closed and failed.closed
+    assert pool.stats.recycled == 2
+    assert len(pool) == 0
+    with pytest.raises(ValueError):
+        _pool(reset="other")
+
+
+def test_kernels_pool_scopes():
+    pool = _pool(size=2)
+    pool.warm()
+    first = pool.acquire("python3", scope="p1")
+    pool.release(first)
+    other = pool.acquire("python3", scope="p2", env={"A": "1"})
+    pool.release(other)
+    again = pool.acquire("python3", scope="p1")
+    new = pool.acquire("python3", scope="p3", env={"A": "3"})
+
+    assert other is not first
+    assert again is first
+    assert new is not other
+    assert new.env == {"A": "3"}
+    assert pool.stats.misses == 1
+
+
+def test_kernels_engine_env(tempdir, monkeypatch):
+    nb = new_notebook(
+        cells=[new_code_cell("import os\nprint(os.environ.get('LF_TEST_VALUE'))")]
+    )
+    nb.metadata["kernelspec"] = {"name": "python3", "language": "python"}
+    input_ = f"{tempdir}/input.ipynb"
+    nbformat.write(nb, input_)
+    kernels.init_kernel_pool(cwd=tempdir, warm=False)
+    pids = []
+    outputs = []
+    try:
+        for key, value in (("key1", "a"), ("key1", "b"), ("key2", "c")):
+            monkeypatch.setenv(defaults.PRIVKEY_VAR_NAME, key)
+            monkeypatch.setenv("LF_TEST_VALUE", value)
+            pm.execute_notebook(
+                input_,
+                f"{tempdir}/output.ipynb",
+                engine_name=defaults.KERNEL_POOL_ENGINE,
+                on_kernel=pids.append,
+                progress_bar=False,
+            )
+            out = nbformat.read(f"{tempdir}/output.ipynb", 4)
+            outputs.append(out.cells[-1].outputs[0]["text"].strip())
+    finally:
+        kernels.close_kernel_pool()
+
+    assert outputs == ["a", "b", "c"]
+    # other private key, other kernel
+    assert pids[0] == pids[1] != pids[2]
+
+
+def test_kernels_engine(tempdir):
+    nb = new_notebook(
+        cells=[
+            new_code_cell("X = 0", metadata={"tags": ["parameters"]}),
+            new_code_cell("print(globals().get('LEAK'), X)\nLEAK = X"),
+        ]
+    )
+    nb.metadata["kernelspec"] = {"name": "python3", "language": "python"}
+    input_ = f"{tempdir}/input.ipynb"
+    nbformat.write(nb, input_)
+    pool = kernels.init_kernel_pool(cwd=tempdir)
+    pids = []
+    outputs = []
+    try:
+        for x in range(2):
+            pm.execute_notebook(
+                input_,
+                f"{tempdir}/output.ipynb",
+                parameters={"X": x},
+                engine_name=defaults.KERNEL_POOL_ENGINE,
+                on_kernel=pids.append,
+                progress_bar=False,
+            )
+            out = nbformat.read(f"{tempdir}/output.ipynb", 4)
+            outputs.append(out.cells[-1].outputs[0]["text"].strip())
+    finally:
+        kernels.close_kernel_pool()
+
+    assert outputs == ["None 0", "None 1"]
+    assert pids[0] == pids[1]
+    assert pool.stats.hits == 2
+    assert kernels.get_kernel_pool() is None
+
+
+def test_kernels_checkpoints(tempdir):
+    flag = f"{tempdir}/flag"
+    nb = new_notebook(
+        cells=[
+            new_code_cell("X = 0", metadata={"tags": ["parameters"]}),
+            new_code_cell("RUNS = X + 1", metadata={"tags": ["checkpoint"]}),
+            new_code_cell(f"import os\nassert os.path.exists({flag!r})\nY = RUNS"),
+        ]
+    )
+    nb.metadata["kernelspec"] = {"name": "python3", "language": "python"}
+    input_ = f"{tempdir}/input.ipynb"
+    output = f"{tempdir}/output.ipynb"
+    nbformat.write(nb, input_)
+    stored = {}
+
+    def load(fp):
+        if "data" not in stored:
+            return False
+        with open(fp, "wb") as f:
+            f.write(stored["data"])
+        return True
+
+    def store(fp):
+        with open(fp, "rb") as f:
+            stored["data"] = f.read()
+        return True
+
+    first = Checkpointer(CheckpointData(), load=load, store=store)
+    with pytest.raises(pm.PapermillExecutionError):
+        pm.execute_notebook(
+            input_,
+            output,
+            parameters={"X": 1},
+            engine_name=defaults.CHECKPOINT_ENGINE,
+            checkpointer=first,
+            progress_bar=False,
+        )
+    open(flag, "w").close()
+    retry = Checkpointer(CheckpointData(), load=load, store=store)
+    pm.execute_notebook(
+        input_,
+        output,
+        parameters={"X": 1},
+        engine_name=defaults.CHECKPOINT_ENGINE,
+        checkpointer=retry,
+        progress_bar=False,
+    )
+    out = nbformat.read(output, 4)
+
+    assert first.saved == 1
+    assert first.resumed_from is None
+    # the cell injected by papermill moves the checkpoint cell to index 2
+    assert retry.resumed_from == 2
+    assert out.cells[2].get("outputs") == []
+    assert out.cells[3].metadata.papermill.status == "completed"
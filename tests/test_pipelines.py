@@ -0,0 +1,132 @@
+import pytest
+from pydantic.error_wrappers import ValidationError
+from pytest_mock import MockerFixture
+from rq import Queue
+
+from labfunctions import scheduler
+from labfunctions.notebooks import pipelines
+from labfunctions.types import PipelineData, PipelineNode
+
+from .factories import ExecutionNBTaskFactory, ExecutionResultFactory
+
+
+def _diamond() -> PipelineData:
+    return PipelineData(
+        nodes=[
+            PipelineNode(name="a", nb_name="nb-a"),
+            PipelineNode(name="b", nb_name="nb-b", needs=["a"]),
+            PipelineNode(name="c", nb_name="nb-c", needs=["a"], machine="gpu"),
+            PipelineNode(name="d", nb_name="nb-d", needs=["b", "c"]),
+        ]
+    )
+
+
+def _start(redis, pipeline):
+    parent = ExecutionNBTaskFactory(runtime="test")
+    ctxs = {n.name: pipelines.node_ctx(parent, n) for n in pipeline.nodes}
+    store = pipelines.Pipelines(redis)
+    ready = store.start(parent, pipeline, ctxs, "control")
+    return parent, store, ready
+
+
+def test_pipelines_validation():
+    node = PipelineNode(name="a", nb_name="nb-a")
+    with pytest.raises(ValidationError):
+        PipelineData(nodes=[node, node])
+    with pytest.raises(ValidationError):
+        PipelineData(nodes=[PipelineNode(name="a", nb_name="a", needs=["x"])])
+    with pytest.raises(ValidationError):
+        PipelineData(
+            nodes=[
+                PipelineNode(name="a", nb_name="a", needs=["b"]),
+                PipelineNode(name="b", nb_name="b", needs=["a"]),
+            ]
+        )
+
+
+def test_pipelines_node_ctx():
+    parent = ExecutionNBTaskFactory(runtime="test")
+    node = PipelineNode(name="b", nb_name="nb-b", params={"TIMEOUT": 1}, machine="gpu")
+    ctx = pipelines.node_ctx(parent, node, execid="node-b")
+
+    assert ctx.node == "b"
+    assert ctx.parentid == parent.execid
+    assert ctx.nb_name == "nb-b"
+    assert ctx.pm_input.endswith("nb-b.ipynb")
+    assert ctx.params["TIMEOUT"] == 1
+    assert ctx.params["EXECID"] == "node-b"
+    assert ctx.machine == "gpu"
+    assert ctx.runtime == parent.runtime
+
+
+def test_pipelines_flow(redis):
+    parent, store, ready = _start(redis, _diamond())
+    runid = parent.execid
+
+    after_a, _ = store.finish(runid, "a", elapsed=1.0)
+    after_b, _ = store.finish(runid, "b", elapsed=1.0)
+    after_c, _ = store.finish(runid, "c", elapsed=2.0)
+    _, finished = store.finish(runid, "d", elapsed=1.0)
+    _, run = store.summary(runid)
+
+    assert [c.node for c in ready] == ["a"]
+    assert sorted(c.node for c in after_a) == ["b", "c"]
+    assert after_b == []
+    assert [c.node for c in after_c] == ["d"]
+    assert finished
+    assert run.critical_path == ["a", "c", "d"]
+    assert all(n.status == pipelines.OK for n in run.nodes)
+
+
+def test_pipelines_fail(redis):
+    pipeline = PipelineData(
+        nodes=[
+            PipelineNode(name="a", nb_name="nb-a"),
+            PipelineNode(name="b", nb_name="nb-b", needs=["a"]),
+            PipelineNode(name="c", nb_name="nb-c", needs=["b"]),
+            PipelineNode(name="x", nb_name="nb-x"),
+        ]
+    )
+    parent, store, ready = _start(redis, pipeline)
+    runid = parent.execid
+
+    _, fin_a = store.finish(runid, "a")
+    _, fin_b = store.finish(runid, "b", error=True)
+    _, fin_x = store.finish(runid, "x")
+
+    assert len(ready) == 2
+    assert not fin_a and not fin_b
+    assert fin_x
+    assert store.get_state(runid, "b").status == pipelines.FAILED
+    assert store.get_state(runid, "c").status == pipelines.SKIPPED
+
+
+def test_pipelines_scheduler(mocker: MockerFixture, redis):
+    se = scheduler.SchedulerExecutor(redis, qname="test-pipe", is_async=True)
+    parent = ExecutionNBTaskFactory(runtime="test", cluster="cl", machine="cpu")
+    pipeline = PipelineData(
+        nodes=[
+            PipelineNode(name="a", nb_name="nb-a"),
+            PipelineNode(name="b", nb_name="nb-b", needs=["a"], machine="gpu"),
+        ]
+    )
+    for q in ("cl.cpu", "cl.gpu"):
+        Queue(q, connection=redis).empty()
+    se.Q.empty()
+
+    jobs = se.enqueue_pipeline(parent, pipeline)
+    pipelines.node_ok(jobs[0], redis, ExecutionResultFactory(error=False))
+    job_b = Queue("cl.gpu", connection=redis).jobs[0]
+    pipelines.node_ok(job_b, redis, ExecutionResultFactory(error=False))
+
+    create = mocker.patch("labfunctions.scheduler.history_mg.create_sync")
+    scheduler.pipeline_finished(parent.execid, redis_obj=redis, db=mocker.MagicMock())
+    result = create.call_args.args[1]
+
+    assert len(jobs) == 1
+    assert job_b.args[0].node == "b"
+    assert se.Q.count == 1
+    assert se.Q.jobs[0].func_name == "labfunctions.scheduler.pipeline_finished"
+    assert result.execid == parent.execid
+    assert result.pipeline.critical_path == ["a", "b"]
+    assert not result.error
@@ -0,0 +1,169 @@
+import io
+import json
+import os
+import time
+
+from pytest_mock import MockerFixture
+
+from labfunctions import defaults
+from labfunctions.executors import pool as pool_mod
+from labfunctions.executors import warm_exec
+from labfunctions.executors.nbtask_base import NBTaskDocker
+from labfunctions.executors.pool import ContainerPool
+from labfunctions.types.docker import DockerRunResult
+
+from .factories import ExecutionNBTaskFactory, ExecutionResultFactory
+
+
+class FakeContainer:
+    def __init__(self, docker_client, image, projectid, require_gpu=False):
+        self.image = image
+        self.projectid = projectid
+        self.require_gpu = require_gpu
+        self.runs = 0
+        self.mem_kb = 0
+        self.last_used = time.time()
+        self.closed = False
+        self.fail = False
+
+    def run(self, env, timeout):
+        self.runs += 1
+        if self.fail:
+            raise TimeoutError()
+        return DockerRunResult(msg="ok", status=0)
+
+    def is_alive(self):
+        return not self.closed
+
+    def close(self):
+        self.closed = True
+
+
+def _pool(**kwargs):
+    return ContainerPool(docker_client=object(), container_cls=FakeContainer, **kwargs)
+
+
+def test_pool_reuse():
+    pool = _pool()
+    first = pool.acquire("img:1", "prj")
+    pool.release(first)
+    second = pool.acquire("img:1", "prj")
+    other = pool.acquire("img:2", "prj")
+    pool.release(second)
+    other_project = pool.acquire("img:1", "prj2")
+
+    assert first is second
+    assert other is not first
+    assert other_project is not first
+    assert pool.stats.hits == 1
+    assert pool.stats.misses == 3
+
+
+def test_pool_recycle():
+    pool = _pool(max_runs=2, max_mem_mb=1, max_idle=1)
+    wc = pool.acquire("img", "prj")
+    wc.runs = 2
+    pool.release(wc)
+    mem = pool.acquire("img", "prj")
+    mem.mem_kb = 2048
+    pool.release(mem)
+    a, b = pool.acquire("img", "prj"), pool.acquire("img", "prj")
+    pool.release(a)
+    pool.release(b)
+
+    assert wc.closed and mem.closed
+    assert pool.stats.recycled == 2
+    assert len(pool) == 1
+    assert b.closed
+
+
+def test_pool_reap_and_errors():
+    pool = _pool(idle_secs=10)
+    wc = pool.acquire("img", "prj")
+    pool.release(wc)
+    pool.reap(now=wc.last_used + 11)
+
+    rsp = pool.run("img", "prj", {}, timeout=1)
+    failing = pool.acquire("img", "prj")
+    failing.fail = True
+    pool.release(failing)
+    rsp_fail = pool.run("img", "prj", {}, timeout=1)
+
+    assert wc.closed
+    assert rsp.status == 0
+    assert rsp_fail.status == -1
+    assert failing.closed
+    assert len(pool) == 0
+
+
+def test_pool_serve(mocker: MockerFixture):
+    results = [ExecutionResultFactory(error=False), ExecutionResultFactory(error=True)]
+    mocker.patch("labfunctions.executors.warm_exec.local_exec_env", side_effect=results)
+    input_ = io.StringIO(
+        json.dumps(dict(env={"LF_TEST": "1"}))
+        + "\n\n"
+        + json.dumps(dict(env={}))
+        + "\n"
+    )
+    output = io.StringIO()
+
+    warm_exec.serve(input_, output)
+    lines = output.getvalue().splitlines()
+    rsps = [json.loads(line[len(defaults.WARM_POOL_MARKER) :]) for line in lines]
+
+    assert len(rsps) == 2
+    assert rsps[0]["status"] == 0
+    assert rsps[1]["status"] == 1
+    assert rsps[0]["mem_kb"] > 0
+
+
+def test_pool_serve_restores_env(mocker: MockerFixture):
+    seen = []
+
+    def local_exec_env():
+        seen.append(os.environ.get("LF_TEST_KEY"))
+        return ExecutionResultFactory(error=False)
+
+    mocker.patch(
+        "labfunctions.executors.warm_exec.local_exec_env", side_effect=local_exec_env
+    )
+    reqs = [dict(env={"LF_TEST_KEY": "project1"}), dict(env={})]
+    input_ = io.StringIO("".join(json.dumps(r) + "\n" for r in reqs))
+
+    warm_exec.serve(input_, io.StringIO())
+
+    assert seen == ["project1", None]
+    assert "LF_TEST_KEY" not in os.environ
+
+
+def test_pool_used_by_nbtask(mocker: MockerFixture):
+    task = NBTaskDocker(mocker.MagicMock())
+    mocker.patch.object(task, "build_env", return_value={})
+    mocker.patch.object(task, "agent_env", return_value={})
+    docker_cmd = mocker.patch("labfunctions.executors.nbtask_base.DockerCommand")
+    # a new pool is empty
+    pool_mod.init_pool(docker_client=object(), container_cls=FakeContainer)
+    try:
+        result = task.run(ExecutionNBTaskFactory(runtime="test:1"))
+    finally:
+        pool_mod.close_pool()
+
+    assert not result.error
+    docker_cmd.assert_not_called()
+
+
+def test_pool_memory_kb(mocker: MockerFixture, tmp_path):
+    usage = tmp_path / "memory.current"
+    usage.write_text(f"{10 * 1024 * 1024}\n")
+    stat = tmp_path / "memory.stat"
+    stat.write_text(f"anon 1\ninactive_file {2 * 1024 * 1024}\n")
+    mocker.patch(
+        "labfunctions.executors.warm_exec._CGROUP_MEM",
+        ((str(usage), str(stat), "inactive_file"),),
+    )
+    mem_kb = warm_exec.memory_kb()
+    mocker.patch("labfunctions.executors.warm_exec._CGROUP_MEM", ())
+
+    assert mem_kb == 8 * 1024
+    # without cgroup, the memory of this process and its children
+    assert warm_exec.memory_kb() > 0
@@ -0,0 +1,111 @@
+from pytest_mock import MockerFixture
+
+from labfunctions import scheduler
+from labfunctions.hashes import generate_random
+from labfunctions.notebooks.results_cache import ResultsCache, cache_key, cache_result
+from labfunctions.notebooks.templates import create_template
+from labfunctions.types import ResultsCacheData
+
+from .factories import ExecutionNBTaskFactory, ExecutionResultFactory, NBTaskFactory
+
+
+def test_results_cache_key():
+    ctx = ExecutionNBTaskFactory(runtime="test:1", params={"A": 1, "EXECID": "x"})
+    same = ctx.copy(update=dict(params={"A": 1, "EXECID": "y", "NOW": "z"}))
+    other_params = ctx.copy(update=dict(params={"A": 2}))
+    other_runtime = ctx.copy(update=dict(runtime="test:2"))
+    other_project = ctx.copy(update=dict(projectid="other"))
+
+    assert cache_key(ctx, "sha256:1") == cache_key(same, "sha256:1")
+    assert cache_key(ctx, "sha256:1") != cache_key(other_params, "sha256:1")
+    assert cache_key(ctx, "sha256:1") != cache_key(other_runtime, "sha256:1")
+    assert cache_key(ctx, "sha256:1") != cache_key(other_project, "sha256:1")
+    assert cache_key(ctx, "sha256:1") != cache_key(ctx, "sha256:2")
+
+
+def test_results_cache_lookup(mocker: MockerFixture, redis):
+    cache = ResultsCache(redis)
+    ctx = ExecutionNBTaskFactory(runtime="test:1", params={"RUN": generate_random()})
+    ctx.cache_key = cache_key(ctx, "sha256:1")
+    job = mocker.MagicMock(args=[ctx])
+
+    miss = cache.lookup(ctx)
+    cache_result(job, redis, ExecutionResultFactory(error=True))
+    miss_error = cache.lookup(ctx)
+    cache_result(job, redis, ExecutionResultFactory(execid="first", error=False))
+    new_ctx = ctx.copy(update=dict(execid="second"))
+    hit = cache.lookup(new_ctx)
+    stats = cache.stats(ctx.projectid, ctx.wfid)
+
+    assert miss is None
+    assert miss_error is None
+    assert hit.execid == "second"
+    assert hit.cached_from == "first"
+    assert stats.hits == 1
+    assert stats.misses == 2
+
+
+def test_results_cache_lookup_projects(redis):
+    cache = ResultsCache(redis)
+    ctx = ExecutionNBTaskFactory(
+        projectid="prj-a", runtime="test:1", params={"RUN": generate_random()}
+    )
+    ctx.cache_key = cache_key(ctx, "sha256:1")
+    cache.put(ctx.cache_key, ExecutionResultFactory(projectid="prj-a", execid="a"))
+    # another project with the same notebook, image and params
+    other = ctx.copy(update=dict(projectid="prj-b", wfid="wfid-b", execid="b"))
+    other.cache_key = cache_key(other, "sha256:1")
+    miss = cache.lookup(other)
+    # the same key used by another workflow
+    shared = other.copy(update=dict(cache_key=ctx.cache_key))
+    hit = cache.lookup(shared)
+
+    assert miss is None
+    assert hit.projectid == "prj-b"
+    assert hit.wfid == "wfid-b"
+    assert hit.name == shared.nb_name
+    assert hit.cached_from == "a"
+
+
+def test_results_cache_dispatcher(mocker: MockerFixture, redis):
+    task = NBTaskFactory(
+        params={"RUN": generate_random()}, cache=ResultsCacheData(ttl_secs=60)
+    )
+    tpl = create_template("test", "wfid-cache", task)
+    sche = scheduler.SchedulerExecutor(redis, qname="test", is_async=False)
+    sche.templates.put(tpl)
+    sche.results.set_digest(tpl.runtime, "sha256:1")
+    enqueue = mocker.patch.object(sche, "enqueue_notebook")
+    create = mocker.patch("labfunctions.scheduler.history_mg.create_sync")
+    mocker.patch("labfunctions.scheduler.SchedulerExecutor", return_value=sche)
+    db = mocker.MagicMock()
+
+    scheduler.scheduler_dispatcher("test", "wfid-cache", redis_obj=redis, db=db)
+    ctx = enqueue.call_args.args[0]
+    sche.results.put(ctx.cache_key, ExecutionResultFactory(execid=ctx.execid), 60)
+    scheduler.scheduler_dispatcher("test", "wfid-cache", redis_obj=redis, db=db)
+
+    assert ctx.cache_key == cache_key(ctx, "sha256:1")
+    assert ctx.cache_ttl == 60
+    assert enqueue.call_count == 1
+    assert create.call_args.args[1].cached_from == ctx.execid
+
+
+def test_results_cache_dispatcher_no_digest(mocker: MockerFixture, redis):
+    task = NBTaskFactory(
+        params={"RUN": generate_random()}, cache=ResultsCacheData(ttl_secs=60)
+    )
+    tpl = create_template("test", "wfid-nodigest", task)
+    sche = scheduler.SchedulerExecutor(redis, qname="test", is_async=False)
+    sche.templates.put(tpl)
+    redis.delete(sche.results.digest_key(tpl.runtime))
+    enqueue = mocker.patch.object(sche, "enqueue_notebook")
+    mocker.patch("labfunctions.scheduler.SchedulerExecutor", return_value=sche)
+
+    scheduler.scheduler_dispatcher(
+        "test", "wfid-nodigest", redis_obj=redis, db=mocker.MagicMock()
+    )
+    ctx = enqueue.call_args.args[0]
+
+    assert ctx.cache_key is None
+    assert sche.results.stats("test", "wfid-nodigest").misses == 0
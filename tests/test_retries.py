@@ -0,0 +1,60 @@
+from rq import Queue
+from rq.registry import ScheduledJobRegistry
+
+from labfunctions.hashes import generate_random
+from labfunctions.notebooks.retries import enqueue_retry, retry_delay, should_retry
+from labfunctions.notebooks.sweeps import child_ok
+from labfunctions.types import RetryData
+
+from .factories import ExecutionNBTaskFactory, ExecutionResultFactory
+
+
+def test_retries_delay():
+    conf = RetryData(backoff_secs=10, backoff_factor=2, max_backoff_secs=30, jitter=0.5)
+
+    delays = [retry_delay(conf, attempt, rand=lambda: 0) for attempt in (1, 2, 3)]
+    jitter = retry_delay(conf, 1, rand=lambda: 1)
+
+    assert delays == [10, 20, 30]
+    assert jitter == 15
+
+
+def test_retries_should_retry():
+    conf = RetryData(max_attempts=2)
+    codes = RetryData(on_exit_codes=[137], on_errors=["ConnectionError"])
+    oom = ExecutionResultFactory(error=True, exit_code=137)
+    conn = ExecutionResultFactory(error=True, exit_code=1, error_msg="ConnectionError")
+    other = ExecutionResultFactory(error=True, exit_code=1, error_msg="ValueError")
+
+    assert should_retry(conf, 1, other)
+    assert not should_retry(conf, 2, other)
+    assert not should_retry(conf, 1, ExecutionResultFactory(error=False))
+    assert should_retry(codes, 1, oom)
+    assert should_retry(codes, 1, conn)
+    assert not should_retry(codes, 1, other)
+
+
+def test_retries_enqueue(mocker, redis):
+    qname = f"test.{generate_random()}"
+    job = mocker.MagicMock(
+        origin=qname,
+        connection=redis,
+        meta={},
+        timeout=60,
+        success_callback=child_ok,
+        failure_callback=None,
+    )
+    ctx = ExecutionNBTaskFactory(runtime="test:1", retry=RetryData(max_attempts=2))
+    result = ExecutionResultFactory(execid=ctx.execid, error=True)
+
+    nxt = enqueue_retry(job, ctx, result)
+    last = enqueue_retry(job, nxt.args[0], result.copy(update=dict(retry_in=None)))
+    registry = ScheduledJobRegistry(qname, connection=redis)
+
+    assert nxt.args[0].attempt == 2
+    assert nxt.args[0].execid == ctx.execid
+    assert nxt.success_callback is child_ok
+    assert nxt.id in registry.get_job_ids()
+    assert len(Queue(qname, connection=redis)) == 0
+    assert result.retry_in >= ctx.retry.backoff_secs
+    assert last is None
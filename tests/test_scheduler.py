@@ -5,8 +5,14 @@ from rq.job import Job
 
 from labfunctions import scheduler
 from labfunctions.executors import ExecID
+from labfunctions.notebooks.templates import (
+    ExecutionTemplates,
+    create_template,
+    ctx_from_template,
+)
+from labfunctions.types.workflows import WFQueueReq
 
-from .factories import ExecutionNBTaskFactory, WorkflowDataFactory
+from .factories import ExecutionNBTaskFactory, NBTaskFactory, WorkflowDataFactory
 
 # from labfunctions.scheduler import control_q, firm_or_new, machine_q
 
@@ -93,3 +99,123 @@ def test_scheduler_SE_notebook(mocker: MockerFixture, redis):
     se = scheduler.SchedulerExecutor(redis, qname="test", is_async=False)
     job = se.enqueue_notebook(exec_ctx, qname="test")
     assert job.id == exec_ctx.execid
+
+
+def test_scheduler_dispatcher_resources(mocker: MockerFixture):
+
+    resources = scheduler.init_dispatcher_resources(is_async=False)
+    tpl = create_template("test", "test", NBTaskFactory())
+    resources.scheduler.templates.put(tpl)
+    enqueue = mocker.patch.object(resources.scheduler, "enqueue_notebook")
+    stats = resources.get_stats()
+
+    scheduler.scheduler_dispatcher("test", "test", is_async=False)
+    scheduler.scheduler_dispatcher("test", "test", is_async=False)
+    after = resources.get_stats()
+
+    assert scheduler.get_dispatcher_resources() is resources
+    assert enqueue.call_count == 2
+    assert after["setups"] == stats["setups"]
+    assert after["dispatches"] == stats["dispatches"] + 2
+
+
+def test_scheduler_dispatcher_resources_is_async(mocker: MockerFixture):
+
+    resources = scheduler.init_dispatcher_resources(is_async=False)
+    tpl = create_template("test", "test", NBTaskFactory())
+    resources.scheduler.templates.put(tpl)
+    shared = mocker.patch.object(resources.scheduler, "enqueue_notebook")
+    enqueue = mocker.patch.object(scheduler.SchedulerExecutor, "enqueue_notebook")
+
+    scheduler.scheduler_dispatcher("test", "test", is_async=True)
+
+    assert not shared.called
+    assert enqueue.call_count == 1
+
+
+def test_scheduler_templates(redis):
+    templates = ExecutionTemplates(redis)
+    tpl = create_template("test", "wfid-tpl", NBTaskFactory())
+    templates.put(tpl)
+    written = templates.refill(tpl, templates.version("test", "wfid-tpl"))
+
+    tpl_get = templates.get("test", "wfid-tpl")
+    ctx = ctx_from_template(tpl_get, "dsp.execid")
+    templates.invalidate("test", "wfid-tpl")
+    invalid = templates.get("test", "wfid-tpl")
+
+    templates.put(tpl)
+    templates.invalidate_project("test")
+
+    assert not written
+    assert tpl_get == tpl
+    assert ctx.execid == "dsp.execid"
+    assert ctx.wfid == "wfid-tpl"
+    assert ctx.params["EXECID"] == "dsp.execid"
+    assert invalid is None
+    assert templates.get("test", "wfid-tpl") is None
+
+
+def test_scheduler_templates_refill(redis):
+    templates = ExecutionTemplates(redis)
+    tpl = create_template("test", "wfid-refill", NBTaskFactory())
+
+    version = templates.version("test", "wfid-refill")
+    # the workflow is disabled while the dispatcher reads the database
+    templates.invalidate("test", "wfid-refill")
+    stale = templates.refill(tpl, version)
+
+    written = templates.refill(tpl, templates.version("test", "wfid-refill"))
+
+    assert not stale
+    assert written
+    assert templates.get("test", "wfid-refill") == tpl
+
+
+def test_scheduler_dispatcher_template(mocker: MockerFixture, redis):
+    tpl = create_template("test", "wfid-tpl", NBTaskFactory())
+    sche = scheduler.SchedulerExecutor(redis, qname="test", is_async=False)
+    sche.templates.put(tpl)
+    enqueue = mocker.patch.object(sche, "enqueue_notebook")
+    mocker.patch("labfunctions.scheduler.SchedulerExecutor", return_value=sche)
+    db = mocker.MagicMock()
+
+    scheduler.scheduler_dispatcher("test", "wfid-tpl", redis_obj=redis, db=db)
+
+    ctx = enqueue.call_args.args[0]
+    assert ctx.wfid == "wfid-tpl"
+    assert ctx.runtime == tpl.runtime
+    db.sessionmaker.return_value.assert_not_called()
+
+
+def test_scheduler_dispatcher_params(mocker: MockerFixture, redis):
+    tpl = create_template("test", "wfid-tpl", NBTaskFactory(params={"A": 1, "B": 2}))
+    sche = scheduler.SchedulerExecutor(redis, qname="test", is_async=False)
+    sche.templates.put(tpl)
+    enqueue = mocker.patch.object(sche, "enqueue_notebook")
+    mocker.patch("labfunctions.scheduler.SchedulerExecutor", return_value=sche)
+
+    scheduler.scheduler_dispatcher(
+        "test", "wfid-tpl", redis_obj=redis, db=mocker.MagicMock(), params={"B": 3}
+    )
+
+    ctx = enqueue.call_args.args[0]
+    assert ctx.params["A"] == 1
+    assert ctx.params["B"] == 3
+    assert tpl.nbtask.params["B"] == 2
+
+
+def test_scheduler_SEdispatcher_many(redis):
+    se = scheduler.SchedulerExecutor(redis, qname="test-many", is_async=True)
+    se.Q.empty()
+    workflows = [
+        WFQueueReq(wfid="wf1"),
+        WFQueueReq(wfid="wf2", params={"A": 1}),
+    ]
+    jobs = se.dispatcher_many("test", workflows)
+
+    assert len(jobs) == 2
+    assert se.Q.count == 2
+    assert jobs[0].args[1] == "wf1"
+    assert jobs[1].kwargs["params"] == {"A": 1}
+    assert jobs[0].id.startswith(f"{ExecID.types.dispatcher}.")
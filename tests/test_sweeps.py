@@ -0,0 +1,72 @@
+from rq import Queue
+
+from labfunctions import scheduler
+from labfunctions.notebooks import sweeps
+from labfunctions.types import SweepData
+
+from .factories import ExecutionNBTaskFactory, ExecutionResultFactory
+
+
+def test_sweeps_expand():
+    sweep = SweepData(grid={"A": [1, 2], "B": ["x", "y"]}, items=[{"A": 9}])
+    params = sweeps.expand_sweep(sweep)
+    empty = sweeps.expand_sweep(SweepData())
+
+    assert len(params) == 5
+    assert params[0] == {"A": 1, "B": "x"}
+    assert params[-1] == {"A": 9}
+    assert empty == []
+
+
+def test_sweeps_child_ctx():
+    parent = ExecutionNBTaskFactory(runtime="test")
+    child = sweeps.child_ctx(parent, {"TIMEOUT": 10}, execid="child")
+
+    assert child.parentid == parent.execid
+    assert child.execid == "child"
+    assert child.params["TIMEOUT"] == 10
+    assert child.params["EXECID"] == "child"
+    assert parent.params["TIMEOUT"] == 5
+    assert "child" in child.output_name
+
+
+def test_sweeps_state(redis):
+    state = sweeps.Sweeps(redis)
+    parent = ExecutionNBTaskFactory(runtime="test")
+    children = [sweeps.child_ctx(parent, {"A": i}) for i in range(3)]
+
+    start = state.create(parent, children, 2)
+    status = state.status(parent.execid)
+    nxt = state.finish(parent.execid)
+    state.finish(parent.execid, error=True)
+    last = state.finish(parent.execid)
+    final = state.status(parent.execid)
+
+    assert len(start) == 2
+    assert status.pending == 1
+    assert status.running == 2
+    assert nxt == children[2]
+    assert last is None
+    assert final.done == 2
+    assert final.failed == 1
+    assert final.running == 0
+    assert state.status("not-exist") is None
+
+
+def test_sweeps_enqueue(redis):
+    se = scheduler.SchedulerExecutor(redis, qname="test-sweep", is_async=True)
+    parent = ExecutionNBTaskFactory(runtime="test")
+    sweep = SweepData(grid={"A": [1, 2], "B": [1, 2]}, max_concurrency=2)
+    Q = Queue("sweep-q", connection=redis)
+    Q.empty()
+
+    jobs = se.enqueue_sweep(parent, sweep, qname="sweep-q")
+    sweeps.child_ok(jobs[0], redis, ExecutionResultFactory(error=True))
+    status = se.sweeps.status(parent.execid)
+
+    assert len(jobs) == 2
+    assert jobs[0].args[0].parentid == parent.execid
+    assert Q.count == 3
+    assert status.failed == 1
+    assert status.running == 2
+    assert status.pending == 1
@@ -0,0 +1,79 @@
+import pytest
+
+from labfunctions.control_plane.timers import TimerScheduler, next_fire
+from labfunctions.types import ScheduleData
+
+from .factories import WorkflowDataFactory
+
+
+def test_timers_next_fire():
+    interval = ScheduleData(interval="10")
+    cron = ScheduleData(cron="*/5 * * * *")
+    delayed = ScheduleData(interval="10", start_in_min=1)
+
+    assert next_fire(interval, 100.0, first=True) == 100.0
+    assert next_fire(interval, 100.0) == 110.0
+    assert next_fire(cron, 1000.0) == 1200.0
+    assert next_fire(delayed, 100.0, first=True) == 160.0
+    assert next_fire(ScheduleData(), 100.0) is None
+
+
+def test_timers_pop_due():
+    fired = []
+    timers = TimerScheduler(lambda p, w: fired.append(w))
+    timers.add("test", "wf1", ScheduleData(interval="10"), now=100.0)
+    timers.add("test", "wf2", ScheduleData(interval="5"), now=102.0)
+    timers.add("test", "wf3", ScheduleData(interval="10", repeat=1), now=100.0)
+
+    first = timers.pop_due(now=101.0)
+    second = timers.pop_due(now=107.5)
+    third = timers.pop_due(now=113.0)
+
+    assert [e.wfid for e in first] == ["wf1", "wf3"]
+    assert [e.wfid for e in second] == ["wf2"]
+    assert sorted([e.wfid for e in third]) == ["wf1", "wf2"]
+    assert len(timers) == 2
+
+
+def test_timers_sync_workflows():
+    timers = TimerScheduler(lambda p, w: None)
+    wd1 = WorkflowDataFactory(wfid="wf1", schedule=ScheduleData(interval="10"))
+    wd2 = WorkflowDataFactory(wfid="wf2", schedule=ScheduleData(interval="10"))
+    timers.sync_workflows([("test", wd1), ("test", wd2)], now=0.0)
+
+    wd1.schedule = ScheduleData(interval="20")
+    timers.sync_workflows([("test", wd1)], now=5.0)
+    due = timers.pop_due(now=6.0)
+
+    assert len(timers) == 1
+    assert [e.wfid for e in due] == ["wf1"]
+    assert due[0].fire_at == 25.0
+
+
+def test_timers_sync_finished():
+    timers = TimerScheduler(lambda p, w: None)
+    wd = WorkflowDataFactory(wfid="wf1", schedule=ScheduleData(interval="10", repeat=1))
+    timers.sync_workflows([("test", wd)], now=0.0)
+
+    first = timers.pop_due(now=1.0)
+    timers.sync_workflows([("test", wd)], now=60.0)
+    after_reload = timers.pop_due(now=61.0)
+    wd.schedule = ScheduleData(interval="10", repeat=2)
+    timers.sync_workflows([("test", wd)], now=120.0)
+    changed = timers.pop_due(now=121.0)
+
+    assert [e.wfid for e in first] == ["wf1"]
+    assert after_reload == []
+    assert [e.wfid for e in changed] == ["wf1"]
+    assert len(timers) == 1
+
+
+@pytest.mark.asyncio
+async def test_timers_fire():
+    fired = []
+    timers = TimerScheduler(lambda p, w: fired.append((p, w)))
+    entry = timers.add("test", "wf1", ScheduleData(interval="10"), now=0.0)
+
+    await timers.fire(entry)
+
+    assert fired == [("test", "wf1")]
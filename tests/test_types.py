@@ -1,5 +1,8 @@
+import pytest
+from pydantic import ValidationError
+
 from labfunctions.models import ProjectModel
-from labfunctions.types import NBTask, ProjectData, ScheduleData
+from labfunctions.types import NBTask, ProjectData, ScheduleData, SweepData
 from labfunctions.types.user import UserOrm
 
 from .factories import (
@@ -29,6 +32,32 @@ def test_types_workflow_serialization():
     assert dict_["schedule"]["repeat"]
 
 
+def test_types_nbtask_mode():
+    task = NBTaskFactory(mode="script")
+
+    assert task.mode == "script"
+    with pytest.raises(ValidationError):
+        NBTask(**{**task.dict(), "mode": "scrip"})
+
+
+def test_types_nbtask_batch():
+    task = NBTaskFactory(batch=True)
+
+    assert task.batch
+    with pytest.raises(ValidationError):
+        NBTask(**{**task.dict(), "cache": {"ttl_secs": 60}})
+    with pytest.raises(ValidationError):
+        NBTask(**{**task.dict(), "retry": {"max_attempts": 2}})
+
+
+def test_types_sweep_max_concurrency():
+    sweep = SweepData(grid={"A": [1, 2]}, max_concurrency=1)
+
+    assert sweep.max_concurrency == 1
+    with pytest.raises(ValidationError):
+        SweepData(grid={"A": [1, 2]}, max_concurrency=0)
+
+
 def test_types_user_serialization():
 
     um = create_user_model2()
@@ -1,4 +1,6 @@
+import asyncio
 import logging
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from tempfile import TemporaryDirectory
 
@@ -113,3 +115,70 @@ def test_utils_get_version():
 def test_utils_pkg_route():
     here = utils.pkg_route()
     assert here.endswith("labfunctions")
+
+
+def test_utils_gzip_file_reader():
+    fp = f"{tmp_dir.name}/test_gzip.ipynb"
+    data = b'{"cells": []}' * 1000
+    with open(fp, "wb") as f:
+        f.write(data)
+
+    compressed = list(utils.gzip_file_reader(fp, chunk_size=100))
+    decompressed = b"".join(utils.gunzip_stream(iter(compressed)))
+
+    assert len(b"".join(compressed)) < len(data)
+    assert decompressed == data
+
+
+@pytest.mark.asyncio
+async def test_utils_stream_async():
+    produced = []
+    closed = []
+
+    def chunks():
+        try:
+            for x in range(10):
+                produced.append(x)
+                yield str(x).encode()
+        finally:
+            closed.append(True)
+
+    def failed():
+        yield b"0"
+        raise ValueError("read error")
+
+    first = []
+    stream = utils.stream_async(chunks(), read_ahead=2)
+    async for chunk in stream:
+        first.append(chunk)
+        if len(first) == 3:
+            break
+    await stream.aclose()
+    all_ = [c async for c in utils.stream_async(iter([b"a", b"b"]))]
+    with pytest.raises(ValueError):
+        async for _ in utils.stream_async(failed()):
+            pass
+
+    assert first == [b"0", b"1", b"2"]
+    # the items consumed plus the ones read ahead at most
+    assert len(produced) <= 3 + 2 + 1
+    assert closed == [True]
+    assert all_ == [b"a", b"b"]
+
+
+@pytest.mark.asyncio
+async def test_utils_stream_async_threads():
+    loop = asyncio.get_running_loop()
+    executor = ThreadPoolExecutor(1)
+    loop.set_default_executor(executor)
+    stream = utils.stream_async(iter([b"a"] * 10), read_ahead=2)
+
+    first = await stream.__anext__()
+    # the stream doesn't hold the only thread while it isn't consumed
+    other = await asyncio.wait_for(utils.run_async(str, "other"), timeout=2)
+    rest = [c async for c in stream]
+    executor.shutdown()
+
+    assert first == b"a"
+    assert other == "other"
+    assert len(rest) == 9